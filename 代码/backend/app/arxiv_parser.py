@@ -0,0 +1,74 @@
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional
+
+ATOM_NS = "http://www.w3.org/2005/Atom"
+ARXIV_NS = "http://arxiv.org/schemas/atom"
+
+def _atom(tag: str) -> str:
+    return f"{{{ATOM_NS}}}{tag}"
+
+def _clean(text: Optional[str]) -> str:
+    """合并Atom文本中的换行与缩进"""
+    return " ".join(text.split()) if text else ""
+
+class ArxivAtomParser:
+    """
+    arXiv Atom响应的增量解析器
+    按块喂入字节，每个<entry>结束时立即产出结果，并从树中移除以控制内存
+    """
+    ENTRY = _atom("entry")
+
+    def __init__(self, summary_chars: int = 200):
+        self.summary_chars = summary_chars
+        self.parser = ET.XMLPullParser(events=("start", "end"))
+        self.root = None
+
+    def feed(self, chunk: bytes) -> List[Dict]:
+        """喂入一块数据，返回本次完成的条目"""
+        self.parser.feed(chunk)
+        return self._drain()
+
+    def close(self) -> List[Dict]:
+        """结束解析，返回剩余完成的条目"""
+        self.parser.close()
+        return self._drain()
+
+    def _drain(self) -> List[Dict]:
+        entries = []
+        for event, elem in self.parser.read_events():
+            if event == "start":
+                if self.root is None:
+                    self.root = elem
+            elif elem.tag == self.ENTRY:
+                entries.append(self._to_result(elem))
+                self.root.remove(elem)
+        return entries
+
+    def _to_result(self, entry: ET.Element) -> Dict:
+        summary = _clean(entry.findtext(_atom("summary")))
+        pdf_url = ""
+        for link in entry.findall(_atom("link")):
+            if link.get("title") == "pdf":
+                pdf_url = link.get("href", "")
+        category = entry.find(f"{{{ARXIV_NS}}}primary_category")
+
+        return {
+            "source": "Arxiv",
+            "title": _clean(entry.findtext(_atom("title"))),
+            "summary": summary[:self.summary_chars] + "...",
+            "url": _clean(entry.findtext(_atom("id"))),
+            "pdf_url": pdf_url,
+            "authors": [_clean(author.findtext(_atom("name"))) for author in entry.findall(_atom("author"))][:3],
+            "published": _clean(entry.findtext(_atom("published"))),
+            "category": category.get("term", "") if category is not None else "",
+            "relevance_score": 0.8
+        }
+
+def parse_arxiv_feed(data: bytes, chunk_size: int = 16384) -> List[Dict]:
+    """解析完整响应（按块喂入增量解析器）"""
+    parser = ArxivAtomParser()
+    entries = []
+    for start in range(0, len(data), chunk_size):
+        entries.extend(parser.feed(data[start:start + chunk_size]))
+    entries.extend(parser.close())
+    return entries
\ No newline at end of file
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+class CacheBackend:
+    """
+    键值缓存后端接口
+    值需可JSON序列化；ttl为None表示不过期
+    blocking: 读写是否访问磁盘，为True时异步调用方应通过run_cache_io在线程中执行
+    """
+    blocking = True
+
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class MemoryCacheBackend(CacheBackend):
+    """进程内缓存，按条目数LRU淘汰"""
+    blocking = False
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    基于SQLite的持久化缓存
+    超过max_entries或max_bytes时按最近访问时间淘汰
+    """
+    def __init__(self, path: str, max_entries: Optional[int] = None, max_bytes: Optional[int] = None,
+                 table: str = "cache"):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.table = table
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "expires_at REAL, accessed_at REAL NOT NULL)"
+        )
+        self.conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table}(accessed_at)")
+        self.conn.commit()
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self.conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self.conn.commit()
+                return None
+            self.conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+        return json.loads(value)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        now = time.time()
+        payload = json.dumps(value, ensure_ascii=False)
+        with self.lock:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, size, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload.encode("utf-8")), now + ttl if ttl is not None else None, now)
+            )
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        """删除过期条目，再按最近访问时间淘汰到容量以内"""
+        self.conn.execute(f"DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                          (time.time(),))
+        if self.max_entries is not None:
+            self.conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} "
+                "ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+        if self.max_bytes is not None:
+            total = self.conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+            if total > self.max_bytes:
+                rows = self.conn.execute(f"SELECT key, size FROM {self.table} ORDER BY accessed_at").fetchall()
+                for key, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    self.conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                    total -= size
+
+    def delete(self, key: str):
+        with self.lock:
+            self.conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self.conn.commit()
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute(f"DELETE FROM {self.table}")
+            self.conn.commit()
+
+    def total_bytes(self) -> int:
+        with self.lock:
+            return self.conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+async def run_cache_io(backend: CacheBackend, fn: Callable, *args, **kwargs) -> Any:
+    """在事件循环中调用缓存读写：磁盘后端放到线程中执行，内存后端直接调用"""
+    if backend.blocking:
+        return await asyncio.to_thread(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
\ No newline at end of file
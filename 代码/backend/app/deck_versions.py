@@ -0,0 +1,57 @@
+import hashlib
+import json
+from typing import Dict, List
+
+from app.image_store import IMAGE_ID
+
+def image_key(image: Dict) -> str:
+    """
+    指纹中使用的图片标识：内容哈希ID直接使用；
+    PDF延迟提取的图片ID含源文件哈希，每个版本都会变化，改用格式、尺寸与字节数
+    """
+    image_id = image.get("id", "")
+    if IMAGE_ID.match(image_id):
+        return image_id
+    return f"{image.get('format')}:{image.get('width')}x{image.get('height')}:{image.get('size')}"
+
+def slide_fingerprint(page: Dict) -> str:
+    """单页指纹：标题、正文与图片内容，与页码无关"""
+    payload = json.dumps(
+        [page.get("title", ""), page.get("text", ""), sorted(image_key(image) for image in page.get("images", []))],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def plan_deck_version(previous_pages: List[Dict], pages: List[Dict], reuse_extensions: bool = True) -> Dict:
+    """
+    对比上一版本的页面，决定哪些页面可以复用
+    返回:
+        reused: 页码 -> 上一版本中指纹相同的页面（可复用扩展与外部引用）
+        vector_ids: 页码 -> 可保留的向量ID（指纹与页码都相同，向量元数据仍然正确）
+        stale_vector_ids: 上一版本中需要删除的向量ID（页面被修改、删除或移动）
+    reuse_extensions: 处理选项变化时为False，只保留向量
+    """
+    # 1. 按指纹索引上一版本的页面（同一内容可能出现在多页）
+    candidates: Dict[str, List[Dict]] = {}
+    for page in previous_pages:
+        candidates.setdefault(slide_fingerprint(page), []).append(page)
+
+    # 2. 逐页匹配，优先匹配页码相同的旧页面
+    reused, vector_ids = {}, {}
+    for page in pages:
+        matches = candidates.get(slide_fingerprint(page))
+        if not matches:
+            continue
+        page_num = page["page_num"]
+        match = next((old for old in matches if old["page_num"] == page_num), matches[0])
+        matches.remove(match)
+        if reuse_extensions:
+            reused[page_num] = match
+        if match["page_num"] == page_num and match.get("vector_id") is not None:
+            vector_ids[page_num] = match["vector_id"]
+
+    # 3. 未保留的旧向量全部删除
+    kept = set(vector_ids.values())
+    stale_vector_ids = [page["vector_id"] for page in previous_pages
+                        if page.get("vector_id") is not None and page["vector_id"] not in kept]
+    return {"reused": reused, "vector_ids": vector_ids, "stale_vector_ids": stale_vector_ids}
\ No newline at end of file
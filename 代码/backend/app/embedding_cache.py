@@ -0,0 +1,177 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+class _DiskTier:
+    """
+    磁盘缓存层：内存映射的float32矩阵 + 按行对应的键索引文件
+    向量先写入矩阵，再追加键，保证索引中出现的键都有完整向量
+    """
+    GROWTH_ROWS = 1024
+
+    def __init__(self, directory: str, dim: int):
+        self.directory = directory
+        self.dim = dim
+        self.matrix_path = os.path.join(directory, "embeddings.f32")
+        self.keys_path = os.path.join(directory, "keys.txt")
+        os.makedirs(directory, exist_ok=True)
+
+        # 加载键索引
+        self.index: Dict[str, int] = {}
+        if os.path.exists(self.keys_path):
+            with open(self.keys_path, "r", encoding="utf-8") as f:
+                for row, line in enumerate(f):
+                    key = line.strip()
+                    if key:
+                        self.index[key] = row
+        self.rows = len(self.index)
+
+        if not os.path.exists(self.matrix_path):
+            open(self.matrix_path, "wb").close()
+        self.capacity = os.path.getsize(self.matrix_path) // (dim * 4)
+        self.matrix = None
+        if self.capacity > 0:
+            self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r+", shape=(self.capacity, dim))
+        self.keys_file = open(self.keys_path, "a", encoding="utf-8")
+
+    def _grow(self):
+        """按块扩容矩阵文件并重新映射"""
+        if self.matrix is not None:
+            self.matrix.flush()
+            del self.matrix
+        self.capacity += self.GROWTH_ROWS
+        with open(self.matrix_path, "r+b") as f:
+            f.truncate(self.capacity * self.dim * 4)
+        self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r+", shape=(self.capacity, self.dim))
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        row = self.index.get(key)
+        if row is None:
+            return None
+        return np.array(self.matrix[row])
+
+    def put(self, key: str, vector: np.ndarray):
+        if key in self.index:
+            return
+        if self.rows >= self.capacity:
+            self._grow()
+        self.matrix[self.rows] = vector
+        self.keys_file.write(key + "\n")
+        self.keys_file.flush()
+        self.index[key] = self.rows
+        self.rows += 1
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def close(self):
+        if self.matrix is not None:
+            self.matrix.flush()
+        self.keys_file.close()
+
+class EmbeddingCache:
+    """
+    内容寻址的嵌入向量缓存
+    键: 模型名 + 文本SHA-256；内存LRU层 + 可选的磁盘内存映射层
+    """
+    def __init__(self, model_name: str, dim: int = 384, max_memory_entries: int = 10000,
+                 disk_dir: Optional[str] = None):
+        self.model_name = model_name
+        self.dim = dim
+        self.max_memory_entries = max_memory_entries
+        self.memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.disk = None
+        if disk_dir:
+            self.disk = _DiskTier(os.path.join(disk_dir, model_name.replace("/", "_")), dim)
+
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+
+    def make_key(self, text: str) -> str:
+        """生成缓存键"""
+        return f"{self.model_name}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    def _remember(self, key: str, vector: np.ndarray):
+        """写入内存LRU层，超出容量时淘汰最久未使用的条目"""
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def _lookup(self, key: str) -> Optional[np.ndarray]:
+        vector = self.memory.get(key)
+        if vector is not None:
+            self.memory.move_to_end(key)
+            self.memory_hits += 1
+            return vector
+        if self.disk is not None:
+            vector = self.disk.get(key)
+            if vector is not None:
+                self.disk_hits += 1
+                self._remember(key, vector)
+                return vector
+        return None
+
+    def encode(self, texts: List[str], encode_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        通过缓存编码一批文本
+        未命中的文本（批内去重后）一次性交给encode_fn编码
+        返回: (len(texts), dim) 的float32矩阵
+        """
+        keys = [self.make_key(text) for text in texts]
+        vectors: List[Optional[np.ndarray]] = [None] * len(texts)
+        missing: Dict[str, List[int]] = {}
+
+        with self.lock:
+            for i, key in enumerate(keys):
+                vector = self._lookup(key)
+                if vector is not None:
+                    vectors[i] = vector
+                    self.hits += 1
+                else:
+                    missing.setdefault(key, []).append(i)
+                    self.misses += 1
+
+        if missing:
+            miss_keys = list(missing.keys())
+            miss_texts = [texts[missing[key][0]] for key in miss_keys]
+            encoded = np.asarray(encode_fn(miss_texts), dtype=np.float32).reshape(len(miss_texts), -1)
+
+            with self.lock:
+                for key, vector in zip(miss_keys, encoded):
+                    vector = np.array(vector)
+                    self._remember(key, vector)
+                    if self.disk is not None:
+                        self.disk.put(key, vector)
+                    for i in missing[key]:
+                        vectors[i] = vector
+
+        if not vectors:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.stack(vectors).astype(np.float32, copy=False)
+
+    def stats(self) -> Dict[str, float]:
+        """命中/未命中统计"""
+        total = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_entries": len(self.memory),
+            "memory_capacity": self.max_memory_entries,
+            "disk_entries": len(self.disk) if self.disk is not None else 0
+        }
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
\ No newline at end of file
@@ -0,0 +1,317 @@
+import hashlib
+import io
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+IMAGE_ID = re.compile(r"^[0-9a-f]{64}$")
+# PDF中按需提取的图片：源文件哈希-xref
+DEFERRED_ID = re.compile(r"^([0-9a-f]{64})-([0-9]+)$")
+
+class ImageStore:
+    """
+    按内容哈希保存图片：保留原始编码，相同图片只存一份
+    页面中只记录引用与尺寸；缩略图在首次请求时生成并缓存
+    只依赖文件系统，解析子进程可以直接写入同一目录
+    PDF图片不在解析时提取：以 "源文件哈希-xref" 引用，首次访问时再从登记的源文件提取；
+    只有含图片的PDF才登记源文件，源文件目录与上传临时目录一样按过期时间与配额（最久未用的先删）回收，
+    源文件被回收后尚未提取过的图片不再可用
+    """
+    # 缩略图边长向上取整到这些档位，避免任意尺寸撑大缓存
+    THUMBNAIL_SIZES = (64, 128, 256, 512, 1024)
+
+    def __init__(self, directory: str, source_quota_bytes: int = 2 * 1024 ** 3,
+                 source_max_age: float = 7 * 24 * 3600):
+        self.directory = directory
+        self.source_quota_bytes = source_quota_bytes
+        self.source_max_age = source_max_age
+        self.image_dir = os.path.join(directory, "original")
+        self.thumb_dir = os.path.join(directory, "thumbnails")
+        self.source_dir = os.path.join(directory, "sources")
+        os.makedirs(self.image_dir, exist_ok=True)
+        os.makedirs(self.thumb_dir, exist_ok=True)
+        os.makedirs(self.source_dir, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.served = 0
+        self.thumbnails_generated = 0
+        self.thumbnail_hits = 0
+        self.deferred_extracted = 0
+        self.sources_removed = 0
+        # 各份PPT解析时的图片去重累计
+        self.decks = 0
+        self.deck_images = 0
+        self.deck_unique_images = 0
+        self.deck_bytes_saved = 0
+
+    @classmethod
+    def from_env(cls, directory: str = None) -> "ImageStore":
+        return cls(
+            directory or os.getenv("IMAGE_STORE_DIR", "./data/images"),
+            source_quota_bytes=int(os.getenv("IMAGE_SOURCE_QUOTA_BYTES", str(2 * 1024 ** 3))),
+            source_max_age=float(os.getenv("IMAGE_SOURCE_MAX_AGE", str(7 * 24 * 3600)))
+        )
+
+    def _image_path(self, image_id: str) -> str:
+        return os.path.join(self.image_dir, image_id[:2], image_id)
+
+    def put(self, blob: bytes, image_id: str = None) -> Optional[Dict]:
+        """
+        保存图片原始字节，返回页面中的图片引用
+        image_id: 已计算好的SHA-256；无法识别的格式返回None（与原先无法解码的图片被跳过一致）
+        """
+        from PIL import Image, UnidentifiedImageError
+
+        try:
+            # 只读取文件头获取格式与尺寸，不解码像素
+            with Image.open(io.BytesIO(blob)) as img:
+                image_format, width, height = img.format, img.width, img.height
+        except (UnidentifiedImageError, OSError, ValueError):
+            return None
+
+        image_id = image_id or hashlib.sha256(blob).hexdigest()
+        path = self._image_path(image_id)
+        if not os.path.exists(path):
+            self._write_atomic(path, blob)
+
+        return {
+            "id": image_id,
+            "format": image_format.lower(),
+            "width": width,
+            "height": height,
+            "size": len(blob),
+            "url": f"/api/images/{image_id}"
+        }
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes):
+        """先写临时文件再改名，并发写入同一图片时读者不会看到半个文件"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def deferred_id(source_id: str, xref: int) -> str:
+        return f"{source_id}-{xref}"
+
+    def _source_path(self, source_id: str) -> str:
+        return os.path.join(self.source_dir, f"{source_id}.pdf")
+
+    @staticmethod
+    def source_id(file_path: str) -> str:
+        """PDF源文件ID（内容哈希），解析时据此生成延迟提取的图片ID"""
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def put_source(self, file_path: str, source_id: str = None) -> str:
+        """
+        登记PDF源文件（按内容哈希，优先硬链接），返回源文件ID
+        登记后按过期时间与配额回收旧的源文件
+        """
+        source_id = source_id or self.source_id(file_path)
+        path = self._source_path(source_id)
+        if os.path.exists(path):
+            os.utime(path)
+        else:
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                os.link(file_path, tmp_path)
+            except OSError:
+                shutil.copyfile(file_path, tmp_path)
+            os.replace(tmp_path, path)
+        self.cleanup_sources(keep=path)
+        return source_id
+
+    def cleanup_sources(self, keep: str = None) -> Dict[str, int]:
+        """删除过期的源文件，再从最久未用的开始删除直到低于配额；keep（刚登记的源文件）不删除"""
+        entries = []
+        with os.scandir(self.source_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(".pdf"):
+                    stat = entry.stat()
+                    entries.append((entry.path, stat.st_mtime, stat.st_size))
+        entries.sort(key=lambda item: item[1])
+        total = sum(size for _, _, size in entries)
+        now = time.time()
+        removed, freed = 0, 0
+        for path, mtime, size in entries:
+            if path == keep or (now - mtime < self.source_max_age and total <= self.source_quota_bytes):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+            freed += size
+        with self.lock:
+            self.sources_removed += removed
+        return {"removed": removed, "freed_bytes": freed, "usage_bytes": total}
+
+    def _extract_deferred(self, image_id: str, path: str) -> bool:
+        """从源文件中提取PDF图片并保存，源文件或xref不存在时返回False"""
+        import fitz
+
+        source_id, xref = DEFERRED_ID.match(image_id).groups()
+        source = self._source_path(source_id)
+        try:
+            with fitz.open(source) as doc:
+                base_image = doc.extract_image(int(xref))
+            # 记录最近使用时间，配额回收时最久未用的源文件先删
+            os.utime(source)
+        except (RuntimeError, ValueError, FileNotFoundError):
+            return False
+        if not base_image:
+            return False
+        self._write_atomic(path, base_image["image"])
+        with self.lock:
+            self.deferred_extracted += 1
+        return True
+
+    @staticmethod
+    def is_valid_id(image_id: str) -> bool:
+        """图片ID格式是否合法（不检查文件是否存在，也不触发提取）"""
+        return bool(IMAGE_ID.match(image_id) or DEFERRED_ID.match(image_id))
+
+    def get_path(self, image_id: str) -> Optional[str]:
+        """原图路径（PDF图片首次访问时提取）；ID非法或不存在时返回None"""
+        deferred = DEFERRED_ID.match(image_id)
+        if not self.is_valid_id(image_id):
+            return None
+        path = self._image_path(image_id)
+        if not os.path.exists(path) and not (deferred and self._extract_deferred(image_id, path)):
+            return None
+        with self.lock:
+            self.served += 1
+        return path
+
+    @classmethod
+    def thumbnail_size(cls, size: int) -> Optional[int]:
+        """请求尺寸对应的缩略图档位；超过最大档位时返回None（直接使用原图）"""
+        for candidate in cls.THUMBNAIL_SIZES:
+            if size <= candidate:
+                return candidate
+        return None
+
+    def get_thumbnail(self, image_id: str, size: int) -> Optional[str]:
+        """
+        缩略图路径（最长边不超过size），不存在时生成
+        原图已小于该尺寸时返回原图路径
+        """
+        from PIL import Image
+
+        source = self.get_path(image_id)
+        if source is None:
+            return None
+
+        for ext in ("png", "jpg"):
+            path = os.path.join(self.thumb_dir, f"{image_id}_{size}.{ext}")
+            if os.path.exists(path):
+                with self.lock:
+                    self.thumbnail_hits += 1
+                return path
+
+        with Image.open(source) as img:
+            if max(img.width, img.height) <= size:
+                return source
+            img.thumbnail((size, size))
+            # 带透明通道的图片保存为PNG，其余保存为JPEG
+            if img.mode in ("RGBA", "LA", "P") or "transparency" in img.info:
+                ext, save_format, image = "png", "PNG", img
+            else:
+                ext, save_format, image = "jpg", "JPEG", img.convert("RGB")
+            buffered = io.BytesIO()
+            image.save(buffered, format=save_format)
+
+        path = os.path.join(self.thumb_dir, f"{image_id}_{size}.{ext}")
+        self._write_atomic(path, buffered.getvalue())
+        with self.lock:
+            self.thumbnails_generated += 1
+        return path
+
+    def record_deck(self, image_stats: Dict[str, int]):
+        """累计一份PPT的图片去重统计"""
+        with self.lock:
+            self.decks += 1
+            self.deck_images += image_stats["total"]
+            self.deck_unique_images += image_stats["unique"]
+            self.deck_bytes_saved += image_stats["bytes_saved"]
+
+    def usage(self) -> Dict[str, int]:
+        images, total = 0, 0
+        for root, _, files in os.walk(self.image_dir):
+            for name in files:
+                if IMAGE_ID.match(name) or DEFERRED_ID.match(name):
+                    images += 1
+                    total += os.path.getsize(os.path.join(root, name))
+        sources = [name for name in os.listdir(self.source_dir) if name.endswith(".pdf")]
+        return {
+            "images": images,
+            "bytes": total,
+            "sources": len(sources),
+            "source_bytes": sum(os.path.getsize(os.path.join(self.source_dir, name)) for name in sources)
+        }
+
+    def stats(self) -> Dict:
+        return {
+            **self.usage(),
+            "served": self.served,
+            "thumbnails_generated": self.thumbnails_generated,
+            "thumbnail_hits": self.thumbnail_hits,
+            "deferred_extracted": self.deferred_extracted,
+            "sources_removed": self.sources_removed,
+            "source_quota_bytes": self.source_quota_bytes,
+            "decks": self.decks,
+            "deck_images": self.deck_images,
+            "deck_unique_images": self.deck_unique_images,
+            "deck_bytes_saved": self.deck_bytes_saved
+        }
+
+class DeckImages:
+    """
+    单份PPT解析期间的图片去重：内容相同的图片（模板里每页重复的logo、背景）
+    只识别格式与写入一次，其余出现直接复用同一引用
+    """
+    def __init__(self, store: ImageStore):
+        self.store = store
+        self.refs: Dict[str, Optional[Dict]] = {}
+
+    def put(self, blob: bytes) -> Optional[Dict]:
+        image_id = hashlib.sha256(blob).hexdigest()
+        if image_id not in self.refs:
+            self.refs[image_id] = self.store.put(blob, image_id)
+        ref = self.refs[image_id]
+        return dict(ref) if ref else None
+
+def summarize_images(pages: List[Dict]) -> Dict[str, int]:
+    """
+    统计一份PPT的图片引用：总出现次数、不同图片数，以及去重省下的字节数
+    按最终页面计算，与是否拆分到多个进程解析无关
+    """
+    sizes = {}
+    total, total_bytes = 0, 0
+    for page in pages:
+        for image in page.get("images", []):
+            total += 1
+            total_bytes += image.get("size") or 0
+            sizes[image["id"]] = image.get("size") or 0
+    return {
+        "total": total,
+        "unique": len(sizes),
+        "bytes_total": total_bytes,
+        "bytes_saved": total_bytes - sum(sizes.values())
+    }
\ No newline at end of file
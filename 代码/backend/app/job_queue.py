@@ -0,0 +1,193 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+class JobStore:
+    """
+    基于SQLite的任务持久化
+    jobs表保存任务状态与阶段耗时，job_pages表保存已完成页面的结果，用于中断后续跑
+    最终结果由ResultStore保存
+    """
+    STATUSES = ("queued", "parsing", "extending", "done", "failed")
+    JSON_FIELDS = ("stage_timings", "vector_ids", "options")
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "ppt_id TEXT PRIMARY KEY, filename TEXT NOT NULL, file_path TEXT NOT NULL, content_hash TEXT, "
+            "status TEXT NOT NULL, total_pages INTEGER, completed_pages INTEGER NOT NULL DEFAULT 0, "
+            "stage_timings TEXT NOT NULL DEFAULT '{}', vector_ids TEXT, error TEXT, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL, options TEXT)"
+        )
+        # 旧版本创建的任务库没有options列
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+        if "options" not in columns:
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN options TEXT")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_pages ("
+            "ppt_id TEXT NOT NULL, page_num INTEGER NOT NULL, page TEXT NOT NULL, "
+            "PRIMARY KEY (ppt_id, page_num))"
+        )
+        self.conn.commit()
+
+    @classmethod
+    def from_env(cls) -> "JobStore":
+        return cls(os.getenv("JOB_DB_PATH", "./data/jobs.db"))
+
+    def create(self, ppt_id: str, filename: str, file_path: str, content_hash: Optional[str] = None,
+               options: Optional[Dict[str, Any]] = None):
+        """options: 上传时指定的处理选项，随任务保存，续跑时沿用"""
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO jobs (ppt_id, filename, file_path, content_hash, status, created_at, updated_at, options) "
+                "VALUES (?, ?, ?, ?, 'queued', ?, ?, ?)",
+                (ppt_id, filename, file_path, content_hash, now, now,
+                 json.dumps(options, ensure_ascii=False) if options is not None else None)
+            )
+            self.conn.commit()
+
+    def get(self, ppt_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM jobs WHERE ppt_id = ?", (ppt_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        for field in self.JSON_FIELDS:
+            job[field] = json.loads(job[field]) if job[field] is not None else None
+        if job["vector_ids"] is not None:
+            # JSON对象的键是字符串，还原为页码
+            job["vector_ids"] = {int(page_num): vector_id for page_num, vector_id in job["vector_ids"].items()}
+        return job
+
+    def update(self, ppt_id: str, **fields):
+        """更新任务字段；stage_timings/vector_ids以JSON保存"""
+        for field in self.JSON_FIELDS:
+            if field in fields:
+                fields[field] = json.dumps(fields[field], ensure_ascii=False)
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{field} = ?" for field in fields)
+        with self.lock:
+            self.conn.execute(f"UPDATE jobs SET {assignments} WHERE ppt_id = ?", (*fields.values(), ppt_id))
+            self.conn.commit()
+
+    def save_page(self, ppt_id: str, page_num: int, page: Dict):
+        """保存单页结果并刷新完成页数"""
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO job_pages (ppt_id, page_num, page) VALUES (?, ?, ?)",
+                (ppt_id, page_num, json.dumps(page, ensure_ascii=False))
+            )
+            self.conn.execute(
+                "UPDATE jobs SET completed_pages = (SELECT COUNT(*) FROM job_pages WHERE ppt_id = ?), "
+                "updated_at = ? WHERE ppt_id = ?",
+                (ppt_id, time.time(), ppt_id)
+            )
+            self.conn.commit()
+
+    def completed_pages(self, ppt_id: str) -> Dict[int, Dict]:
+        """已完成页面：页码 -> 结果"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT page_num, page FROM job_pages WHERE ppt_id = ? ORDER BY page_num", (ppt_id,)
+            ).fetchall()
+        return {row["page_num"]: json.loads(row["page"]) for row in rows}
+
+    def unfinished(self) -> List[str]:
+        """未结束的任务（包括中断时正在处理的），按提交顺序"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT ppt_id FROM jobs WHERE status NOT IN ('done', 'failed') ORDER BY created_at"
+            ).fetchall()
+        return [row["ppt_id"] for row in rows]
+
+    def unfinished_files(self) -> List[str]:
+        """未结束任务引用的上传文件"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT file_path FROM jobs WHERE status NOT IN ('done', 'failed')"
+            ).fetchall()
+        return [row["file_path"] for row in rows]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+class JobQueue:
+    """
+    有界工作池：固定数量的worker从队列中取任务执行
+    启动时把库中未结束的任务重新入队，由handler根据已保存的进度续跑
+    """
+    def __init__(self, store: JobStore, handler: Callable[[str], Awaitable[None]], workers: int = 2):
+        self.store = store
+        self.handler = handler
+        self.workers = workers
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self.tasks: List[asyncio.Task] = []
+        self.running = 0
+        self.finished = 0
+        self.failed = 0
+
+    async def start(self):
+        """恢复未完成任务并启动worker"""
+        if self.tasks:
+            return
+        resumed = self.store.unfinished()
+        for ppt_id in resumed:
+            self.queue.put_nowait(ppt_id)
+        if resumed:
+            print(f"恢复 {len(resumed)} 个未完成的任务")
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, ppt_id: str, filename: str, file_path: str, content_hash: Optional[str] = None,
+               options: Optional[Dict[str, Any]] = None):
+        self.store.create(ppt_id, filename, file_path, content_hash, options)
+        self.queue.put_nowait(ppt_id)
+
+    async def _worker(self):
+        while True:
+            ppt_id = await self.queue.get()
+            self.running += 1
+            try:
+                await self.handler(ppt_id)
+                self.finished += 1
+            except asyncio.CancelledError:
+                # 停止时保留当前状态，下次启动续跑
+                raise
+            except Exception as e:
+                self.failed += 1
+                self.store.update(ppt_id, status="failed", error=str(e))
+                print(f"任务 {ppt_id} 处理失败: {e}")
+            finally:
+                self.running -= 1
+                self.queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "started": bool(self.tasks),
+            "queued": self.queue.qsize(),
+            "running": self.running,
+            "finished": self.finished,
+            "failed": self.failed
+        }
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        self.store.close()
\ No newline at end of file
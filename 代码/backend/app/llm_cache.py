@@ -0,0 +1,80 @@
+import copy
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+from app.cache_backends import CacheBackend, MemoryCacheBackend, SQLiteCacheBackend
+
+class LLMCache:
+    """
+    LLM响应缓存
+    - 键: (模型, 模板类型, temperature, 渲染后Prompt的哈希)
+    - 只缓存成功解析的响应，降级/错误结果不写入
+    - 记录命中节省的token数与调用耗时
+    """
+    def __init__(self, backend: Optional[CacheBackend] = None, ttl: Optional[float] = None):
+        self.backend = backend if backend is not None else MemoryCacheBackend()
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.tokens_saved = 0
+        self.seconds_saved = 0.0
+
+    @classmethod
+    def from_env(cls) -> "LLMCache":
+        """根据环境变量选择内存或SQLite后端；LLM_CACHE_TTL为0表示不过期"""
+        max_entries = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000"))
+        if os.getenv("LLM_CACHE_BACKEND", "memory") == "sqlite":
+            max_bytes = int(os.getenv("LLM_CACHE_MAX_BYTES", "0")) or None
+            backend = SQLiteCacheBackend(
+                os.getenv("LLM_CACHE_PATH", "./data/llm_cache.db"),
+                max_entries=max_entries,
+                max_bytes=max_bytes,
+                table="llm_cache"
+            )
+        else:
+            backend = MemoryCacheBackend(max_entries=max_entries)
+        ttl = float(os.getenv("LLM_CACHE_TTL", "0")) or None
+        return cls(backend=backend, ttl=ttl)
+
+    @staticmethod
+    def make_key(model: str, template_type: str, temperature: float, messages: List[Dict]) -> str:
+        """对完整的消息列表取指纹，系统提示或模板变化都会产生新键"""
+        rendered = json.dumps(messages, ensure_ascii=False, sort_keys=True)
+        digest = hashlib.sha256(rendered.encode("utf-8")).hexdigest()
+        return f"{model}:{template_type}:{temperature}:{digest}"
+
+    def get(self, key: str) -> Optional[Any]:
+        """命中时返回缓存值的副本，并累计节省的token与耗时"""
+        entry = self.backend.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.tokens_saved += entry.get("tokens", 0)
+        self.seconds_saved += entry.get("seconds", 0.0)
+        return copy.deepcopy(entry["value"])
+
+    def set(self, key: str, value: Any, tokens: int = 0, seconds: float = 0.0):
+        entry = {"value": copy.deepcopy(value), "tokens": tokens, "seconds": seconds}
+        self.backend.set(key, entry, ttl=self.ttl)
+        self.stores += 1
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self.backend),
+            "tokens_saved": self.tokens_saved,
+            "seconds_saved": round(self.seconds_saved, 3),
+            "ttl": self.ttl
+        }
+
+    def close(self):
+        self.backend.close()
\ No newline at end of file
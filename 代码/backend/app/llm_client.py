@@ -1,26 +1,70 @@
 import openai
 from openai import AsyncOpenAI
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Callable, Optional, Tuple
+import asyncio
 import os
+import time
 from dotenv import load_dotenv
 import json
 
+from app.cache_backends import run_cache_io
+from app.llm_cache import LLMCache
+from app.rate_limiter import RateLimiter
+
 load_dotenv()
 
+SYSTEM_PROMPT = "你是一个专业、准确、有帮助的教育助手。"
+
+BATCH_PROMPT = """以下是同一份PPT中的{count}页内容，请按【扩展要求】分别扩展每一页。
+
+【扩展要求】
+{template}
+
+{slides}
+
+请返回一个JSON对象：键为页码（字符串），值为该页的扩展结果对象（至少包含extended_content字段），
+例如 {{"{example}": {{"extended_content": "..."}}}}。每一页都必须有对应的键。"""
+
 class LLMClient:
-    def __init__(self, model: str = "gpt-4-turbo-preview"):
+    # 未指定max_tokens时为补全部分预留的token数（用于TPM预估）
+    DEFAULT_COMPLETION_TOKENS = 1000
+    # 单页扩展的补全上限
+    EXTENSION_MAX_TOKENS = 1500
+    # 批量扩展时每页预留的补全token数（批量请求的max_tokens按页数累加）
+    BATCH_PAGE_COMPLETION_TOKENS = 500
+    # 扩展深度 -> (模板, 补全上限)
+    EXTENSION_DEPTHS = {
+        "simple": ("simple", 600),
+        "normal": ("default", 1500),
+        "deep": ("default", 3000)
+    }
+    
+    def __init__(self, model: str = "gpt-4-turbo-preview", cache: LLMCache = None,
+                 rate_limiter: RateLimiter = None, batch_pages: int = None, batch_tokens: int = None):
         """
         初始化LLM客户端
         支持OpenAI API或本地模型
+        batch_pages: 批量扩展时一次请求最多包含的页数，1表示逐页请求
+        batch_tokens: 批量请求中各页Prompt的token预算（按字符数估算）
         """
         self.model = model
+        self.cache = cache or LLMCache.from_env()
+        self.batch_pages = batch_pages if batch_pages is not None else int(os.getenv("LLM_BATCH_PAGES", "1"))
+        self.batch_tokens = batch_tokens if batch_tokens is not None else int(os.getenv("LLM_BATCH_TOKENS", "4000"))
+        self.batches = 0
+        self.batched_pages = 0
+        self.batch_fallback_pages = 0
+        
+        # 所有调用共享的限流器；重试由限流器负责，关闭SDK自带的重试
+        self.rate_limiter = rate_limiter or RateLimiter.from_env(retry_exceptions=(openai.APIConnectionError,))
         self.api_key = os.getenv("OPENAI_API_KEY")
         self.base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
         
         # 初始化客户端
         self.client = AsyncOpenAI(
             api_key=self.api_key,
-            base_url=self.base_url
+            base_url=self.base_url,
+            max_retries=0
         )
         
         # 定义知识扩展的Prompt模板
@@ -72,60 +116,110 @@ class LLMClient:
 请使用生活化的比喻和例子。"""
         }
     
+    async def _cached_completion(self, template_type: str, messages: List[Dict], temperature: float,
+                                 parse: Callable[[str], Any], **kwargs) -> Tuple[Any, bool]:
+        """
+        带缓存的对话补全
+        parse把响应文本转换为结果，只有parse成功后才写入缓存；SQLite缓存的读写在线程中执行
+        返回: (结果, 是否命中缓存)
+        """
+        key = self.cache.make_key(self.model, template_type, temperature, messages)
+        cached = await run_cache_io(self.cache.backend, self.cache.get, key)
+        if cached is not None:
+            return cached, True
+        
+        # 预估token：Prompt按字符数计（中文约一字一token，偏保守）+ 补全上限
+        estimated = (sum(len(m["content"]) for m in messages)
+                     + kwargs.get("max_tokens", self.DEFAULT_COMPLETION_TOKENS))
+        
+        started = time.perf_counter()
+        response = await self.rate_limiter.run(
+            lambda: self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=temperature,
+                **kwargs
+            ),
+            estimated_tokens=estimated
+        )
+        
+        usage = getattr(response, "usage", None)
+        tokens = getattr(usage, "total_tokens", 0) if usage is not None else 0
+        tokens = tokens if isinstance(tokens, int) else 0
+        self.rate_limiter.record_usage(estimated, tokens)
+        
+        result = parse(response.choices[0].message.content)
+        await run_cache_io(self.cache.backend, self.cache.set, key, result, tokens=tokens,
+                           seconds=time.perf_counter() - started)
+        return result, False
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """响应缓存统计"""
+        return self.cache.stats()
+    
+    def rate_limit_stats(self) -> Dict[str, Any]:
+        """限流统计：排队深度、等待时间、重试次数"""
+        return self.rate_limiter.stats()
+    
+    def batch_stats(self) -> Dict[str, Any]:
+        """批量扩展统计：请求数、合并的页数与回退为单页请求的页数"""
+        return {
+            "batch_pages": self.batch_pages,
+            "batch_tokens": self.batch_tokens,
+            "batches": self.batches,
+            "batched_pages": self.batched_pages,
+            "fallback_pages": self.batch_fallback_pages
+        }
+    
+    def close(self):
+        self.cache.close()
+    
     async def extend_knowledge(self, content: str, context: List[Dict] = None, 
-                               template_type: str = "default") -> Dict[str, Any]:
+                               template_type: str = "default", max_tokens: int = None) -> Dict[str, Any]:
         """
         调用LLM扩展知识
+        max_tokens: 补全上限，默认EXTENSION_MAX_TOKENS；与默认值不同时单独缓存
         """
-        # 构建上下文
-        context_text = ""
-        if context:
-            context_text = "\n相关上下文：\n"
-            for idx, ctx in enumerate(context[:3], 1):
-                context_text += f"{idx}. {ctx.get('content', '')[:200]}...\n"
-        
+        max_tokens = max_tokens or self.EXTENSION_MAX_TOKENS
         # 选择模板
         template = self.extension_templates.get(template_type, self.extension_templates["default"])
         
         # 构建Prompt
         prompt = template.format(
-            title=content[:50] + "..." if len(content) > 50 else content,
+            title=self._title(content),
             content=content[:1000]  # 限制长度
-        ) + context_text
+        ) + self._context_text(context)
         
-        try:
-            # 调用LLM
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "你是一个专业、准确、有帮助的教育助手。"},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=1500,
-                response_format={"type": "json_object"}  # 请求JSON格式响应
-            )
-            
-            # 解析响应
-            result_text = response.choices[0].message.content
-            
-            # 尝试解析为JSON，如果失败则作为纯文本
+        def parse(result_text: str) -> Dict[str, Any]:
+            # 尝试解析为JSON，如果失败则作为纯文本；JSON不是对象时抛出异常（不写入缓存，走降级结果）
             try:
-                result_json = json.loads(result_text)
+                parsed = json.loads(result_text)
             except json.JSONDecodeError:
-                result_json = {
+                return {
                     "extended_content": result_text,
                     "sections": ["扩展内容"],
                     "format": "text"
                 }
+            if not isinstance(parsed, dict):
+                raise ValueError("知识扩展响应不是JSON对象")
+            return parsed
+        
+        try:
+            # 调用LLM（相同Prompt命中缓存时不再请求）
+            result_json, cached = await self._cached_completion(
+                self._cache_namespace(template_type, max_tokens, self.EXTENSION_MAX_TOKENS),
+                [
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.7,
+                parse=parse,
+                max_tokens=max_tokens,
+                response_format={"type": "json_object"}  # 请求JSON格式响应
+            )
             
             # 添加元数据
-            result_json.update({
-                "model_used": self.model,
-                "template_type": template_type,
-                "timestamp": "2024-01-18T10:30:00Z"  # 实际使用时应该用datetime.now()
-            })
-            
+            self._add_metadata(result_json, template_type, cached)
             return result_json
             
         except Exception as e:
@@ -137,6 +231,134 @@ class LLMClient:
                 "fallback": True
             }
     
+    @staticmethod
+    def _cache_namespace(template_type: str, max_tokens: int, default_tokens: int) -> str:
+        """缓存键中的模板部分；补全上限为默认值时保持原有的键"""
+        return template_type if max_tokens == default_tokens else f"{template_type}:{max_tokens}"
+    
+    @staticmethod
+    def _title(content: str) -> str:
+        return content[:50] + "..." if len(content) > 50 else content
+    
+    @staticmethod
+    def _context_text(context: Optional[List[Dict]]) -> str:
+        """相似内容上下文（最多3条，每条截取200字）"""
+        context_text = ""
+        if context:
+            context_text = "\n相关上下文：\n"
+            for idx, ctx in enumerate(context[:3], 1):
+                context_text += f"{idx}. {ctx.get('content', '')[:200]}...\n"
+        return context_text
+    
+    def _add_metadata(self, result: Dict[str, Any], template_type: str, cached: bool):
+        result.update({
+            "model_used": self.model,
+            "template_type": template_type,
+            "cached": cached,
+            "timestamp": "2024-01-18T10:30:00Z"  # 实际使用时应该用datetime.now()
+        })
+    
+    @staticmethod
+    def estimate_page_tokens(content: str) -> int:
+        """批量Prompt中一页的token估算：截断后的正文 + 最多3条200字的上下文"""
+        return min(len(content), 1000) + 3 * 210
+    
+    def plan_batches(self, pages: List[Tuple[int, str]]) -> List[List[int]]:
+        """
+        按页码顺序把连续页面分组：每组不超过batch_pages页，各页Prompt估算之和不超过batch_tokens
+        超出预算的单页自成一组（逐页请求）
+        pages: [(页码, 正文)]
+        """
+        groups, group, tokens = [], [], 0
+        for page_num, content in sorted(pages):
+            cost = self.estimate_page_tokens(content)
+            if group and (len(group) >= self.batch_pages or tokens + cost > self.batch_tokens):
+                groups.append(group)
+                group, tokens = [], 0
+            group.append(page_num)
+            tokens += cost
+        if group:
+            groups.append(group)
+        return groups
+    
+    async def extend_knowledge_batch(self, items: List[Dict], template_type: str = "default",
+                                     max_tokens: int = None) -> Dict[int, Dict[str, Any]]:
+        """
+        一次请求扩展多页：共用系统Prompt与模板说明，模型返回以页码为键的JSON对象
+        items: [{"page_num", "content", "context"}]
+        max_tokens: 单页扩展的补全上限；批量请求中每页不超过BATCH_PAGE_COMPLETION_TOKENS
+        返回: 页码 -> 扩展结果；响应中缺失或无法解析的页面单独回退为逐页请求
+        """
+        if len(items) == 1:
+            item = items[0]
+            return {item["page_num"]: await self.extend_knowledge(item["content"], item.get("context"),
+                                                                  template_type, max_tokens)}
+        page_tokens = min(self.BATCH_PAGE_COMPLETION_TOKENS, max_tokens or self.EXTENSION_MAX_TOKENS)
+        
+        # 1. 构建批量Prompt：模板说明只出现一次，各页以【第N页】分隔
+        template = self.extension_templates.get(template_type, self.extension_templates["default"])
+        slides = "\n\n".join(
+            f"【第{item['page_num']}页】\n标题：{self._title(item['content'])}\n内容：{item['content'][:1000]}"
+            + self._context_text(item.get("context"))
+            for item in items
+        )
+        prompt = BATCH_PROMPT.format(
+            count=len(items),
+            template=template.format(title="见下方各页", content="见下方各页"),
+            slides=slides,
+            example=items[0]["page_num"]
+        )
+        
+        def parse(result_text: str) -> Dict[str, Any]:
+            # 不是JSON对象或没有任何一页的扩展结果时抛出异常，不写入缓存
+            parsed = json.loads(result_text)
+            if not isinstance(parsed, dict):
+                raise ValueError("批量扩展响应不是JSON对象")
+            if not any(isinstance(parsed.get(str(item["page_num"])), dict) and parsed[str(item["page_num"])]
+                       for item in items):
+                raise ValueError("批量扩展响应中没有任何页面的结果")
+            return parsed
+        
+        # 2. 请求失败或整体无法解析时全部回退为逐页请求
+        try:
+            parsed, cached = await self._cached_completion(
+                self._cache_namespace(f"batch:{template_type}", page_tokens, self.BATCH_PAGE_COMPLETION_TOKENS),
+                [
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.7,
+                parse=parse,
+                max_tokens=page_tokens * len(items),
+                response_format={"type": "json_object"}
+            )
+        except Exception:
+            parsed, cached = {}, False
+        
+        # 3. 按页码拆分结果
+        results, fallback = {}, []
+        for item in items:
+            part = parsed.get(str(item["page_num"]))
+            if isinstance(part, dict) and part:
+                part = dict(part)
+                self._add_metadata(part, template_type, cached)
+                part["batch_size"] = len(items)
+                results[item["page_num"]] = part
+            else:
+                fallback.append(item)
+        
+        if fallback:
+            extensions = await asyncio.gather(*(
+                self.extend_knowledge(item["content"], item.get("context"), template_type, max_tokens)
+                for item in fallback
+            ))
+            results.update({item["page_num"]: extension for item, extension in zip(fallback, extensions)})
+        
+        self.batches += 1
+        self.batched_pages += len(items) - len(fallback)
+        self.batch_fallback_pages += len(fallback)
+        return results
+    
     async def generate_questions(self, content: str, question_type: str = "multiple_choice") -> List[Dict]:
         """
         生成相关问题
@@ -153,15 +375,14 @@ class LLMClient:
 请以JSON格式返回：{{"questions": [{{"question": "...", "options": ["...", ...], "answer": "...", "explanation": "..."}}]}}"""
         
         try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
+            questions, _ = await self._cached_completion(
+                f"questions:{question_type}",
+                [{"role": "user", "content": prompt}],
                 temperature=0.5,
+                parse=lambda text: json.loads(text).get("questions", []),
                 response_format={"type": "json_object"}
             )
-            
-            result = json.loads(response.choices[0].message.content)
-            return result.get("questions", [])
+            return questions
             
         except Exception as e:
             return [{"error": str(e)}]
@@ -182,11 +403,59 @@ class LLMClient:
 
 返回JSON格式：{{"checks": [{{"statement": "...", "accuracy": "...", "confidence": "...", "evidence": "..."}}]}}"""
         
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}],
+        result, _ = await self._cached_completion(
+            "check_facts",
+            [{"role": "user", "content": prompt}],
             temperature=0.3,
+            parse=json.loads,
             response_format={"type": "json_object"}
         )
-        
-        return json.loads(response.choices[0].message.content)
\ No newline at end of file
+        return result
+
+class ExtensionBatcher:
+    """
+    单份PPT的批量扩展：按 LLMClient.plan_batches 预先分组
+    各页仍按自己的流程并发执行（检索、外部搜索），组内各页的检索上下文都到齐后发出一次批量请求
+    页面在到达前失败或被取消时调用discard，避免同组其他页面一直等待
+    """
+    def __init__(self, client: LLMClient, pages: List[Dict], template_type: str = "default", max_tokens: int = None):
+        self.client = client
+        self.template_type = template_type
+        self.max_tokens = max_tokens
+        groups = client.plan_batches([(page["page_num"], page.get("text", "")) for page in pages if page.get("text")])
+        self.group_of = {page_num: index for index, group in enumerate(groups) for page_num in group}
+        self.pending = [set(group) for group in groups]
+        self.items: List[Dict[int, Dict]] = [{} for _ in groups]
+        loop = asyncio.get_running_loop()
+        self.futures = [loop.create_future() for _ in groups]
+        self.tasks = []
+    
+    async def extend(self, page_num: int, content: str, context: List[Dict] = None) -> Dict[str, Any]:
+        index = self.group_of.get(page_num)
+        if index is None or page_num not in self.pending[index]:
+            return await self.client.extend_knowledge(content, context, self.template_type, self.max_tokens)
+        self.items[index][page_num] = {"page_num": page_num, "content": content, "context": context}
+        self._arrive(index, page_num)
+        # 单页被取消时不影响同组其他页面等待的结果
+        results = await asyncio.shield(self.futures[index])
+        return results[page_num]
+    
+    def discard(self, page_num: int):
+        """页面不再参与批量扩展（到达前失败或被取消）"""
+        index = self.group_of.get(page_num)
+        if index is not None and page_num in self.pending[index]:
+            self._arrive(index, page_num)
+    
+    def _arrive(self, index: int, page_num: int):
+        self.pending[index].discard(page_num)
+        if not self.pending[index]:
+            self.tasks.append(asyncio.create_task(self._run(index)))
+    
+    async def _run(self, index: int):
+        items = sorted(self.items[index].values(), key=lambda item: item["page_num"])
+        try:
+            results = await self.client.extend_knowledge_batch(items, self.template_type, self.max_tokens) if items else {}
+        except Exception as e:
+            self.futures[index].set_exception(e)
+        else:
+            self.futures[index].set_result(results)
\ No newline at end of file
@@ -0,0 +1,384 @@
+import json
+import os
+import shutil
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.vector_backend import VectorBackend
+
+class LocalVectorBackend(VectorBackend):
+    """
+    进程内向量存储引擎（Milvus的轻量替代）
+    - 向量: 只追加的内存映射float32文件
+    - 记录: 只追加的JSONL文件，与向量按行对应
+    - 删除: 墓碑标记，达到比例后后台压缩
+    - 检索: NumPy矩阵乘法精确top-k，数据量大时可启用IVF粗量化
+    - 过滤: 按ppt_id/course维护行号倒排索引，带过滤的检索只计算对应行
+    数据按代(generation)存放，压缩时写入新代后原子切换CURRENT指针
+    """
+    GROWTH_ROWS = 4096
+
+    def __init__(self, data_dir: str = "./data/vectors", dim: int = 384,
+                 use_ivf: bool = True, ivf_min_rows: int = 50000, nlist: int = 256, nprobe: int = 16,
+                 compact_ratio: float = 0.3):
+        self.data_dir = data_dir
+        self.dim = dim
+        self.use_ivf = use_ivf
+        self.ivf_min_rows = ivf_min_rows
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.compact_ratio = compact_ratio
+
+        self.lock = threading.RLock()
+        self.compaction_thread: Optional[threading.Thread] = None
+        os.makedirs(data_dir, exist_ok=True)
+        self._load()
+
+    # 存储文件管理
+    def _current_generation(self) -> int:
+        pointer = os.path.join(self.data_dir, "CURRENT")
+        if os.path.exists(pointer):
+            with open(pointer, "r") as f:
+                return int(f.read().strip() or 0)
+        return 0
+
+    def _generation_dir(self, generation: int) -> str:
+        return os.path.join(self.data_dir, f"gen-{generation}")
+
+    def _load(self):
+        """从当前代的文件恢复内存状态"""
+        self.generation = self._current_generation()
+        gen_dir = self._generation_dir(self.generation)
+        os.makedirs(gen_dir, exist_ok=True)
+        self.vectors_path = os.path.join(gen_dir, "vectors.f32")
+        self.records_path = os.path.join(gen_dir, "records.jsonl")
+        self.tombstones_path = os.path.join(gen_dir, "tombstones.txt")
+        self.meta_path = os.path.join(gen_dir, "meta.json")
+
+        # 记录文件决定有效行数（向量先于记录写入）
+        self.records: List[Dict[str, Any]] = []
+        if os.path.exists(self.records_path):
+            with open(self.records_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self.records.append(json.loads(line))
+        self.count = len(self.records)
+
+        if not os.path.exists(self.vectors_path):
+            open(self.vectors_path, "wb").close()
+        self.capacity = os.path.getsize(self.vectors_path) // (self.dim * 4)
+        self.vectors = None
+        if self.capacity > 0:
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(self.capacity, self.dim))
+
+        self.ids = np.array([record["id"] for record in self.records], dtype=np.int64)
+        self.id_to_row = {int(doc_id): row for row, doc_id in enumerate(self.ids)}
+        # ID只增不减：压缩会删掉持有最大ID的墓碑行，因此以压缩时保存的高水位为下限，
+        # 避免复用仍保存在结果与PPT版本中的旧ID
+        self.next_id = int(self.ids.max()) + 1 if self.count else 1
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "r") as f:
+                self.next_id = max(self.next_id, int(json.load(f)["next_id"]))
+        self.alive = np.ones(self.count, dtype=bool)
+        self.sq_norms = np.einsum("ij,ij->i", self.vectors[:self.count], self.vectors[:self.count]) \
+            if self.count else np.empty(0, dtype=np.float32)
+
+        if os.path.exists(self.tombstones_path):
+            with open(self.tombstones_path, "r") as f:
+                for line in f:
+                    row = self.id_to_row.get(int(line)) if line.strip() else None
+                    if row is not None:
+                        self.alive[row] = False
+
+        # 存活行的ppt_id/course倒排索引
+        self.deck_rows: Dict[str, List[int]] = {}
+        self.course_rows: Dict[str, List[int]] = {}
+        for row in np.flatnonzero(self.alive):
+            self._index_row(int(row), self.records[row])
+
+        self.records_file = open(self.records_path, "a", encoding="utf-8")
+        self.tombstones_file = open(self.tombstones_path, "a")
+        self._reset_ivf()
+
+    def _grow(self, min_capacity: int):
+        """扩容向量文件并重新映射"""
+        new_capacity = max(min_capacity, self.capacity + self.GROWTH_ROWS)
+        if self.vectors is not None:
+            self.vectors.flush()
+            del self.vectors
+        with open(self.vectors_path, "r+b") as f:
+            f.truncate(new_capacity * self.dim * 4)
+        self.capacity = new_capacity
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(self.capacity, self.dim))
+
+    # 后端接口
+    def add_documents(self, texts: List[str], embeddings: np.ndarray, metadatas: List[Dict]) -> List[int]:
+        """追加一批文档，返回与输入顺序一致的ID"""
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(texts), self.dim)
+        with self.lock:
+            start = self.count
+            end = start + len(texts)
+            if end > self.capacity:
+                self._grow(end)
+
+            # 先写向量，再写记录
+            self.vectors[start:end] = embeddings
+            self.vectors.flush()
+
+            doc_ids = list(range(self.next_id, self.next_id + len(texts)))
+            self.next_id += len(texts)
+            lines = []
+            for doc_id, text, metadata in zip(doc_ids, texts, metadatas):
+                record = {
+                    "id": doc_id,
+                    "ppt_id": metadata.get("ppt_id", ""),
+                    "page_num": metadata.get("page_num", 0),
+                    "title": metadata.get("title", ""),
+                    "course": metadata.get("course", ""),
+                    "content": text,
+                    "metadata": metadata
+                }
+                self.records.append(record)
+                self.id_to_row[doc_id] = len(self.records) - 1
+                self._index_row(len(self.records) - 1, record)
+                lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+            self.records_file.write("".join(lines))
+            self.records_file.flush()
+
+            self.ids = np.concatenate([self.ids, np.array(doc_ids, dtype=np.int64)])
+            self.alive = np.concatenate([self.alive, np.ones(len(texts), dtype=bool)])
+            self.sq_norms = np.concatenate([self.sq_norms, np.einsum("ij,ij->i", embeddings, embeddings)])
+            self.count = end
+
+            if self.centroids is not None:
+                self.assignments = np.concatenate([self.assignments, self._assign(embeddings)])
+
+        return doc_ids
+
+    def search_similar(self, embedding: np.ndarray, top_k: int = 5, ppt_id: Optional[str] = None,
+                       course: Optional[str] = None) -> List[Dict]:
+        """
+        L2距离精确检索（启用IVF时只在nprobe个最近的簇内检索）
+        指定ppt_id/course时只在倒排索引给出的行中精确检索，不经过IVF
+        """
+        query = np.asarray(embedding, dtype=np.float32).reshape(self.dim)
+        with self.lock:
+            if self.count == 0:
+                return []
+            filtered = ppt_id is not None or course is not None
+            if not filtered:
+                self._maybe_train_ivf()
+
+            # ||x - q||^2 = ||x||^2 - 2 x·q + ||q||^2
+            if filtered:
+                rows = self._filtered_rows(ppt_id, course)
+                distances = self.sq_norms[rows] - 2 * (self.vectors[rows] @ query) + float(query @ query)
+                available = rows.size
+            elif self.centroids is None:
+                # 全量精确检索：直接在内存映射矩阵上做矩阵乘法，墓碑行置为无穷远
+                rows = np.arange(self.count)
+                distances = self.sq_norms - 2 * (self.vectors[:self.count] @ query) + float(query @ query)
+                distances[~self.alive] = np.inf
+                available = int(self.alive.sum())
+            else:
+                centroid_dist = np.einsum("ij,ij->i", self.centroids, self.centroids) - 2 * (self.centroids @ query)
+                probe = np.argsort(centroid_dist)[:self.nprobe]
+                rows = np.flatnonzero(self.alive & np.isin(self.assignments, probe))
+                distances = self.sq_norms[rows] - 2 * (self.vectors[rows] @ query) + float(query @ query)
+                available = rows.size
+
+            k = min(top_k, available)
+            if k <= 0:
+                return []
+            best = np.argpartition(distances, k - 1)[:k]
+            best = best[np.argsort(distances[best])]
+
+            return [
+                self._format(self.records[rows[i]], score=float(max(distances[i], 0.0)))
+                for i in best
+            ]
+
+    def get_by_id(self, doc_id: int) -> Optional[Dict]:
+        with self.lock:
+            row = self.id_to_row.get(int(doc_id))
+            if row is None or not self.alive[row]:
+                return None
+            return self._format(self.records[row])
+
+    def delete_by_ppt_id(self, ppt_id: str):
+        """按倒排索引整批墓碑删除，墓碑比例超过阈值时触发后台压缩"""
+        with self.lock:
+            rows = [row for row in self.deck_rows.pop(ppt_id, []) if self.alive[row]]
+            needs_compaction = self._tombstone(rows)
+        if needs_compaction:
+            self.compact_in_background()
+
+    def delete_by_ids(self, doc_ids: List[int]):
+        with self.lock:
+            rows = [row for row in (self.id_to_row.get(int(doc_id)) for doc_id in doc_ids)
+                    if row is not None and self.alive[row]]
+            needs_compaction = self._tombstone(rows)
+        if needs_compaction:
+            self.compact_in_background()
+
+    def _index_row(self, row: int, record: Dict):
+        """把行号加入ppt_id/course倒排索引"""
+        self.deck_rows.setdefault(record["ppt_id"], []).append(row)
+        if record.get("course"):
+            self.course_rows.setdefault(record["course"], []).append(row)
+
+    def _filtered_rows(self, ppt_id: Optional[str], course: Optional[str]) -> np.ndarray:
+        """满足过滤条件的存活行（调用方持有锁）"""
+        candidates = [np.array(index.get(value, []), dtype=np.int64)
+                      for index, value in ((self.deck_rows, ppt_id), (self.course_rows, course))
+                      if value is not None]
+        rows = candidates[0] if len(candidates) == 1 else np.intersect1d(*candidates)
+        return rows[self.alive[rows]]
+
+    def _tombstone(self, rows: List[int]) -> bool:
+        """标记墓碑（调用方持有锁），返回是否需要压缩"""
+        if not rows:
+            return False
+        self.alive[rows] = False
+        self.tombstones_file.write("".join(f"{self.ids[row]}\n" for row in rows))
+        self.tombstones_file.flush()
+        return self.tombstone_ratio() >= self.compact_ratio
+
+    # IVF粗量化
+    def _reset_ivf(self):
+        self.centroids: Optional[np.ndarray] = None
+        self.assignments: Optional[np.ndarray] = None
+
+    def _assign(self, embeddings: np.ndarray) -> np.ndarray:
+        """把向量分配到最近的质心"""
+        centroid_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        distances = centroid_norms[None, :] - 2 * (embeddings @ self.centroids.T)
+        return np.argmin(distances, axis=1).astype(np.int32)
+
+    def _maybe_train_ivf(self, iterations: int = 10):
+        """存活行数达到阈值后用k-means训练粗量化器"""
+        if not self.use_ivf or self.centroids is not None or int(self.alive.sum()) < self.ivf_min_rows:
+            return
+        rng = np.random.default_rng(0)
+        alive_rows = np.flatnonzero(self.alive)
+        sample_size = min(alive_rows.size, self.nlist * 64)
+        if sample_size < self.nlist:
+            return
+        sample = np.array(self.vectors[np.sort(rng.choice(alive_rows, sample_size, replace=False))])
+        self.centroids = sample[rng.choice(sample_size, self.nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = self._assign(sample)
+            for c in range(self.nlist):
+                members = sample[labels == c]
+                if len(members):
+                    self.centroids[c] = members.mean(axis=0)
+
+        # 分块分配全部行，避免一次性物化大矩阵
+        assignments = np.empty(self.count, dtype=np.int32)
+        for start in range(0, self.count, 65536):
+            end = min(start + 65536, self.count)
+            assignments[start:end] = self._assign(np.asarray(self.vectors[start:end]))
+        self.assignments = assignments
+
+    # 压缩
+    def tombstone_ratio(self) -> float:
+        return float((~self.alive).sum()) / self.count if self.count else 0.0
+
+    def compact_in_background(self):
+        """在后台线程中执行压缩（同一时间只运行一个）"""
+        with self.lock:
+            if self.compaction_thread is not None and self.compaction_thread.is_alive():
+                return
+            self.compaction_thread = threading.Thread(target=self.compact, daemon=True)
+            self.compaction_thread.start()
+
+    def compact(self):
+        """
+        把存活行写入新一代文件，然后原子切换
+        复制阶段不持有锁；切换时补上复制期间新增的行和墓碑
+        """
+        with self.lock:
+            snapshot_count = self.count
+            snapshot_alive = self.alive[:snapshot_count].copy()
+            # 并发的add扩容时会替换self.vectors，复制阶段使用加锁时取得的映射（旧映射仍然有效）
+            snapshot_vectors, snapshot_records = self.vectors, self.records
+            old_generation = self.generation
+        new_generation = old_generation + 1
+        new_dir = self._generation_dir(new_generation)
+        shutil.rmtree(new_dir, ignore_errors=True)
+        os.makedirs(new_dir)
+
+        # 1. 复制快照中的存活行（已写入的行不可变，无需加锁）
+        keep = np.flatnonzero(snapshot_alive)
+        self._write_generation(new_dir, keep, snapshot_vectors, snapshot_records)
+        del snapshot_vectors
+
+        with self.lock:
+            # 2. 追加复制期间新增的行，记录复制期间新增的墓碑
+            extra = np.arange(snapshot_count, self.count)
+            extra = extra[self.alive[snapshot_count:self.count]]
+            self._write_generation(new_dir, extra, self.vectors, self.records, append=True)
+            deleted_since = keep[~self.alive[keep]]
+            with open(os.path.join(new_dir, "tombstones.txt"), "w") as f:
+                f.write("".join(f"{self.ids[row]}\n" for row in deleted_since))
+            with open(os.path.join(new_dir, "meta.json"), "w") as f:
+                json.dump({"next_id": self.next_id}, f)
+
+            # 3. 原子切换CURRENT并重新加载
+            pointer_tmp = os.path.join(self.data_dir, "CURRENT.tmp")
+            with open(pointer_tmp, "w") as f:
+                f.write(str(new_generation))
+            os.replace(pointer_tmp, os.path.join(self.data_dir, "CURRENT"))
+            self._close_files()
+            self._load()
+        shutil.rmtree(self._generation_dir(old_generation), ignore_errors=True)
+
+    @staticmethod
+    def _write_generation(gen_dir: str, rows: np.ndarray, vectors: np.ndarray, records: List[Dict],
+                          append: bool = False):
+        mode = "ab" if append else "wb"
+        with open(os.path.join(gen_dir, "vectors.f32"), mode) as f:
+            for start in range(0, rows.size, 65536):
+                f.write(np.ascontiguousarray(vectors[rows[start:start + 65536]]).tobytes())
+        with open(os.path.join(gen_dir, "records.jsonl"), "a" if append else "w", encoding="utf-8") as f:
+            f.write("".join(json.dumps(records[row], ensure_ascii=False) + "\n" for row in rows))
+
+    def _close_files(self):
+        if self.vectors is not None:
+            self.vectors.flush()
+            del self.vectors
+            self.vectors = None
+        self.records_file.close()
+        self.tombstones_file.close()
+
+    def close(self):
+        if self.compaction_thread is not None:
+            self.compaction_thread.join()
+        with self.lock:
+            self._close_files()
+
+    def _format(self, record: Dict, score: Optional[float] = None) -> Dict:
+        result = {
+            "id": record["id"],
+            "content": record["content"],
+            "title": record["title"],
+            "page_num": record["page_num"],
+            "metadata": record["metadata"]
+        }
+        if score is not None:
+            result["score"] = score
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "backend": "local",
+                "rows": self.count,
+                "alive": int(self.alive.sum()),
+                "decks": len(self.deck_rows),
+                "tombstone_ratio": self.tombstone_ratio(),
+                "generation": self.generation,
+                "ivf_trained": self.centroids is not None
+            }
\ No newline at end of file
@@ -1,18 +1,174 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from contextlib import asynccontextmanager
+from datetime import datetime
 import asyncio
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+import os
+import time
 import uuid
-import json
 
-from app.ppt_parser import PPTParser
-from app.vector_store import VectorStore
-from app.llm_client import LLMClient
-from app.search_client import SearchClient
+import orjson
+from pydantic import ValidationError
+
 from app.models import PPTRequest, ExtendResponse, PageContent
+from app.deck_versions import plan_deck_version
+from app.job_queue import JobQueue, JobStore
+from app.image_store import ImageStore
+from app.response_encoding import ResponseEncoder
+from app.result_store import ResultStore
+from app.stage_timings import StageTimings
+from app.temp_files import TempFileManager, UploadTooLargeError
+
+def _process_started_at() -> float:
+    """进程启动时刻（epoch秒）；无法读取/proc时退化为模块导入时刻"""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - uptime + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+PROCESS_STARTED_AT = _process_started_at()
+
+# 全局组件（由lifespan在后台初始化，重依赖在各自的工厂函数中按需导入）
+ppt_parser = None
+vector_store = None
+llm_client = None
+search_client = None
+
+# 异步任务队列（在lifespan中创建，组件全部就绪后启动worker）
+job_queue: Optional[JobQueue] = None
+# 处理结果存储（按上传内容去重）
+result_store: Optional[ResultStore] = None
+# 上传临时文件管理（大小限制、清理与配额）
+temp_files: Optional[TempFileManager] = None
+# 按内容哈希保存的幻灯片图片（解析器写入，图片接口读取）
+image_store: Optional[ImageStore] = None
+
+# 结果类响应的格式（JSON/msgpack）与压缩（zstd/gzip）协商
+response_encoder = ResponseEncoder.from_env()
+# 各处理阶段的平均耗时，用于估算按选项跳过阶段节省的时间
+stage_timings = StageTimings()
+
+# 外部检索源；上传时未指定include_sources则全部查询
+EXTERNAL_SOURCES = ("wikipedia", "arxiv", "semantic_scholar")
+# include_sources的取值，表示不查询外部源
+NO_SOURCES = "none"
+# 未指定选项时的处理方式（与支持选项之前的行为一致）
+DEFAULT_OPTIONS = {"extension_depth": "normal", "include_sources": list(EXTERNAL_SOURCES), "generate_questions": False,
+                   "course": None}
+
+# multipart请求体中除文件内容外的边界与表单头开销上限
+MULTIPART_OVERHEAD = 64 * 1024
+
+def _build_ppt_parser():
+    from app.ppt_parser import PPTParser
+    return PPTParser()
+
+def _build_vector_store():
+    from app.vector_store import VectorStore
+    store = VectorStore()
+    store.warm_up()
+    return store
+
+def _build_llm_client():
+    from app.llm_client import LLMClient
+    return LLMClient()
+
+def _build_search_client():
+    from app.search_client import SearchClient
+    return SearchClient()
+
+COMPONENT_FACTORIES = {
+    "ppt_parser": _build_ppt_parser,
+    "vector_store": _build_vector_store,
+    "llm_client": _build_llm_client,
+    "search_client": _build_search_client,
+}
+
+# 组件就绪状态与启动耗时
+component_status: Dict[str, Dict[str, Any]] = {
+    name: {"ready": False, "error": None, "init_seconds": None} for name in COMPONENT_FACTORIES
+}
+startup_metrics: Dict[str, Optional[float]] = {
+    "first_health_seconds": None,
+    "ready_seconds": None,
+}
+
+async def _init_component(name: str):
+    """在线程池中构建单个组件，失败只影响该组件的就绪状态"""
+    started = time.perf_counter()
+    try:
+        instance = await asyncio.to_thread(COMPONENT_FACTORIES[name])
+        globals()[name] = instance
+        component_status[name]["ready"] = True
+        component_status[name]["error"] = None
+    except Exception as e:
+        component_status[name]["error"] = str(e)
+        print(f"组件 {name} 初始化失败: {e}")
+    finally:
+        component_status[name]["init_seconds"] = round(time.perf_counter() - started, 3)
+
+async def init_components():
+    """并行初始化全部组件"""
+    await asyncio.gather(*(_init_component(name) for name in COMPONENT_FACTORIES))
+    
+    # 连接池等依赖事件循环的资源在主循环中创建
+    if component_status["search_client"]["ready"]:
+        await search_client.start()
+    if all(status["ready"] for status in component_status.values()):
+        startup_metrics["ready_seconds"] = round(time.time() - PROCESS_STARTED_AT, 3)
+        if job_queue is not None:
+            await job_queue.start()
+
+async def shutdown_components():
+    """释放组件资源"""
+    global job_queue, result_store
+    if job_queue is not None:
+        await job_queue.close()
+        job_queue = None
+    if result_store is not None:
+        result_store.close()
+        result_store = None
+    if search_client is not None:
+        await search_client.close()
+    if vector_store is not None:
+        vector_store.close()
+    if llm_client is not None:
+        llm_client.close()
+    if ppt_parser is not None:
+        ppt_parser.close()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global job_queue, result_store, temp_files, image_store
+    # 任务库与结果库先于组件打开，初始化期间也能查询任务状态
+    result_store = ResultStore.from_env()
+    image_store = ImageStore.from_env()
+    job_queue = JobQueue(JobStore.from_env(), process_job, workers=int(os.getenv("JOB_WORKERS", "2")))
+    # 未完成任务引用的上传文件不参与清理
+    temp_files = TempFileManager.from_env(
+        protected=lambda: job_queue.store.unfinished_files() if job_queue is not None else ()
+    )
+    janitor_task = asyncio.create_task(temp_files.run_janitor(float(os.getenv("TEMP_JANITOR_INTERVAL", "60"))))
+    # 后台初始化，不阻塞 /health 的响应
+    init_task = asyncio.create_task(init_components())
+    yield
+    init_task.cancel()
+    janitor_task.cancel()
+    await shutdown_components()
+
+def require_component(name: str):
+    """获取已就绪的组件，未就绪时返回503"""
+    if not component_status[name]["ready"]:
+        raise HTTPException(status_code=503, detail=f"{name} 尚未就绪")
+    return globals()[name]
 
-app = FastAPI(title="PPT知识扩展智能体", version="1.0.0")
+app = FastAPI(title="PPT知识扩展智能体", version="1.0.0", lifespan=lifespan)
 
 # CORS配置
 app.add_middleware(
@@ -23,109 +179,866 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 全局组件
-ppt_parser = PPTParser()
-vector_store = VectorStore()
-llm_client = LLMClient()
-search_client = SearchClient()
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """按Content-Length提前拒绝超限的上传，避免先完整接收请求体"""
+    if temp_files is not None and request.method == "POST" and request.url.path.startswith("/api/ppt/upload"):
+        length = request.headers.get("content-length", "")
+        if length.isdigit() and int(length) > temp_files.max_upload_bytes + MULTIPART_OVERHEAD:
+            temp_files.rejected += 1
+            return JSONResponse(status_code=413,
+                                content={"detail": f"文件大小超过限制 {temp_files.max_upload_bytes} 字节"})
+    return await call_next(request)
 
 @app.post("/api/ppt/upload", response_model=ExtendResponse)
-async def upload_and_extend_ppt(file: UploadFile = File(...)):
+async def upload_and_extend_ppt(request: Request, file: UploadFile = File(...), deck_id: Optional[str] = None,
+                                extension_depth: str = "normal", include_sources: Optional[List[str]] = Query(None),
+                                generate_questions: bool = False, course: Optional[str] = None):
     """
     上传PPT文件并自动扩展知识
+    deck_id: PPT的稳定标识；给出时与该PPT上一版本逐页比对，只重新处理内容变化的页面
+    extension_depth / include_sources / generate_questions: 同PPTRequest，可跳过不需要的阶段
+        （include_sources=none表示不查询外部源）
+    course: 所属课程；给出时各页的相似内容只在同一课程中检索，否则只在本PPT中检索
     """
+    options = upload_options(extension_depth, include_sources, generate_questions, course)
+    for name in COMPONENT_FACTORIES:
+        require_component(name)
+    
+    started = time.perf_counter()
+    file_path, version = None, None
     try:
-        # 1. 保存上传文件
-        file_id = str(uuid.uuid4())
-        file_path = f"temp/{file_id}_{file.filename}"
+        # 1. 保存上传文件（同时计算内容哈希）
+        file_id, file_path, content_hash = await save_upload(file)
         
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        # 2. 相同内容与选项已处理过时直接返回已有结果
+        #    （指定deck_id时不按内容去重，由逐页指纹比对复用上一版本并记录新版本）
+        options_key = result_options_key(options)
+        cached = find_processed(content_hash, options_key) if deck_id is None else None
+        if cached is not None:
+            result_store.record_hit(time.perf_counter() - started)
+            return await response_encoder.response(request, cached)
         
-        # 2. 解析PPT结构
-        ppt_structure = await ppt_parser.parse_ppt(file_path)
+        # 3. 解析并批量写入向量库（指定deck_id时只写入变化的页面）
+        ppt_structure, vector_ids, version = await parse_and_ingest(file_id, file_path, deck_id, options_key,
+                                                                    options["course"])
         
-        # 3. 逐页处理（异步并行）
+        # 4. 逐页处理（异步并行；开启批量扩展时相邻页面合并为一次LLM请求）
+        batcher = make_batcher(ppt_structure["pages"], version, options)
         tasks = []
         for page in ppt_structure["pages"]:
-            task = process_page_content(page, file_id)
+            task = extend_page(page, file_id, vector_ids, version, batcher, options)
             tasks.append(task)
         
         extended_pages = await asyncio.gather(*tasks)
         
-        # 4. 构建响应
-        response = ExtendResponse(
-            ppt_id=file_id,
-            original_filename=file.filename,
-            total_pages=len(extended_pages),
-            pages=extended_pages,
-            structure=ppt_structure
-        )
+        # 5. 构建响应并保存，供重复上传与按ppt_id查询
+        elapsed = time.perf_counter() - started
+        result = build_result(file_id, file.filename, extended_pages, ppt_structure, elapsed)
+        save_result(result, content_hash, options_key, version, options)
+        if version is not None:
+            await asyncio.to_thread(finish_version, version, True)
         
-        return response
+        return await response_encoder.response(request, result)
         
     except Exception as e:
+        # 未保存结果时撤销本次写入的向量，上一版本仍是最新版本
+        if version is not None:
+            await asyncio.to_thread(finish_version, version, False)
+        if isinstance(e, HTTPException):
+            raise
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # 无论成功失败都删除上传的临时文件
+        if file_path is not None:
+            temp_files.release(file_path)
 
-async def process_page_content(page_data: Dict, file_id: str) -> PageContent:
+@app.post("/api/ppt/upload/stream")
+async def upload_and_stream_ppt(request: Request, file: UploadFile = File(...), format: Optional[str] = None,
+                                deck_id: Optional[str] = None, extension_depth: str = "normal",
+                                include_sources: Optional[List[str]] = Query(None), generate_questions: bool = False,
+                                course: Optional[str] = None):
     """
-    处理单页PPT内容
+    上传PPT文件并流式返回处理结果
+    先发送结构与目录，再按完成顺序逐页发送，最后发送汇总
+    默认NDJSON；Accept为text/event-stream或format=sse时使用SSE
+    deck_id、课程与处理选项同 /api/ppt/upload
     """
-    # 1. 提取文本内容
-    text_content = page_data.get("text", "")
-    if not text_content:
-        return PageContent(**page_data)
-    
-    # 2. 存入向量数据库
-    vector_id = vector_store.add_document(
-        text=text_content,
-        metadata={
-            "ppt_id": file_id,
-            "page_num": page_data["page_num"],
-            "title": page_data.get("title", "")
+    options = upload_options(extension_depth, include_sources, generate_questions, course)
+    for name in COMPONENT_FACTORIES:
+        require_component(name)
+    
+    started = time.perf_counter()
+    file_path, version = None, None
+    try:
+        file_id, file_path, content_hash = await save_upload(file)
+        options_key = result_options_key(options)
+        cached = find_processed(content_hash, options_key) if deck_id is None else None
+        if cached is not None:
+            records = stream_stored_records(cached, started)
+        else:
+            ppt_structure, vector_ids, version = await parse_and_ingest(file_id, file_path, deck_id, options_key,
+                                                                        options["course"])
+            records = stream_page_records(file_id, file.filename, ppt_structure, vector_ids, started,
+                                          result_key=(content_hash, options_key), version=version, options=options)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # 解析完成后不再需要原文件
+        if file_path is not None:
+            temp_files.release(file_path)
+    
+    if format == "sse" or "text/event-stream" in request.headers.get("accept", ""):
+        body, media_type = (encode_sse(record) async for record in records), "text/event-stream"
+    else:
+        body, media_type = (encode_ndjson(record) async for record in records), "application/x-ndjson"
+    
+    async def close_records():
+        # 客户端断开或响应未发送时生成器不会被迭代完，这里统一关闭（取消未完成的页面），
+        # 按deck_id上传时再保留或撤销本次写入的向量
+        await records.aclose()
+        if version is not None:
+            await asyncio.to_thread(finish_version, version, version.get("committed", False))
+    
+    # 关闭反向代理缓冲，保证每条记录立即送达
+    return RecordStreamingResponse(body, media_type=media_type, on_close=close_records,
+                                   headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/api/ppt/upload/async", status_code=202)
+async def upload_ppt_async(file: UploadFile = File(...), extension_depth: str = "normal",
+                           include_sources: Optional[List[str]] = Query(None), generate_questions: bool = False,
+                           course: Optional[str] = None):
+    """
+    上传PPT文件并提交后台任务，立即返回ppt_id
+    处理进度通过 GET /api/ppt/{ppt_id} 查询；处理选项（含课程）随任务保存
+    """
+    options = upload_options(extension_depth, include_sources, generate_questions, course)
+    if job_queue is None:
+        raise HTTPException(status_code=503, detail="任务队列尚未就绪")
+    
+    started = time.perf_counter()
+    file_id, file_path, content_hash = await save_upload(file)
+    
+    # LLM客户端就绪时才能确定选项指纹，否则直接入队
+    if component_status["llm_client"]["ready"]:
+        cached = find_processed(content_hash, result_options_key(options))
+        if cached is not None:
+            temp_files.release(file_path)
+            result_store.record_hit(time.perf_counter() - started)
+            return JSONResponse({"ppt_id": cached["ppt_id"], "status": "done",
+                                 "status_url": f"/api/ppt/{cached['ppt_id']}", "deduplicated": True})
+    
+    job_queue.submit(file_id, file.filename, file_path, content_hash, options)
+    # 文件交给后台任务，任务完成后删除
+    temp_files.release(file_path, delete=False)
+    return {"ppt_id": file_id, "status": "queued", "status_url": f"/api/ppt/{file_id}"}
+
+async def save_upload(file: UploadFile):
+    """
+    分块保存上传文件，写入的同时计算SHA-256
+    返回: (文件ID, 文件路径, 内容哈希)
+    """
+    file_id = str(uuid.uuid4())
+    try:
+        file_path, content_hash = await temp_files.save(file, file_id)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    return file_id, file_path, content_hash
+
+async def parse_and_ingest(file_id: str, file_path: str, deck_id: Optional[str] = None,
+                           options_key: Optional[str] = None, course: Optional[str] = None):
+    """
+    解析PPT结构并批量写入向量数据库（向量带有所属课程，供按课程过滤检索）
+    返回: (PPT结构, 页码 -> 向量ID, 版本信息)；未指定deck_id时版本信息为None
+    """
+    ppt_structure = await parse_deck(file_path)
+    
+    if deck_id is not None:
+        version = await asyncio.to_thread(ingest_version, ppt_structure["pages"], deck_id, options_key, course)
+        return ppt_structure, version["vector_ids"], version
+    
+    # 整份PPT批量写入向量数据库（一次编码、一次插入、一次flush）
+    vector_ids = await asyncio.to_thread(ingest_pages, ppt_structure["pages"], file_id, course)
+    return ppt_structure, vector_ids, None
+
+def ingest_version(pages: List[Dict], deck_id: str, options_key: str, course: Optional[str] = None) -> Dict:
+    """
+    按页面指纹与上一版本比对，只写入修改、新增或移动了的页面
+    向量以deck_id作为ppt_id写入，保留下来的向量跨版本有效；
+    上一版本中失效的向量在新版本保存后才删除（见finish_version）
+    返回: {deck_id, vector_ids, reused（页码 -> 可复用的旧页面）, new_vector_ids, stale_vector_ids, stats}
+    """
+    # 1. 找到上一版本的结果
+    latest = result_store.latest_version(deck_id)
+    previous = result_store.get(latest[0]) if latest is not None else None
+    
+    # 2. 比对页面；上一版本的结果已被淘汰时无法逐页比对，其向量也不再被任何结果引用，
+    #    清空该PPT的全部向量后完整处理
+    if previous is None:
+        if latest is not None:
+            vector_store.delete_by_ppt_id(deck_id)
+        plan = plan_deck_version([], pages)
+    else:
+        plan = plan_deck_version(previous["pages"], pages, reuse_extensions=latest[1] == options_key)
+    
+    # 3. 只写入没有可保留向量的页面
+    vector_ids = dict(plan["vector_ids"])
+    new_vector_ids = ingest_pages([page for page in pages if page["page_num"] not in vector_ids], deck_id, course,
+                                  versioned=True)
+    vector_ids.update(new_vector_ids)
+    return {
+        "deck_id": deck_id,
+        "vector_ids": vector_ids,
+        "reused": plan["reused"],
+        "new_vector_ids": list(new_vector_ids.values()),
+        "stale_vector_ids": plan["stale_vector_ids"],
+        "stats": {
+            "deck_id": deck_id,
+            "previous_ppt_id": latest[0] if previous is not None else None,
+            "reused_pages": len(plan["reused"]),
+            "extended_pages": len(pages) - len(plan["reused"]),
+            "vectors_kept": len(plan["vector_ids"]),
+            "vectors_deleted": len(plan["stale_vector_ids"])
         }
-    )
+    }
+
+def finish_version(version: Dict, committed: bool):
+    """
+    按deck_id上传结束后清理向量：新版本已保存时删除上一版本中失效的向量；
+    处理失败、未保存时删除本次新写入的向量，上一版本的结果与向量保持不变
+    """
+    doc_ids = version["stale_vector_ids"] if committed else version["new_vector_ids"]
+    if doc_ids:
+        vector_store.delete_by_ids(doc_ids)
+
+def make_batcher(pages: List[Dict], version: Optional[Dict] = None, options: Optional[Dict] = None):
+    """LLM_BATCH_PAGES大于1时为需要扩展的页面（不含复用的页面）创建批量扩展器，否则返回None"""
+    if llm_client.batch_pages <= 1:
+        return None
+    from app.llm_client import ExtensionBatcher
+    reused = version["reused"] if version is not None else {}
+    template_type, max_tokens = llm_client.EXTENSION_DEPTHS[(options or DEFAULT_OPTIONS)["extension_depth"]]
+    return ExtensionBatcher(llm_client, [page for page in pages if page["page_num"] not in reused],
+                            template_type, max_tokens)
+
+async def extend_page(page: Dict, file_id: str, vector_ids: Dict[int, int], version: Optional[Dict] = None,
+                      batcher=None, options: Optional[Dict] = None) -> Dict:
+    """扩展单页；上一版本中有相同内容的页面时直接复用其扩展、外部引用与问题"""
+    page_num = page["page_num"]
+    previous = version["reused"].get(page_num) if version is not None else None
+    if previous is not None:
+        return page_record(page, extensions=previous.get("extensions", {}),
+                           external_references=previous.get("external_references", {}),
+                           questions=previous.get("questions", []),
+                           vector_id=vector_ids.get(page_num))
+    # 按deck_id上传时向量以deck_id写入
+    vector_ppt_id = version["deck_id"] if version is not None else file_id
+    return await process_page_content(page, vector_ppt_id, vector_ids.get(page_num), batcher, options)
+
+def skipped_stages(options: Dict, pages: int) -> Dict:
+    """
+    按选项跳过或缩减的阶段，以及按各阶段平均耗时估算的节省时间（pages页累计的处理时间，非墙钟时间）
+    尚未执行过、无法估算的阶段列在unmeasured中
+    """
+    stages, unmeasured, saved = [], [], 0.0
     
-    # 3. 获取相似内容（用于扩展）
-    similar_chunks = vector_store.search_similar(text_content, top_k=3)
+    def skip(stage: str, seconds: Optional[float]):
+        nonlocal saved
+        stages.append(stage)
+        if seconds is None:
+            unmeasured.append(stage)
+        else:
+            saved += seconds * pages
     
-    # 4. 调用LLM进行知识扩展
-    llm_extensions = await llm_client.extend_knowledge(
-        content=text_content,
-        context=similar_chunks
-    )
+    latency = search_client.source_latency()
+    for source in EXTERNAL_SOURCES:
+        if source not in options["include_sources"]:
+            skip(f"search:{source}", latency.get(source))
+    if not options["generate_questions"]:
+        skip("questions", stage_timings.average("questions"))
+    if options["extension_depth"] == "simple":
+        # 简单深度仍然扩展，节省的是完整模板与较大补全上限的额外耗时
+        normal, simple = stage_timings.average("extension:normal"), stage_timings.average("extension:simple")
+        skip("extension:normal", normal - simple if normal is not None and simple is not None else None)
+    return {"stages": stages, "pages": pages, "estimated_seconds_saved": round(saved, 3), "unmeasured": unmeasured}
+
+def save_result(result: Dict, content_hash: str, options_key: str, version: Optional[Dict] = None,
+                options: Optional[Dict] = None):
+    """
+    保存结果供重复上传与按ppt_id查询；按deck_id上传时同时记录为该PPT的最新版本
+    结果中附带生效的处理选项与跳过的阶段
+    """
+    options = options or DEFAULT_OPTIONS
+    reused = len(version["reused"]) if version is not None else 0
+    result["options"] = options
+    result["skipped"] = skipped_stages(options, sum(1 for page in result["pages"] if page.get("text")) - reused)
+    if version is not None:
+        result["version_stats"] = version["stats"]
+    # 按deck_id上传的结果只属于该PPT：去重键中加入deck_id，不会被其他上传命中或替换
+    store_key = options_key if version is None else \
+        ResultStore.make_options_key({"options": options_key, "deck_id": version["deck_id"]})
+    result_store.put(result["ppt_id"], content_hash, store_key, result)
+    result_store.record_processed(result["processing_time"])
+    if version is not None:
+        result_store.put_version(version["deck_id"], result["ppt_id"], options_key, version["stats"])
+
+async def parse_deck(file_path: str) -> Dict:
+    """解析PPT并累计图片去重统计"""
+    ppt_structure = await ppt_parser.parse_ppt(file_path)
+    if image_store is not None and "image_stats" in ppt_structure:
+        image_store.record_deck(ppt_structure["image_stats"])
+    return ppt_structure
+
+def upload_options(extension_depth: str, include_sources: Optional[List[str]], generate_questions: bool,
+                   course: Optional[str] = None) -> Dict:
+    """
+    按PPTRequest校验上传时的处理选项；include_sources未指定时查询全部外部源
+    空列表无法通过查询串传递，include_sources=none表示不查询任何外部源
+    """
+    if include_sources == [NO_SOURCES]:
+        include_sources = []
+    try:
+        request = PPTRequest(
+            extension_depth=extension_depth,
+            include_sources=list(EXTERNAL_SOURCES) if include_sources is None else include_sources,
+            generate_questions=generate_questions,
+            course=course
+        )
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+    return {
+        "extension_depth": request.extension_depth,
+        # 去重并按固定顺序排列，使选项指纹与传入顺序无关
+        "include_sources": [source for source in EXTERNAL_SOURCES if source in request.include_sources],
+        "generate_questions": request.generate_questions,
+        "course": request.course
+    }
+
+def result_options_key(options: Optional[Dict] = None) -> str:
+    """
+    影响处理结果的选项指纹（模型、扩展模板、批量扩展与上传时的处理选项）
+    默认选项不写入指纹，支持选项之前保存的结果仍可命中
+    课程决定相似检索的范围与向量的课程标记，也计入指纹
+    """
+    options = options or DEFAULT_OPTIONS
+    key = {"model": llm_client.model, "template_type": "default"}
+    if llm_client.batch_pages > 1:
+        key["batch_pages"] = llm_client.batch_pages
+    for name, default in DEFAULT_OPTIONS.items():
+        if options.get(name, default) != default:
+            key[name] = options[name]
+    return ResultStore.make_options_key(key)
+
+def find_processed(content_hash: str, options_key: str) -> Optional[Dict]:
+    """查找相同内容与选项的已完成结果"""
+    ppt_id = result_store.lookup(content_hash, options_key)
+    return result_store.get(ppt_id) if ppt_id is not None else None
+
+async def stream_page_records(file_id: str, filename: str, ppt_structure: Dict,
+                              vector_ids: Dict[int, int], started: float, result_key=None,
+                              version: Optional[Dict] = None, options: Optional[Dict] = None):
+    """
+    逐条产出流式记录：structure -> page/error（按完成顺序） -> summary
+    单页失败只产出error记录，不中断其余页面；客户端断开时取消未完成的页面
+    全部页面成功且给出result_key（内容哈希, 选项指纹）时保存结果，并在version中记录committed
+    （按deck_id上传时的向量收尾由RecordStreamingResponse结束时执行）
+    """
+    pages = ppt_structure["pages"]
+    yield {
+        "type": "structure",
+        "ppt_id": file_id,
+        "original_filename": filename,
+        "total_pages": len(pages),
+        "toc": ppt_structure.get("toc", []),
+        "image_stats": ppt_structure.get("image_stats", {}),
+        "parse_stats": ppt_structure.get("parse_stats", {}),
+        "pages": [{"page_num": page["page_num"], "title": page.get("title", "")} for page in pages]
+    }
+    
+    batcher = make_batcher(pages, version, options)
+    
+    async def run(page: Dict):
+        page_num = page["page_num"]
+        try:
+            return page_num, await extend_page(page, file_id, vector_ids, version, batcher, options), None
+        except Exception as e:
+            return page_num, None, e
+    
+    tasks = [asyncio.create_task(run(page)) for page in pages]
+    completed, failed = 0, 0
+    extended_pages = {}
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            page_num, page_content, error = await next_done
+            if error is None:
+                completed += 1
+                extended_pages[page_num] = page_content
+                yield {"type": "page", "seq": completed + failed, "page_num": page_num, "page": page_content}
+            else:
+                failed += 1
+                yield {"type": "error", "seq": completed + failed, "page_num": page_num, "detail": str(error)}
+    finally:
+        for task in tasks:
+            task.cancel()
+    
+    elapsed = time.perf_counter() - started
+    if result_key is not None and failed == 0:
+        result = build_result(file_id, filename, [extended_pages[num] for num in sorted(extended_pages)],
+                              ppt_structure, elapsed)
+        save_result(result, *result_key, version, options)
+        if version is not None:
+            version["committed"] = True
+    
+    summary = {
+        "type": "summary",
+        "ppt_id": file_id,
+        "total_pages": len(pages),
+        "completed": completed,
+        "failed": failed,
+        "processing_time": round(elapsed, 3)
+    }
+    if version is not None:
+        summary["version_stats"] = version["stats"]
+    if result_key is not None and failed == 0:
+        summary["skipped"] = result["skipped"]
+    yield summary
+
+async def stream_stored_records(result: Dict, started: float):
+    """以流式记录格式回放已保存的结果"""
+    yield {
+        "type": "structure",
+        "ppt_id": result["ppt_id"],
+        "original_filename": result["original_filename"],
+        "total_pages": result["total_pages"],
+        "toc": result["structure"].get("toc", []),
+        "pages": [{"page_num": page["page_num"], "title": page.get("title", "")} for page in result["pages"]]
+    }
+    for seq, page in enumerate(result["pages"], 1):
+        yield {"type": "page", "seq": seq, "page_num": page["page_num"], "page": page}
+    
+    elapsed = time.perf_counter() - started
+    result_store.record_hit(elapsed)
+    yield {
+        "type": "summary",
+        "ppt_id": result["ppt_id"],
+        "total_pages": result["total_pages"],
+        "completed": len(result["pages"]),
+        "failed": 0,
+        "processing_time": round(elapsed, 3),
+        "cached": True
+    }
+
+class RecordStreamingResponse(StreamingResponse):
+    """
+    流式记录响应：无论正常结束、客户端断开还是发送失败，结束时都执行on_close
+    （生成器的finally只在被迭代过且被关闭时才执行，不能依赖它撤销已写入的数据）
+    """
+    def __init__(self, content, on_close=None, **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if self.on_close is not None:
+                await self.on_close()
+
+def encode_ndjson(record: Dict) -> bytes:
+    return orjson.dumps(record) + b"\n"
+
+def encode_sse(record: Dict) -> bytes:
+    return b"event: " + record["type"].encode() + b"\ndata: " + orjson.dumps(record) + b"\n\n"
+
+def page_record(page_data: Dict, **extra) -> Dict:
+    """
+    补齐PageContent的默认字段；解析器产出的页面结构已确定，不再逐页用pydantic重新校验
+    """
+    return {
+        "page_num": page_data["page_num"],
+        "title": page_data.get("title", ""),
+        "text": page_data.get("text", ""),
+        "elements": page_data.get("elements", []),
+        "images": page_data.get("images", []),
+        "extensions": extra.get("extensions", page_data.get("extensions", {})),
+        "external_references": extra.get("external_references", page_data.get("external_references", {})),
+        "questions": extra.get("questions", page_data.get("questions", [])),
+        "vector_id": extra.get("vector_id", page_data.get("vector_id"))
+    }
+
+def build_result(ppt_id: str, filename: str, pages: List[Dict], ppt_structure: Dict, elapsed: float) -> Dict:
+    """组装与ExtendResponse字段一致的结果字典（结构只含元数据与目录）"""
+    return {
+        "ppt_id": ppt_id,
+        "original_filename": filename,
+        "total_pages": len(pages),
+        "pages": pages,
+        "structure": {
+            "filename": ppt_structure.get("filename", filename),
+            "total_pages": ppt_structure.get("total_pages", len(pages)),
+            "toc": ppt_structure.get("toc", []),
+            "image_stats": ppt_structure.get("image_stats", {}),
+            "parse_stats": ppt_structure.get("parse_stats", {})
+        },
+        "processing_time": round(elapsed, 3),
+        "timestamp": datetime.now().isoformat()
+    }
+
+def ingest_pages(pages: List[Dict], file_id: str, course: Optional[str] = None,
+                 versioned: bool = False) -> Dict[int, int]:
+    """
+    批量写入整份PPT中有文本的页面
+    course: 所属课程，写入向量元数据供按课程过滤检索
+    versioned: 按deck_id上传（file_id为稳定的deck_id），Milvus deck分区模式下为其建立独立分区
+    返回: 页码 -> 向量ID
+    """
+    text_pages = [page for page in pages if page.get("text")]
+    if not text_pages:
+        return {}
     
-    # 5. 外部搜索补充
-    search_results = await search_client.search_external(
-        query=page_data.get("title", text_content[:50])
+    vector_ids = vector_store.add_documents(
+        texts=[page["text"] for page in text_pages],
+        metadatas=[
+            {
+                "ppt_id": file_id,
+                "page_num": page["page_num"],
+                "title": page.get("title", ""),
+                **({"course": course} if course else {}),
+                **({"versioned": True} if versioned else {})
+            }
+            for page in text_pages
+        ]
     )
+    return {page["page_num"]: vector_id for page, vector_id in zip(text_pages, vector_ids)}
+
+async def process_page_content(page_data: Dict, file_id: str, vector_id: Optional[int] = None,
+                               batcher=None, options: Optional[Dict] = None) -> Dict:
+    """
+    处理单页PPT内容（向量已由ingest_pages批量写入）
+    外部搜索与问题生成不依赖LLM扩展，与 相似检索 -> LLM扩展 并发执行
+    相似检索限定在同一课程内；未指定课程时限定在file_id（向量中的ppt_id）对应的PPT内
+    batcher: ExtensionBatcher，给出时LLM扩展与同组页面合并为一次请求
+    options: 上传时的处理选项（扩展深度、外部源、是否生成问题），默认DEFAULT_OPTIONS
+    """
+    # 1. 提取文本内容
+    text_content = page_data.get("text", "")
+    if not text_content:
+        return page_record(page_data)
+    options = options or DEFAULT_OPTIONS
+    depth = options["extension_depth"]
+    
+    # 2. 外部搜索补充与问题生成（与下面两步并发；未选择的源与阶段不执行）
+    sources = options["include_sources"]
+    search_kwargs = {} if sources == list(EXTERNAL_SOURCES) else {"sources": sources}
+    search_task = asyncio.create_task(search_client.search_external(
+        query=page_data.get("title", text_content[:50]), **search_kwargs
+    )) if sources else None
+    questions_task = asyncio.create_task(timed_stage(
+        "questions", llm_client.generate_questions(text_content)
+    )) if options["generate_questions"] else None
+    
+    # 默认深度保持原有调用方式；其余深度选择对应的模板与补全上限
+    extension_kwargs = {}
+    if depth != "normal":
+        template_type, max_tokens = llm_client.EXTENSION_DEPTHS[depth]
+        extension_kwargs = {"template_type": template_type, "max_tokens": max_tokens}
+    try:
+        # 3. 获取相似内容（用于扩展），排除页面自身的向量，按课程或PPT过滤；编码与检索在线程中执行，不阻塞事件循环
+        course = options.get("course")
+        similar_chunks = await asyncio.to_thread(
+            vector_store.search_similar, text_content, top_k=3,
+            exclude_ids=() if vector_id is None else (vector_id,),
+            **({"course": course} if course else {"ppt_id": file_id})
+        )
+        
+        # 4. 调用LLM进行知识扩展
+        if batcher is not None:
+            extension = batcher.extend(page_data["page_num"], text_content, similar_chunks)
+        else:
+            extension = llm_client.extend_knowledge(
+                content=text_content,
+                context=similar_chunks,
+                **extension_kwargs
+            )
+        llm_extensions = await timed_stage(f"extension:{depth}", extension)
+        
+        search_results = await search_task if search_task is not None else {}
+        questions = await questions_task if questions_task is not None else []
+    finally:
+        # LLM或检索失败时不再等待外部搜索与问题生成；检索失败的页面不再占用批量请求中的位置
+        for task in (search_task, questions_task):
+            if task is not None:
+                task.cancel()
+        if batcher is not None:
+            batcher.discard(page_data["page_num"])
     
-    # 6. 合并结果
-    return PageContent(
-        **page_data,
+    # 5. 合并结果
+    return page_record(
+        page_data,
         extensions=llm_extensions,
         external_references=search_results,
+        questions=questions,
         vector_id=vector_id
     )
 
+async def timed_stage(stage: str, coroutine):
+    """执行一个阶段并记录耗时"""
+    started = time.perf_counter()
+    result = await coroutine
+    stage_timings.record(stage, time.perf_counter() - started)
+    return result
+
+async def process_job(ppt_id: str):
+    """
+    执行一个异步任务：parsing -> extending -> done
+    已写入的向量与已完成的页面保存在任务库中，中断后重新执行时跳过
+    """
+    store = job_queue.store
+    job = store.get(ppt_id)
+    timings = job["stage_timings"]
+    
+    # 1. 解析PPT结构
+    store.update(ppt_id, status="parsing")
+    started = time.perf_counter()
+    ppt_structure = await parse_deck(job["file_path"])
+    pages = ppt_structure["pages"]
+    timings["parse"] = round(time.perf_counter() - started, 3)
+    
+    # 2. 写入向量数据库（续跑时已写入则跳过，避免重复向量）
+    options = job["options"] or DEFAULT_OPTIONS
+    vector_ids = job["vector_ids"]
+    if vector_ids is None:
+        started = time.perf_counter()
+        vector_ids = await asyncio.to_thread(ingest_pages, pages, ppt_id, options.get("course"))
+        timings["ingest"] = round(time.perf_counter() - started, 3)
+        store.update(ppt_id, vector_ids=vector_ids)
+    store.update(ppt_id, status="extending", total_pages=len(pages), stage_timings=timings)
+    
+    # 3. 逐页扩展，每完成一页立即保存
+    done_pages = store.completed_pages(ppt_id)
+    
+    remaining = [page for page in pages if page["page_num"] not in done_pages]
+    batcher = make_batcher(remaining, options=options)
+    
+    async def extend(page: Dict):
+        page_content = await process_page_content(page, ppt_id, vector_ids.get(page["page_num"]), batcher, options)
+        store.save_page(ppt_id, page["page_num"], page_content)
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(extend(page) for page in remaining))
+    timings["extend"] = round(time.perf_counter() - started, 3)
+    
+    # 4. 汇总最终结果
+    extended_pages = [page_record(page) for page in store.completed_pages(ppt_id).values()]
+    result = build_result(ppt_id, job["filename"], extended_pages, ppt_structure, sum(timings.values()))
+    save_result(result, job["content_hash"], result_options_key(options), options=options)
+    store.update(ppt_id, status="done", stage_timings=timings)
+    temp_files.release(job["file_path"])
+
+# 可通过fields选择的页面字段；page_num总是返回
+PAGE_FIELDS = frozenset(PageContent.model_fields)
+
+def parse_fields(fields: Optional[str]) -> Optional[frozenset]:
+    """解析逗号分隔的页面字段列表，未指定时返回None（全部字段）"""
+    if not fields:
+        return None
+    selected = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = selected - PAGE_FIELDS
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"未知字段: {', '.join(sorted(unknown))}")
+    return frozenset(selected | {"page_num"})
+
+def project_page(page: Dict, selected: Optional[frozenset]) -> Dict:
+    if selected is None:
+        return page
+    return {name: value for name, value in page.items() if name in selected}
+
+def compact_result(result: Dict, selected: Optional[frozenset] = None) -> Dict:
+    """按字段裁剪页面；旧结果的structure中仍带有整份页面副本，一并去掉"""
+    structure = {key: value for key, value in result["structure"].items() if key != "pages"}
+    return {**result, "structure": structure, "pages": [project_page(page, selected) for page in result["pages"]]}
+
 @app.get("/api/ppt/{ppt_id}")
-async def get_ppt_details(ppt_id: str):
-    """获取PPT处理详情"""
-    # 从数据库或缓存获取
-    return {"ppt_id": ppt_id, "status": "processed"}
+async def get_ppt_details(ppt_id: str, request: Request, fields: Optional[str] = None):
+    """
+    获取PPT处理详情：状态、进度、各阶段耗时，完成后附带结果
+    fields: 结果中每页返回的字段，如 title,extensions
+    """
+    if job_queue is None or result_store is None:
+        raise HTTPException(status_code=503, detail="任务队列尚未就绪")
+    selected = parse_fields(fields)
+    job = job_queue.store.get(ppt_id)
+    if job is None:
+        # 同步上传的结果没有任务记录，直接从结果库读取
+        result = result_store.get(ppt_id)
+        if result is None:
+            raise HTTPException(status_code=404, detail="PPT不存在")
+        return await response_encoder.response(request, {
+            "ppt_id": ppt_id,
+            "filename": result["original_filename"],
+            "status": "done",
+            "total_pages": result["total_pages"],
+            "completed_pages": result["total_pages"],
+            "stage_timings": {},
+            "error": None,
+            "created_at": None,
+            "updated_at": None,
+            "result": compact_result(result, selected)
+        })
+    
+    result = result_store.get(ppt_id) if job["status"] == "done" else None
+    return await response_encoder.response(request, {
+        "ppt_id": ppt_id,
+        "filename": job["filename"],
+        "status": job["status"],
+        "total_pages": job["total_pages"],
+        "completed_pages": job["completed_pages"],
+        "stage_timings": job["stage_timings"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "result": compact_result(result, selected) if result is not None else None
+    })
+
+@app.get("/api/ppt/{ppt_id}/pages")
+async def get_ppt_pages(ppt_id: str, request: Request,
+                        start: Optional[int] = Query(None, alias="from", ge=1),
+                        end: Optional[int] = Query(None, alias="to", ge=1),
+                        cursor: Optional[int] = Query(None, ge=1),
+                        limit: int = Query(20, ge=1, le=100),
+                        fields: Optional[str] = None):
+    """
+    分页获取PPT页面，不必下载整份结果
+    from/to: 页码范围（含两端）；cursor: 上次返回的next_cursor；limit: 每次最多返回的页数
+    fields: 每页返回的字段，如 title,extensions
+    处理中的异步任务返回已完成的页面
+    """
+    if job_queue is None or result_store is None:
+        raise HTTPException(status_code=503, detail="任务队列尚未就绪")
+    selected = parse_fields(fields)
+    
+    result = result_store.get(ppt_id)
+    if result is not None:
+        total_pages, pages = result["total_pages"], result["pages"]
+    else:
+        job = job_queue.store.get(ppt_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="PPT不存在")
+        completed = job_queue.store.completed_pages(ppt_id)
+        total_pages, pages = job["total_pages"], [completed[num] for num in sorted(completed)]
+    
+    first = cursor or start or 1
+    in_range = [page for page in pages
+                if page["page_num"] >= first and (end is None or page["page_num"] <= end)]
+    selected_pages = in_range[:limit]
+    return await response_encoder.response(request, {
+        "ppt_id": ppt_id,
+        "total_pages": total_pages,
+        "pages": [project_page(page, selected) for page in selected_pages],
+        "next_cursor": in_range[limit]["page_num"] if len(in_range) > limit else None
+    })
+
+# 图片内容由哈希决定，可以长期缓存
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+@app.get("/api/images/{image_id}")
+async def get_image(image_id: str, request: Request, size: Optional[int] = None):
+    """
+    按内容哈希返回幻灯片图片的原始字节
+    size: 返回最长边不超过size的缩略图（向上取整到固定档位，首次请求时生成）
+    图片ID即内容哈希，If-None-Match命中时只校验ID格式直接返回304，不读取或提取图片
+    """
+    if image_store is None:
+        raise HTTPException(status_code=503, detail="图片存储尚未就绪")
+    if size is not None and size <= 0:
+        raise HTTPException(status_code=400, detail="size必须为正整数")
+    
+    thumbnail_size = ImageStore.thumbnail_size(size) if size is not None else None
+    etag = f'"{image_id}-{thumbnail_size}"' if thumbnail_size else f'"{image_id}"'
+    headers = {"ETag": etag, "Cache-Control": IMAGE_CACHE_CONTROL}
+    if request.headers.get("if-none-match") == etag and ImageStore.is_valid_id(image_id):
+        return Response(status_code=304, headers=headers)
+    
+    # 查找路径可能触发PDF图片提取或缩略图生成，与读取文件头一起放到线程中
+    if thumbnail_size:
+        path = await asyncio.to_thread(image_store.get_thumbnail, image_id, thumbnail_size)
+    else:
+        path = await asyncio.to_thread(image_store.get_path, image_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="图片不存在")
+    media_type = await asyncio.to_thread(image_media_type, path)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+def image_media_type(path: str) -> str:
+    """根据文件头判断图片类型（原图文件名不带扩展名）"""
+    from PIL import Image
+    with Image.open(path) as img:
+        return Image.MIME.get(img.format, "application/octet-stream")
 
 @app.get("/api/search/semantic")
-async def semantic_search(query: str, top_k: int = 5):
-    """语义搜索PPT内容"""
-    results = vector_store.search_similar(query, top_k=top_k)
+async def semantic_search(query: str, top_k: int = 5, ppt_id: Optional[str] = None, course: Optional[str] = None):
+    """
+    语义搜索PPT内容
+    ppt_id / course: 只在指定PPT（按deck_id上传时为deck_id）或课程中检索
+    """
+    store = require_component("vector_store")
+    filters = {name: value for name, value in (("ppt_id", ppt_id), ("course", course)) if value is not None}
+    try:
+        results = store.search_similar(query, top_k=top_k, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {"query": query, "results": results}
 
+@app.get("/api/stats")
+async def get_stats():
+    """运行时统计（缓存命中、连接池等），只包含已就绪的组件"""
+    stats = {}
+    if component_status["vector_store"]["ready"]:
+        stats["embedding_cache"] = vector_store.cache_stats()
+        stats["vector_backend"] = vector_store.backend_stats()
+    if component_status["search_client"]["ready"]:
+        stats["search_pool"] = search_client.pool_stats()
+        stats["search_cache"] = search_client.cache.stats()
+    if component_status["llm_client"]["ready"]:
+        stats["llm_cache"] = llm_client.cache_stats()
+        stats["llm_rate_limit"] = llm_client.rate_limit_stats()
+        stats["llm_batching"] = llm_client.batch_stats()
+    stats["stages"] = stage_timings.stats()
+    if job_queue is not None:
+        stats["jobs"] = job_queue.stats()
+    if result_store is not None:
+        stats["results"] = result_store.stats()
+    # 临时文件与图片的占用统计需要遍历目录，放到线程中执行
+    if temp_files is not None:
+        stats["temp_files"] = await asyncio.to_thread(temp_files.stats)
+    if image_store is not None:
+        stats["images"] = await asyncio.to_thread(image_store.stats)
+    stats["responses"] = response_encoder.stats()
+    return stats
+
 @app.get("/health")
 async def health_check():
-    """健康检查端点"""
+    """健康检查端点（存活探针，不依赖组件初始化）"""
+    if startup_metrics["first_health_seconds"] is None:
+        startup_metrics["first_health_seconds"] = round(time.time() - PROCESS_STARTED_AT, 3)
     return {"status": "healthy", "service": "ppt-knowledge-extender"}
 
+@app.get("/ready")
+async def readiness_check():
+    """就绪探针：报告各组件初始化状态与启动耗时"""
+    ready = all(status["ready"] for status in component_status.values())
+    failed = any(status["error"] for status in component_status.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else ("degraded" if failed else "starting"),
+            "components": component_status,
+            "startup": startup_metrics
+        }
+    )
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
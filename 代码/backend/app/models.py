@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Literal, Optional
 from datetime import datetime
 
 class PPTElement(BaseModel):
@@ -9,11 +9,14 @@ class PPTElement(BaseModel):
     position: Dict[str, float]
 
 class PPTImage(BaseModel):
-    """PPT图片"""
+    """PPT图片（图片库中的引用，原图与缩略图通过url获取）"""
+    id: str
     format: str
-    data: str  # base64编码
+    url: str
     width: Optional[int] = None
     height: Optional[int] = None
+    size: Optional[int] = None  # 原图字节数
+    index: Optional[int] = None  # PDF页内图片序号
 
 class PageContent(BaseModel):
     """单页内容"""
@@ -24,6 +27,7 @@ class PageContent(BaseModel):
     images: List[PPTImage] = []
     extensions: Dict[str, Any] = Field(default_factory=dict)
     external_references: Dict[str, Any] = Field(default_factory=dict)
+    questions: List[Dict[str, Any]] = []  # generate_questions为真时生成的测试题
     vector_id: Optional[int] = None
 
 class TOCItem(BaseModel):
@@ -33,11 +37,12 @@ class TOCItem(BaseModel):
     level: int = 1
 
 class PPTStructure(BaseModel):
-    """PPT结构"""
+    """PPT结构（只含元数据与目录，页面内容见 ExtendResponse.pages）"""
     filename: str
     total_pages: int
     toc: List[TOCItem] = []
-    pages: List[PageContent]
+    image_stats: Dict[str, int] = Field(default_factory=dict)  # 图片总数、不同图片数与去重省下的字节数
+    parse_stats: Dict[str, Any] = Field(default_factory=dict)  # PDF逐页解析耗时
 
 class ExtensionSection(BaseModel):
     """扩展内容章节"""
@@ -49,9 +54,10 @@ class PPTRequest(BaseModel):
     """PPT处理请求"""
     file_url: Optional[str] = None
     local_file: Optional[str] = None
-    extension_depth: str = "normal"  # simple, normal, deep
-    include_sources: List[str] = ["wikipedia", "arxiv"]
+    extension_depth: Literal["simple", "normal", "deep"] = "normal"
+    include_sources: List[Literal["wikipedia", "arxiv", "semantic_scholar"]] = ["wikipedia", "arxiv"]
     generate_questions: bool = True
+    course: Optional[str] = Field(None, max_length=100)  # 所属课程，限定相似检索的范围
 
 class ExtendResponse(BaseModel):
     """扩展响应"""
@@ -62,6 +68,9 @@ class ExtendResponse(BaseModel):
     structure: PPTStructure
     processing_time: float = 0.0
     timestamp: datetime = Field(default_factory=datetime.now)
+    version_stats: Optional[Dict[str, Any]] = None  # 按deck_id上传新版本时复用的页数与向量数
+    options: Dict[str, Any] = Field(default_factory=dict)  # 生效的处理选项（扩展深度、外部源、问题生成）
+    skipped: Dict[str, Any] = Field(default_factory=dict)  # 按选项跳过的阶段与估算节省的时间
 
 class SearchResult(BaseModel):
     """搜索结果"""
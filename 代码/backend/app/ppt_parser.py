@@ -1,42 +1,194 @@
-import pptx
-from pptx import Presentation
-from typing import Dict, List, Any
-import fitz  # PyMuPDF
-from PIL import Image
-import io
-import base64
+from typing import Dict, List, Any, Optional, Tuple
+import os
+import time
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import functools
+import zipfile
+import multiprocessing
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from .image_store import DEFERRED_ID, DeckImages, ImageStore, summarize_images
+from .pptx_reader import PPTXReader
+
+PRESENTATION_NS = "http://schemas.openxmlformats.org/presentationml/2006/main"
+
+# PDF图片流的过滤器 -> 按需提取后的格式（其余由PyMuPDF转换为PNG）
+PDF_IMAGE_FORMATS = {"DCTDecode": "jpeg", "JPXDecode": "jpx"}
+# 标题字号与正文字号至少相差的比例，否则认为页面没有明显标题
+TITLE_SIZE_RATIO = 1.15
+# XML快速解析失败时回退到python-pptx的异常（含不规范XML缺少元素或属性时的AttributeError/TypeError）
+XML_FAST_PATH_ERRORS = (KeyError, ValueError, AttributeError, TypeError, zipfile.BadZipFile, ET.ParseError)
 
 class PPTParser:
-    def __init__(self):
+    def __init__(self, mode: str = None, workers: int = None, chunk_size: int = None, engine: str = None,
+                 image_dir: str = None, pdf_parallel_pages: int = None):
+        """
+        mode: thread（默认，整份文件在线程池中解析）或 process（按页范围拆分到多进程并行解析）
+        workers: 进程池大小，默认CPU核数
+        chunk_size: 每个进程任务解析的页数
+        engine: PPTX解析方式，xml（默认，直接读取幻灯片XML）或 python-pptx
+        image_dir: 图片存储目录，页面中只保留图片引用
+        pdf_parallel_pages: PDF页数达到该值且有多个worker时，即使在thread模式下也按页范围多进程解析
+        """
         self.executor = ThreadPoolExecutor(max_workers=4)
+        self.mode = mode or os.getenv("PARSER_MODE", "thread")
+        self.workers = workers or int(os.getenv("PARSER_WORKERS", "0")) or os.cpu_count() or 1
+        self.chunk_size = chunk_size or int(os.getenv("PARSER_CHUNK_SIZE", "25"))
+        self.engine = engine or os.getenv("PARSER_PPTX_ENGINE", "xml")
+        self.image_dir = image_dir or os.getenv("IMAGE_STORE_DIR", "./data/images")
+        self.image_store = ImageStore.from_env(self.image_dir)
+        self.pdf_parallel_pages = pdf_parallel_pages or int(os.getenv("PARSER_PDF_PARALLEL_PAGES", "50"))
+        self.process_pool: Optional[ProcessPoolExecutor] = None
     
     async def parse_ppt(self, file_path: str) -> Dict[str, Any]:
         """解析PPT文件，提取结构和内容"""
         loop = asyncio.get_event_loop()
         
-        if file_path.endswith('.pptx'):
-            return await loop.run_in_executor(
+        if file_path.endswith('.pdf'):
+            result = await self._parse_pdf_document(file_path)
+        elif self.mode == "process" and file_path.endswith('.pptx'):
+            result = await self._parse_in_processes(file_path)
+        elif file_path.endswith('.pptx'):
+            result = await loop.run_in_executor(
                 self.executor, 
                 self._parse_pptx, 
                 file_path
             )
-        elif file_path.endswith('.pdf'):
-            return await loop.run_in_executor(
-                self.executor,
-                self._parse_pdf,
-                file_path
-            )
         else:
             raise ValueError("Unsupported file format")
+        
+        # 图片去重统计：总出现次数、不同图片数与省下的字节数
+        result["image_stats"] = summarize_images(result["pages"])
+        parse_stats = self._summarize_parse_times(result["pages"])
+        if parse_stats:
+            result["parse_stats"] = parse_stats
+        return result
+    
+    async def _parse_pdf_document(self, file_path: str) -> Dict[str, Any]:
+        """
+        解析PDF：图片只记录按源文件哈希生成的引用，首次访问时再从源文件提取
+        解析后只有含图片时才登记源文件，没有图片的PDF不占用源文件存储
+        process模式，或页数较多且有多个worker时，按页范围多进程并行
+        """
+        loop = asyncio.get_event_loop()
+        source_id = await loop.run_in_executor(self.executor, ImageStore.source_id, file_path)
+        total = await loop.run_in_executor(self.executor, self._count_pages, file_path)
+        if self.mode == "process" or (self.workers > 1 and total >= self.pdf_parallel_pages):
+            result = await self._parse_in_processes(file_path, total, source_id)
+        else:
+            result = await loop.run_in_executor(self.executor, self._parse_pdf, file_path, source_id)
+        if any(DEFERRED_ID.match(image["id"]) for page in result["pages"] for image in page.get("images", [])):
+            await loop.run_in_executor(self.executor, self.image_store.put_source, file_path, source_id)
+        return result
+    
+    async def _parse_in_processes(self, file_path: str, total: int = None, source_id: str = None) -> Dict[str, Any]:
+        """
+        按页范围拆分，在进程池中并行解析，再按页序合并
+        每个子进程自行打开文件，只回传自己负责范围的页面
+        PPTX的XML快速解析失败时不在各子进程中分别回退，而是整份PPT只用python-pptx加载解析一次
+        """
+        loop = asyncio.get_event_loop()
+        is_pdf = file_path.endswith('.pdf')
+        if total is None:
+            total = await loop.run_in_executor(self.executor, self._count_pages, file_path)
+        
+        parse_range = PPTParser._parse_pdf_pages if is_pdf else PPTParser._parse_pptx_pages
+        pool = self._get_process_pool()
+        extra = (self.image_dir, source_id) if is_pdf else (self.engine, self.image_dir, False)
+        futures = [
+            loop.run_in_executor(pool, parse_range, file_path, start, min(start + self.chunk_size, total), *extra)
+            for start in range(0, total, self.chunk_size)
+        ]
+        try:
+            chunks = await asyncio.gather(*futures)
+            pages = [page for chunk in chunks for page in chunk]
+        except XML_FAST_PATH_ERRORS as e:
+            if is_pdf or self.engine != "xml":
+                raise
+            for future in futures:
+                future.cancel()
+            print(f"XML快速解析失败，整份PPT改用python-pptx解析: {e}")
+            pages = await loop.run_in_executor(
+                self.executor,
+                functools.partial(self._parse_pptx_pages, file_path, engine="python-pptx", image_dir=self.image_dir)
+            )
+        
+        if is_pdf:
+            return {"filename": file_path, "total_pages": len(pages), "pages": pages}
+        return {
+            "filename": file_path,
+            "total_pages": len(pages),
+            "toc": self._extract_toc(pages),
+            "pages": pages
+        }
+    
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        """按需创建进程池；使用spawn避免在多线程的服务进程中fork"""
+        if self.process_pool is None:
+            self.process_pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self.process_pool
+    
+    @staticmethod
+    def _count_pages(file_path: str) -> int:
+        """统计页数（PPTX只读取presentation.xml中的幻灯片列表）"""
+        if file_path.endswith('.pdf'):
+            import fitz
+            with fitz.open(file_path) as doc:
+                return doc.page_count
+        with zipfile.ZipFile(file_path) as package:
+            root = ET.fromstring(package.read("ppt/presentation.xml"))
+        return len(root.findall(f"{{{PRESENTATION_NS}}}sldIdLst/{{{PRESENTATION_NS}}}sldId"))
+    
+    def close(self):
+        self.executor.shutdown(wait=False)
+        if self.process_pool is not None:
+            self.process_pool.shutdown(wait=False, cancel_futures=True)
+            self.process_pool = None
     
     def _parse_pptx(self, file_path: str) -> Dict[str, Any]:
         """解析PPTX文件"""
+        pages = self._parse_pptx_pages(file_path, engine=self.engine, image_dir=self.image_dir)
+        
+        # 提取目录信息
+        toc = self._extract_toc(pages)
+        
+        return {
+            "filename": file_path,
+            "total_pages": len(pages),
+            "toc": toc,
+            "pages": pages
+        }
+    
+    @staticmethod
+    def _parse_pptx_pages(file_path: str, start: int = 0, end: int = None, engine: str = "python-pptx",
+                          image_dir: str = None, fallback: bool = True) -> List[Dict]:
+        """
+        解析PPTX中 [start, end) 范围内的幻灯片（静态方法，可在子进程中执行）
+        fallback: XML快速解析失败时是否回退到python-pptx；为False时抛出异常，由调用方统一回退
+        """
+        # 同一份PPT中内容相同的图片只处理一次
+        images = DeckImages(ImageStore(image_dir) if image_dir else ImageStore.from_env())
+        if engine == "xml":
+            try:
+                with PPTXReader(file_path) as reader:
+                    return reader.parse_pages(start, end, image_handler=images.put)
+            except XML_FAST_PATH_ERRORS as e:
+                if not fallback:
+                    raise
+                print(f"XML快速解析失败，改用python-pptx解析: {e}")
+        
+        from pptx import Presentation  # 按需导入，避免启动时加载
+        
         prs = Presentation(file_path)
         pages = []
         
-        for i, slide in enumerate(prs.slides):
+        slides = list(prs.slides)
+        for i in range(start, len(slides) if end is None else min(end, len(slides))):
+            slide = slides[i]
             page_data = {
                 "page_num": i + 1,
                 "title": "",
@@ -50,7 +202,7 @@ class PPTParser:
                 if shape.has_text_frame:
                     text = shape.text.strip()
                     if text:
-                        if shape.is_title or "Title" in shape.name:
+                        if PPTParser._is_title(shape):
                             page_data["title"] = text
                         else:
                             page_data["text"] += text + "\n"
@@ -70,85 +222,159 @@ class PPTParser:
                 
                 # 提取图片
                 if shape.shape_type == 13:  # 13表示图片
-                    image_data = self._extract_image(shape)
+                    image_data = PPTParser._extract_image(shape, images)
                     if image_data:
                         page_data["images"].append(image_data)
             
             pages.append(page_data)
         
-        # 提取目录信息
-        toc = self._extract_toc(pages)
+        return pages
+    
+    def _parse_pdf(self, file_path: str, source_id: str = None) -> Dict[str, Any]:
+        """解析PDF文件（PPT另存为PDF的情况）"""
+        pages = self._parse_pdf_pages(file_path, image_dir=self.image_dir, source_id=source_id)
         
         return {
             "filename": file_path,
             "total_pages": len(pages),
-            "toc": toc,
             "pages": pages
         }
     
-    def _parse_pdf(self, file_path: str) -> Dict[str, Any]:
-        """解析PDF文件（PPT另存为PDF的情况）"""
+    @staticmethod
+    def _parse_pdf_pages(file_path: str, start: int = 0, end: int = None,
+                         image_dir: str = None, source_id: str = None) -> List[Dict]:
+        """
+        解析PDF中 [start, end) 范围内的页面（静态方法，可在子进程中执行）
+        给出source_id（源文件哈希）时图片只记录引用，访问时再从登记的源文件提取；否则当场提取
+        """
+        import fitz  # PyMuPDF，按需导入
+        
+        images_by_content = None
+        if source_id is None:
+            images_by_content = DeckImages(ImageStore(image_dir) if image_dir else ImageStore.from_env())
+        images_by_xref: Dict[int, Optional[Dict]] = {}
+        # get_text("dict")默认会解码页面中的图片，这里只需要文字
+        text_flags = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
         doc = fitz.open(file_path)
         pages = []
         
-        for page_num in range(len(doc)):
+        for page_num in range(start, len(doc) if end is None else min(end, len(doc))):
+            started = time.perf_counter()
             page = doc[page_num]
             
-            # 提取文本
-            text = page.get_text()
+            # 一次遍历同时得到正文与按字号判断的标题
+            title, text = PPTParser._pdf_title_and_text(page.get_text("dict", flags=text_flags))
             
-            # 提取图片
+            # 图片引用（同一xref在整份文档中只处理一次）
             images = []
             for img_index, img in enumerate(page.get_images(full=True)):
                 xref = img[0]
-                base_image = doc.extract_image(xref)
-                image_data = {
-                    "index": img_index,
-                    "format": base_image["ext"],
-                    "data": base64.b64encode(base_image["image"]).decode()
-                }
-                images.append(image_data)
-            
-            # 尝试提取标题（第一行或最大字体）
-            lines = text.split('\n')
-            title = lines[0] if lines else f"Page {page_num + 1}"
+                if xref not in images_by_xref:
+                    if source_id is not None:
+                        images_by_xref[xref] = PPTParser._pdf_image_ref(doc, img, source_id)
+                    else:
+                        base_image = doc.extract_image(xref)
+                        images_by_xref[xref] = images_by_content.put(base_image["image"]) if base_image else None
+                image_data = images_by_xref[xref]
+                if image_data:
+                    images.append({"index": img_index, **image_data})
             
             page_data = {
                 "page_num": page_num + 1,
                 "title": title,
                 "text": text,
                 "images": images,
-                "elements": []
+                "elements": [],
+                "parse_seconds": round(time.perf_counter() - started, 4)
             }
             
             pages.append(page_data)
         
+        doc.close()
+        return pages
+    
+    @staticmethod
+    def _pdf_title_and_text(page_dict: Dict) -> Tuple[str, str]:
+        """
+        从get_text("dict")的结果中得到 (标题, 正文)
+        标题取字号最大且明显大于正文的第一组连续行；所有文字字号相近时退化为第一行
+        """
+        lines = []  # (行文本, 行内最大字号, 所在块序号)
+        for block_index, block in enumerate(page_dict.get("blocks", [])):
+            if block.get("type") != 0:
+                continue
+            for line in block.get("lines", []):
+                spans = line.get("spans", [])
+                line_text = "".join(span.get("text", "") for span in spans)
+                sizes = [span.get("size", 0) for span in spans if span.get("text", "").strip()]
+                lines.append((line_text, max(sizes) if sizes else 0, block_index))
+        
+        text = "".join(line_text + "\n" for line_text, _, _ in lines)
+        sized = [line for line in lines if line[1] > 0]
+        if not sized:
+            return (lines[0][0].strip() if lines else ""), text
+        
+        largest = max(size for _, size, _ in sized)
+        body_size = sorted(size for _, size, _ in sized)[len(sized) // 2]
+        if largest < body_size * TITLE_SIZE_RATIO:
+            return sized[0][0].strip(), text
+        
+        # 标题可能折成多行：取第一处最大字号所在块中连续的同字号行
+        first = next(i for i, line in enumerate(lines) if line[1] == largest)
+        title_lines = []
+        for line_text, size, block_index in lines[first:]:
+            if block_index != lines[first][2] or abs(size - largest) > 0.5:
+                break
+            title_lines.append(line_text.strip())
+        return " ".join(part for part in title_lines if part), text
+    
+    @staticmethod
+    def _pdf_image_ref(doc, img: tuple, source_id: str) -> Dict:
+        """
+        PDF图片的延迟引用：只读取get_images给出的尺寸与过滤器，不解码图片流
+        字节在首次访问 /api/images/{id} 时从已登记的源文件中提取
+        """
+        xref, width, height, stream_filter = img[0], img[2], img[3], img[8]
+        kind, length = doc.xref_get_key(xref, "Length")
+        image_id = ImageStore.deferred_id(source_id, xref)
         return {
-            "filename": file_path,
-            "total_pages": len(pages),
-            "pages": pages
+            "id": image_id,
+            "format": PDF_IMAGE_FORMATS.get(stream_filter, "png"),
+            "width": width,
+            "height": height,
+            "size": int(length) if kind == "int" else None,
+            "url": f"/api/images/{image_id}"
         }
     
-    def _extract_image(self, shape) -> Dict:
-        """提取PPT中的图片"""
+    @staticmethod
+    def _summarize_parse_times(pages: List[Dict]) -> Dict[str, Any]:
+        """汇总逐页解析耗时；页面没有记录耗时（PPTX）时返回空字典"""
+        timed = [(page["page_num"], page["parse_seconds"]) for page in pages if "parse_seconds" in page]
+        if not timed:
+            return {}
+        slowest = max(timed, key=lambda item: item[1])
+        return {
+            "total_seconds": round(sum(seconds for _, seconds in timed), 4),
+            "slowest_page": slowest[0],
+            "slowest_seconds": slowest[1],
+            "page_seconds": {str(page_num): seconds for page_num, seconds in timed}
+        }
+    
+    @staticmethod
+    def _is_title(shape) -> bool:
+        """标题占位符（python-pptx的形状没有is_title属性），或名称中带Title的形状"""
+        if shape.is_placeholder and shape.placeholder_format.type in (1, 3):  # TITLE, CENTER_TITLE
+            return True
+        return "Title" in shape.name
+    
+    @staticmethod
+    def _extract_image(shape, images: DeckImages) -> Dict:
+        """提取PPT中的图片，按原始编码存入图片库，返回引用"""
         try:
-            image = shape.image
-            image_bytes = io.BytesIO(image.blob)
-            img = Image.open(image_bytes)
-            
-            # 转换为base64
-            buffered = io.BytesIO()
-            img.save(buffered, format="PNG")
-            img_str = base64.b64encode(buffered.getvalue()).decode()
-            
-            return {
-                "format": "png",
-                "data": img_str,
-                "width": img.width,
-                "height": img.height
-            }
+            blob = shape.image.blob
         except:
             return None
+        return images.put(blob)
     
     def _extract_toc(self, pages: List[Dict]) -> List[Dict]:
         """从页面中提取目录结构"""
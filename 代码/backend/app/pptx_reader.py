@@ -0,0 +1,248 @@
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import Callable, Dict, List, Optional
+
+P_NS = "http://schemas.openxmlformats.org/presentationml/2006/main"
+A_NS = "http://schemas.openxmlformats.org/drawingml/2006/main"
+R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+SLIDE_LAYOUT_REL = R_NS + "/slideLayout"
+SLIDE_MASTER_REL = R_NS + "/slideMaster"
+
+# 与python-pptx的 MSO_SHAPE_TYPE / PP_PLACEHOLDER 判定保持一致
+TITLE_TYPES = ("title", "ctrTitle")
+# 版式占位符继承母版占位符时的类型映射（同python-pptx LayoutPlaceholder）
+MASTER_PH_TYPES = {
+    "body": "body", "chart": "body", "clipArt": "body", "ctrTitle": "title", "dgm": "body",
+    "dt": "dt", "ftr": "ftr", "media": "body", "obj": "body", "pic": "body",
+    "sldNum": "sldNum", "subTitle": "body", "tbl": "body", "title": "title",
+}
+
+def _p(tag: str) -> str:
+    return f"{{{P_NS}}}{tag}"
+
+def _a(tag: str) -> str:
+    return f"{{{A_NS}}}{tag}"
+
+SP_TREE = _p("spTree")
+SHAPE = _p("sp")
+PICTURE = _p("pic")
+GEOMETRY = ("left", "top", "width", "height")
+
+class PPTXReader:
+    """
+    直接读取PPTX压缩包中的幻灯片XML，不构建python-pptx对象模型
+    输出与 PPTParser._parse_pptx_pages 相同的页面结构；
+    图片只在遇到图片形状时才通过幻灯片关系文件定位并读取
+    """
+    def __init__(self, file_path: str):
+        self.package = zipfile.ZipFile(file_path)
+        self.rels_cache: Dict[str, Dict[str, tuple]] = {}
+        self.placeholder_cache: Dict[str, List[tuple]] = {}
+        # 图片部件 -> 处理结果；多页引用同一媒体部件时只读取、处理一次
+        self.image_cache: Dict[str, Optional[Dict]] = {}
+        self.slide_parts = self._slide_parts()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.package.close()
+
+    def __len__(self) -> int:
+        return len(self.slide_parts)
+
+    def parse_pages(self, start: int = 0, end: int = None,
+                    image_handler: Callable[[bytes], Optional[Dict]] = None) -> List[Dict]:
+        """解析 [start, end) 范围内的幻灯片；image_handler 将图片字节转换为页面中的图片条目"""
+        end = len(self.slide_parts) if end is None else min(end, len(self.slide_parts))
+        return [self._parse_slide(i, image_handler) for i in range(start, end)]
+
+    def _slide_parts(self) -> List[str]:
+        """按presentation.xml中sldIdLst的顺序解析出幻灯片部件路径"""
+        root = ET.fromstring(self.package.read("ppt/presentation.xml"))
+        rels = self._rels("ppt/presentation.xml")
+        parts = []
+        for slide_id in root.iterfind(f"{_p('sldIdLst')}/{_p('sldId')}"):
+            target = rels.get(slide_id.get(f"{{{R_NS}}}id"))
+            if target:
+                parts.append(target[1])
+        return parts
+
+    def _rels(self, part: str) -> Dict[str, tuple]:
+        """读取部件的关系文件：rId -> (关系类型, 目标部件路径)"""
+        if part in self.rels_cache:
+            return self.rels_cache[part]
+        directory, name = posixpath.split(part)
+        rels_path = posixpath.join(directory, "_rels", name + ".rels")
+        rels = {}
+        try:
+            root = ET.fromstring(self.package.read(rels_path))
+        except KeyError:
+            root = None
+        if root is not None:
+            for rel in root.iter(f"{{{REL_NS}}}Relationship"):
+                if rel.get("TargetMode") == "External":
+                    continue
+                target = rel.get("Target", "")
+                if target.startswith("/"):
+                    target = target[1:]
+                else:
+                    target = posixpath.normpath(posixpath.join(directory, target))
+                rels[rel.get("Id")] = (rel.get("Type"), target)
+        self.rels_cache[part] = rels
+        return rels
+
+    def _related(self, part: str, rel_type: str) -> Optional[str]:
+        for kind, target in self._rels(part).values():
+            if kind == rel_type:
+                return target
+        return None
+
+    def _parse_slide(self, index: int, image_handler) -> Dict:
+        part = self.slide_parts[index]
+        page_data = {
+            "page_num": index + 1,
+            "title": "",
+            "text": "",
+            "elements": [],
+            "images": []
+        }
+
+        # 增量解析：spTree的每个顶层形状结束时立即处理并释放
+        depth = 0
+        tree_depth = None
+        tree = None
+        with self.package.open(part) as stream:
+            for event, elem in ET.iterparse(stream, events=("start", "end")):
+                if event == "start":
+                    depth += 1
+                    if elem.tag == SP_TREE and tree_depth is None:
+                        tree_depth, tree = depth, elem
+                    continue
+                if tree_depth is not None and depth == tree_depth + 1:
+                    if elem.tag == SHAPE:
+                        self._add_text_shape(part, elem, page_data)
+                    elif elem.tag == PICTURE and image_handler is not None:
+                        self._add_picture(part, elem, page_data, image_handler)
+                    tree.remove(elem)
+                elif elem is tree:
+                    tree_depth = None
+                depth -= 1
+        return page_data
+
+    def _add_text_shape(self, part: str, sp: ET.Element, page_data: Dict):
+        body = sp.find(_p("txBody"))
+        if body is None:
+            return
+        text = self._text(body).strip()
+        if not text:
+            return
+
+        ph = sp.find(f"{_p('nvSpPr')}/{_p('nvPr')}/{_p('ph')}")
+        # 不规范的文件可能缺少cNvPr，此时按无名称处理
+        c_nv_pr = sp.find(f"{_p('nvSpPr')}/{_p('cNvPr')}")
+        name = c_nv_pr.get("name", "") if c_nv_pr is not None else ""
+        if (ph is not None and ph.get("type", "obj") in TITLE_TYPES) or "Title" in name:
+            page_data["title"] = text
+        else:
+            page_data["text"] += text + "\n"
+
+        position = self._xfrm(sp.find(f"{_p('spPr')}/{_a('xfrm')}"))
+        if ph is not None and any(value is None for value in position.values()):
+            inherited = self._inherited_position(part, ph)
+            position = {key: inherited[key] if value is None else value for key, value in position.items()}
+        page_data["elements"].append({"type": "text", "content": text, "position": position})
+
+    def _add_picture(self, part: str, pic: ET.Element, page_data: Dict, image_handler):
+        # 占位符图片与音视频在python-pptx中不是PICTURE类型，与原解析器一样跳过
+        nv_pr = pic.find(f"{_p('nvPicPr')}/{_p('nvPr')}")
+        if nv_pr is not None and (nv_pr.find(_p("ph")) is not None or
+                                  nv_pr.find(_a("videoFile")) is not None):
+            return
+        blip = pic.find(f"{_p('blipFill')}/{_a('blip')}")
+        rel_id = blip.get(f"{{{R_NS}}}embed") if blip is not None else None
+        target = self._rels(part).get(rel_id) if rel_id else None
+        if target is None:
+            return
+        if target[1] not in self.image_cache:
+            try:
+                blob = self.package.read(target[1])
+            except KeyError:
+                return
+            self.image_cache[target[1]] = image_handler(blob)
+        image_data = self.image_cache[target[1]]
+        if image_data:
+            page_data["images"].append(dict(image_data))
+
+    @staticmethod
+    def _text(body: ET.Element) -> str:
+        """与python-pptx的TextFrame.text一致：段落以\\n连接，软换行为\\v"""
+        paragraphs = []
+        for paragraph in body.iterfind(_a("p")):
+            parts = []
+            for child in paragraph:
+                if child.tag == _a("r") or child.tag == _a("fld"):
+                    parts.append(child.findtext(_a("t")) or "")
+                elif child.tag == _a("br"):
+                    parts.append("\v")
+            paragraphs.append("".join(parts))
+        return "\n".join(paragraphs)
+
+    @staticmethod
+    def _xfrm(xfrm: Optional[ET.Element]) -> Dict[str, Optional[int]]:
+        position = dict.fromkeys(GEOMETRY)
+        if xfrm is None:
+            return position
+        off = xfrm.find(_a("off"))
+        ext = xfrm.find(_a("ext"))
+        if off is not None:
+            position["left"], position["top"] = int(off.get("x")), int(off.get("y"))
+        if ext is not None:
+            position["width"], position["height"] = int(ext.get("cx")), int(ext.get("cy"))
+        return position
+
+    def _placeholders(self, part: str) -> List[tuple]:
+        """版式/母版中的占位符：(type, idx, position)，按部件缓存"""
+        if part not in self.placeholder_cache:
+            placeholders = []
+            root = ET.fromstring(self.package.read(part))
+            tree = root.find(f"{_p('cSld')}/{SP_TREE}")
+            for shape in (tree if tree is not None else []):
+                ph = shape.find(f"*/{_p('nvPr')}/{_p('ph')}")
+                if ph is None:
+                    continue
+                xfrm = shape.find(f"{_p('spPr')}/{_a('xfrm')}")
+                if xfrm is None:
+                    xfrm = shape.find(_p("xfrm"))
+                placeholders.append((ph.get("type", "obj"), int(ph.get("idx", "0")), self._xfrm(xfrm)))
+            self.placeholder_cache[part] = placeholders
+        return self.placeholder_cache[part]
+
+    def _inherited_position(self, part: str, ph: ET.Element) -> Dict[str, Optional[int]]:
+        """幻灯片占位符按idx继承版式占位符位置，版式占位符再按类型继承母版"""
+        empty = dict.fromkeys(GEOMETRY)
+        layout = self._related(part, SLIDE_LAYOUT_REL)
+        if layout is None:
+            return empty
+        idx = int(ph.get("idx", "0"))
+        match = next((p for p in self._placeholders(layout) if p[1] == idx), None)
+        if match is None:
+            return empty
+        ph_type, _, position = match
+        if all(value is not None for value in position.values()):
+            return position
+
+        master = self._related(layout, SLIDE_MASTER_REL)
+        master_type = MASTER_PH_TYPES.get(ph_type)
+        base = None
+        if master is not None and master_type is not None:
+            base = next((p for p in self._placeholders(master) if p[0] == master_type), None)
+        if base is None:
+            return position
+        return {key: base[2][key] if value is None else value for key, value in position.items()}
\ No newline at end of file
@@ -0,0 +1,193 @@
+import asyncio
+import os
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Type
+
+class TokenBucket:
+    """
+    令牌桶：容量为每分钟配额，按秒匀速补充
+    单次申请超过容量时按容量计，保证大请求也能最终通过
+    """
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        """等待直到桶内有足够令牌；持锁等待保证先到先得"""
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def adjust(self, delta: float):
+        """按实际用量修正（delta为实际减预估，可为负），允许透支到负数"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+    def available(self) -> float:
+        self._refill()
+        return self.tokens
+
+class RateLimiter:
+    """
+    LLM请求限流器
+    - 请求数(RPM)与token数(TPM)两个令牌桶，外加并发上限
+    - 429/5xx按带抖动的指数退避重试，优先遵循Retry-After
+    - 收到429时整体暂停，避免其他排队请求继续撞限额
+    """
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, requests_per_minute: Optional[float] = 500, tokens_per_minute: Optional[float] = 150000,
+                 max_concurrency: int = 8, max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0,
+                 retry_exceptions: Tuple[Type[BaseException], ...] = ()):
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency = max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_exceptions = retry_exceptions
+        self.paused_until = 0.0
+
+        self.queue_depth = 0
+        self.in_flight = 0
+        self.requests = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.failures = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "RateLimiter":
+        """读取LLM_RPM/LLM_TPM等环境变量；RPM或TPM为0表示不限制"""
+        return cls(
+            requests_per_minute=float(os.getenv("LLM_RPM", "500")),
+            tokens_per_minute=float(os.getenv("LLM_TPM", "150000")),
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "5")),
+            base_delay=float(os.getenv("LLM_RETRY_BASE_DELAY", "1.0")),
+            max_delay=float(os.getenv("LLM_RETRY_MAX_DELAY", "60")),
+            **kwargs
+        )
+
+    @staticmethod
+    def status_code(exc: BaseException) -> Optional[int]:
+        return getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+
+    @staticmethod
+    def retry_after(exc: BaseException) -> Optional[float]:
+        """解析响应头中的retry-after-ms / Retry-After（秒数或HTTP日期）"""
+        headers = getattr(getattr(exc, "response", None), "headers", None)
+        if not headers:
+            return None
+        try:
+            if headers.get("retry-after-ms"):
+                return float(headers["retry-after-ms"]) / 1000
+            value = headers.get("retry-after")
+            if not value:
+                return None
+            try:
+                return float(value)
+            except ValueError:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def is_retryable(self, exc: BaseException) -> bool:
+        return isinstance(exc, self.retry_exceptions) or self.status_code(exc) in self.RETRY_STATUSES
+
+    def backoff(self, attempt: int, exc: BaseException) -> float:
+        """指数退避加全抖动；有Retry-After时以其为下限"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        hint = self.retry_after(exc)
+        if hint is not None:
+            delay = min(self.max_delay, hint) + random.uniform(0, self.base_delay)
+        return delay
+
+    async def _acquire(self, tokens: float):
+        """排队获取并发槽位与两个桶的配额，记录等待时间"""
+        self.queue_depth += 1
+        started = time.monotonic()
+        try:
+            await self.semaphore.acquire()
+            try:
+                pause = self.paused_until - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                if self.request_bucket is not None:
+                    await self.request_bucket.acquire(1)
+                if self.token_bucket is not None:
+                    await self.token_bucket.acquire(tokens)
+            except BaseException:
+                self.semaphore.release()
+                raise
+        finally:
+            self.queue_depth -= 1
+        waited = time.monotonic() - started
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+
+    def record_usage(self, estimated_tokens: float, actual_tokens: float):
+        """用响应中的实际token数修正预估值"""
+        if self.token_bucket is not None and actual_tokens:
+            self.token_bucket.adjust(actual_tokens - estimated_tokens)
+
+    async def run(self, call: Callable[[], Awaitable[Any]], estimated_tokens: float = 1.0) -> Any:
+        """
+        在限流下执行call，可重试的错误按退避重试
+        重试用尽后抛出最后一次的异常
+        """
+        attempt = 0
+        while True:
+            await self._acquire(estimated_tokens)
+            self.in_flight += 1
+            self.requests += 1
+            try:
+                return await call()
+            except Exception as e:
+                if not self.is_retryable(e) or attempt >= self.max_retries:
+                    self.failures += 1
+                    raise
+                delay = self.backoff(attempt, e)
+                if self.status_code(e) == 429:
+                    self.rate_limited += 1
+                    self.paused_until = max(self.paused_until, time.monotonic() + delay)
+                self.retries += 1
+                attempt += 1
+            finally:
+                self.in_flight -= 1
+                self.semaphore.release()
+            print(f"LLM请求失败，{delay:.2f}秒后第{attempt}次重试")
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue_depth,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "requests": self.requests,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "failures": self.failures,
+            "total_wait_seconds": round(self.total_wait, 3),
+            "max_wait_seconds": round(self.max_wait, 3),
+            "avg_wait_seconds": round(self.total_wait / self.requests, 3) if self.requests else 0.0,
+            "requests_available": self.request_bucket.available() if self.request_bucket else None,
+            "tokens_available": self.token_bucket.available() if self.token_bucket else None
+        }
\ No newline at end of file
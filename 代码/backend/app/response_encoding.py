@@ -0,0 +1,156 @@
+import asyncio
+import gzip
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+from fastapi import Request
+from fastapi.responses import Response
+
+# msgpack与zstandard为可选依赖，未安装时不参与协商
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+def _msgpack_default(obj: Any):
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"无法序列化的类型: {type(obj).__name__}")
+
+def parse_quality_list(header: str) -> Dict[str, float]:
+    """解析 Accept / Accept-Encoding 形式的头：值 -> q"""
+    qualities = {}
+    for item in header.split(","):
+        parts = [part.strip() for part in item.split(";")]
+        if not parts[0]:
+            continue
+        quality = 1.0
+        for param in parts[1:]:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        qualities[parts[0].lower()] = quality
+    return qualities
+
+class ResponseEncoder:
+    """
+    结果类响应的编码与压缩协商
+    - Accept中带msgpack时返回二进制msgpack，否则用orjson编码JSON
+    - 按Accept-Encoding选择zstd或gzip，小于min_bytes的响应不压缩
+    - 不小于offload_bytes的响应在线程中压缩，避免大结果阻塞事件循环
+    """
+    def __init__(self, min_bytes: int = 1024, gzip_level: int = 5, zstd_level: int = 3,
+                 offload_bytes: int = 64 * 1024):
+        self.min_bytes = min_bytes
+        self.gzip_level = gzip_level
+        self.zstd_level = zstd_level
+        self.offload_bytes = offload_bytes
+        # ZstdCompressor不能在多个线程中同时使用，每个线程各建一个
+        self.zstd_local = threading.local()
+        self.offloaded = 0
+
+        self.lock = threading.Lock()
+        self.responses = 0
+        self.raw_bytes = 0
+        self.sent_bytes = 0
+        self.by_format: Dict[str, int] = {}
+        self.by_encoding: Dict[str, int] = {}
+
+    @classmethod
+    def from_env(cls) -> "ResponseEncoder":
+        return cls(
+            min_bytes=int(os.getenv("COMPRESSION_MIN_BYTES", "1024")),
+            gzip_level=int(os.getenv("GZIP_LEVEL", "5")),
+            zstd_level=int(os.getenv("ZSTD_LEVEL", "3")),
+            offload_bytes=int(os.getenv("COMPRESSION_OFFLOAD_BYTES", str(64 * 1024)))
+        )
+
+    def supported_encodings(self) -> List[str]:
+        """服务端可用的压缩算法，按优先级排列"""
+        return (["zstd"] if zstandard is not None else []) + ["gzip"]
+
+    @staticmethod
+    def wants_msgpack(accept: str) -> bool:
+        if msgpack is None:
+            return False
+        qualities = parse_quality_list(accept)
+        return any(qualities.get(media_type, 0) > 0 for media_type in MSGPACK_MEDIA_TYPES)
+
+    def serialize(self, content: Any, accept: str = "") -> Tuple[bytes, str]:
+        """返回: (响应体, 媒体类型)"""
+        if self.wants_msgpack(accept):
+            return msgpack.packb(content, default=_msgpack_default, use_bin_type=True), "application/msgpack"
+        return orjson.dumps(content), "application/json"
+
+    def choose_encoding(self, accept_encoding: str) -> Optional[str]:
+        qualities = parse_quality_list(accept_encoding)
+        wildcard = qualities.get("*", 0)
+        candidates = [(qualities.get(name, wildcard), -rank, name)
+                      for rank, name in enumerate(self.supported_encodings())]
+        quality, _, name = max(candidates)
+        return name if quality > 0 else None
+
+    def compress(self, body: bytes, accept_encoding: str = "") -> Tuple[bytes, Optional[str]]:
+        """返回: (压缩后的响应体, Content-Encoding)；不压缩时编码为None"""
+        if len(body) < self.min_bytes:
+            return body, None
+        encoding = self.choose_encoding(accept_encoding)
+        if encoding == "zstd":
+            compressor = getattr(self.zstd_local, "compressor", None)
+            if compressor is None:
+                compressor = self.zstd_local.compressor = zstandard.ZstdCompressor(level=self.zstd_level)
+            return compressor.compress(body), encoding
+        if encoding == "gzip":
+            return gzip.compress(body, compresslevel=self.gzip_level), encoding
+        return body, None
+
+    async def response(self, request: Request, content: Any, status_code: int = 200,
+                       headers: Optional[Dict[str, str]] = None) -> Response:
+        """按请求头协商格式与压缩，构建响应；较大的响应体在线程中压缩"""
+        body, media_type = self.serialize(content, request.headers.get("accept", ""))
+        raw_size = len(body)
+        accept_encoding = request.headers.get("accept-encoding", "")
+        if raw_size >= max(self.offload_bytes, self.min_bytes):
+            body, encoding = await asyncio.to_thread(self.compress, body, accept_encoding)
+            with self.lock:
+                self.offloaded += 1
+        else:
+            body, encoding = self.compress(body, accept_encoding)
+
+        response_headers = {"Vary": "Accept, Accept-Encoding", **(headers or {})}
+        if encoding is not None:
+            response_headers["Content-Encoding"] = encoding
+        with self.lock:
+            self.responses += 1
+            self.raw_bytes += raw_size
+            self.sent_bytes += len(body)
+            self.by_format[media_type] = self.by_format.get(media_type, 0) + 1
+            key = encoding or "identity"
+            self.by_encoding[key] = self.by_encoding.get(key, 0) + 1
+        return Response(content=body, status_code=status_code, media_type=media_type, headers=response_headers)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "responses": self.responses,
+                "raw_bytes": self.raw_bytes,
+                "sent_bytes": self.sent_bytes,
+                "compression_ratio": round(self.sent_bytes / self.raw_bytes, 3) if self.raw_bytes else None,
+                "by_format": dict(self.by_format),
+                "by_encoding": dict(self.by_encoding),
+                "offloaded": self.offloaded,
+                "msgpack_available": msgpack is not None,
+                "zstd_available": zstandard is not None
+            }
\ No newline at end of file
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+class ResultStore:
+    """
+    处理结果持久化：SQLite索引 + 每个结果一个JSON文件
+    - 按 (上传内容SHA-256, 处理选项) 去重，同一文件重复上传直接返回已有结果
+    - 按 ppt_id 随时取回
+    - 超过max_bytes时按最近访问时间淘汰
+    - 按稳定的deck_id记录每份PPT的最新版本，重新上传修改后的PPT时复用未变化的页面
+    """
+    def __init__(self, directory: str, max_bytes: Optional[int] = None):
+        self.directory = directory
+        self.blob_dir = os.path.join(directory, "blobs")
+        self.max_bytes = max_bytes
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(directory, "index.db"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "ppt_id TEXT PRIMARY KEY, content_hash TEXT NOT NULL, options_key TEXT NOT NULL, "
+            "size INTEGER NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL, "
+            "UNIQUE (content_hash, options_key))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results(accessed_at)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS decks ("
+            "deck_id TEXT PRIMARY KEY, ppt_id TEXT NOT NULL, options_key TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+        self.hits = 0
+        self.misses = 0
+        self.hit_seconds = 0.0
+        self.processed = 0
+        self.process_seconds = 0.0
+        self.versions = 0
+        self.reused_pages = 0
+        self.extended_pages = 0
+
+    @classmethod
+    def from_env(cls) -> "ResultStore":
+        return cls(
+            os.getenv("RESULT_STORE_DIR", "./data/results"),
+            max_bytes=int(os.getenv("RESULT_STORE_MAX_BYTES", str(1024 ** 3))) or None
+        )
+
+    @staticmethod
+    def make_options_key(options: Dict[str, Any]) -> str:
+        """影响处理结果的选项（模型、模板等）的指纹"""
+        return hashlib.sha256(json.dumps(options, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+    def _blob_path(self, ppt_id: str) -> str:
+        return os.path.join(self.blob_dir, f"{ppt_id}.json")
+
+    def lookup(self, content_hash: str, options_key: str) -> Optional[str]:
+        """查找相同内容与选项的已完成结果，返回其ppt_id"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT ppt_id FROM results WHERE content_hash = ? AND options_key = ?",
+                (content_hash, options_key)
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        return row[0]
+
+    def get(self, ppt_id: str) -> Optional[Dict]:
+        """按ppt_id读取结果；索引存在但文件丢失时删除索引"""
+        try:
+            with open(self._blob_path(ppt_id), "r", encoding="utf-8") as f:
+                result = json.load(f)
+        except FileNotFoundError:
+            with self.lock:
+                self.conn.execute("DELETE FROM results WHERE ppt_id = ?", (ppt_id,))
+                self.conn.commit()
+            return None
+        with self.lock:
+            self.conn.execute("UPDATE results SET accessed_at = ? WHERE ppt_id = ?", (time.time(), ppt_id))
+            self.conn.commit()
+        return result
+
+    def put(self, ppt_id: str, content_hash: str, options_key: str, result: Dict):
+        """先写临时文件再原子替换，保证索引指向的文件完整"""
+        payload = json.dumps(result, ensure_ascii=False).encode("utf-8")
+        path = self._blob_path(ppt_id)
+        with open(path + ".tmp", "wb") as f:
+            f.write(payload)
+        os.replace(path + ".tmp", path)
+
+        now = time.time()
+        with self.lock:
+            # 同一内容与选项只保留最新的结果
+            replaced = self.conn.execute(
+                "SELECT ppt_id FROM results WHERE content_hash = ? AND options_key = ? AND ppt_id != ?",
+                (content_hash, options_key, ppt_id)
+            ).fetchall()
+            for (old_id,) in replaced:
+                self._remove(old_id)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO results (ppt_id, content_hash, options_key, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (ppt_id, content_hash, options_key, len(payload), now, now)
+            )
+            self._evict(keep=ppt_id)
+            self.conn.commit()
+
+    def _remove(self, ppt_id: str):
+        self.conn.execute("DELETE FROM results WHERE ppt_id = ?", (ppt_id,))
+        try:
+            os.remove(self._blob_path(ppt_id))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self, keep: str):
+        """按最近访问时间淘汰到容量以内（刚写入的结果除外）"""
+        if self.max_bytes is None:
+            return
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.conn.execute(
+            "SELECT ppt_id, size FROM results WHERE ppt_id != ? ORDER BY accessed_at", (keep,)
+        ).fetchall()
+        for ppt_id, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._remove(ppt_id)
+            total -= size
+
+    def latest_version(self, deck_id: str) -> Optional[Tuple[str, str]]:
+        """PPT最新版本的 (ppt_id, 选项指纹)，没有记录时返回None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT ppt_id, options_key FROM decks WHERE deck_id = ?", (deck_id,)
+            ).fetchone()
+        return tuple(row) if row is not None else None
+
+    def put_version(self, deck_id: str, ppt_id: str, options_key: str, version_stats: Dict[str, Any]):
+        """记录PPT的最新版本，并累计复用页数"""
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO decks (deck_id, ppt_id, options_key, updated_at) VALUES (?, ?, ?, ?)",
+                (deck_id, ppt_id, options_key, time.time())
+            )
+            self.conn.commit()
+            self.versions += 1
+            self.reused_pages += version_stats["reused_pages"]
+            self.extended_pages += version_stats["extended_pages"]
+
+    def record_hit(self, seconds: float):
+        self.hits += 1
+        self.hit_seconds += seconds
+
+    def record_processed(self, seconds: float):
+        self.processed += 1
+        self.process_seconds += seconds
+
+    def total_bytes(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        """去重命中与完整处理的平均耗时对比"""
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        hit_avg = self.hit_seconds / self.hits if self.hits else None
+        process_avg = self.process_seconds / self.processed if self.processed else None
+        return {
+            "entries": entries,
+            "bytes": self.total_bytes(),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_seconds_avg": round(hit_avg, 4) if hit_avg is not None else None,
+            "process_seconds_avg": round(process_avg, 3) if process_avg is not None else None,
+            "speedup": round(process_avg / hit_avg, 1) if hit_avg and process_avg else None,
+            "versions": self.versions,
+            "reused_pages": self.reused_pages,
+            "extended_pages": self.extended_pages
+        }
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
\ No newline at end of file
@@ -0,0 +1,118 @@
+import asyncio
+import os
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.cache_backends import CacheBackend, MemoryCacheBackend, SQLiteCacheBackend, run_cache_io
+
+class SearchCache:
+    """
+    外部检索结果缓存
+    - 键: (数据源, 规范化查询)
+    - 每个数据源独立TTL，空结果使用较短的负缓存TTL
+    - 相同的进行中查询合并为一次外部请求（single-flight）
+    - SQLite后端的读写在线程中执行，不阻塞事件循环
+    """
+    DEFAULT_TTLS = {
+        "wikipedia": 24 * 3600,
+        "arxiv": 6 * 3600,
+        "semantic_scholar": 6 * 3600
+    }
+
+    def __init__(self, backend: Optional[CacheBackend] = None, ttls: Dict[str, float] = None,
+                 negative_ttl: float = 600):
+        self.backend = backend if backend is not None else MemoryCacheBackend()
+        self.ttls = {**self.DEFAULT_TTLS, **(ttls or {})}
+        self.negative_ttl = negative_ttl
+        self.inflight: Dict[str, asyncio.Future] = {}
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @classmethod
+    def from_env(cls) -> "SearchCache":
+        """根据环境变量选择内存或SQLite后端"""
+        if os.getenv("SEARCH_CACHE_BACKEND", "memory") == "sqlite":
+            backend = SQLiteCacheBackend(
+                os.getenv("SEARCH_CACHE_PATH", "./data/search_cache.db"),
+                max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "100000"))
+            )
+        else:
+            backend = MemoryCacheBackend(max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "10000")))
+        return cls(backend=backend, negative_ttl=float(os.getenv("SEARCH_CACHE_NEGATIVE_TTL", "600")))
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """大小写折叠并合并空白"""
+        return re.sub(r"\s+", " ", query).strip().casefold()
+
+    def make_key(self, source: str, query: str, variant: Any = None) -> str:
+        """variant区分同一查询的不同请求参数（如结果数、排序方式）"""
+        key = f"{source}:{self.normalize_query(query)}"
+        return f"{key}:{variant}" if variant is not None else key
+
+    async def get_or_fetch(self, source: str, query: str, fetch: Callable[[], Awaitable[List[Dict]]],
+                           variant: Any = None) -> List[Dict]:
+        """
+        命中缓存直接返回；否则合并相同的进行中请求，只调用一次fetch
+        fetch抛出的异常会传递给所有等待者，且不写入缓存
+        """
+        key = self.make_key(source, query, variant)
+        cached = await run_cache_io(self.backend, self.backend.get, key)
+        if cached is not None:
+            self.hits += 1
+            if not cached:
+                self.negative_hits += 1
+            return list(cached)
+
+        # 外部请求在独立任务中执行：发起者被取消时不影响合并进来的其他等待者，
+        # 只有所有等待者都取消后才取消该请求
+        flight = self.inflight.get(key)
+        if flight is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            flight = self.inflight[key] = {"task": asyncio.create_task(self._fetch(key, source, fetch)), "waiters": 0}
+            # 没有等待者时避免"exception was never retrieved"警告
+            flight["task"].add_done_callback(lambda task: task.cancelled() or task.exception())
+        flight["waiters"] += 1
+        try:
+            return list(await asyncio.shield(flight["task"]))
+        finally:
+            flight["waiters"] -= 1
+            if flight["waiters"] == 0 and not flight["task"].done():
+                flight["task"].cancel()
+                if self.inflight.get(key) is flight:
+                    del self.inflight[key]
+
+    async def _fetch(self, key: str, source: str, fetch: Callable[[], Awaitable[List[Dict]]]) -> List[Dict]:
+        """执行一次外部请求并写入缓存（异常不写入缓存）"""
+        try:
+            results = await fetch()
+            ttl = self.ttls.get(source, self.negative_ttl) if results else self.negative_ttl
+            await run_cache_io(self.backend, self.backend.set, key, results, ttl=ttl)
+            return results
+        finally:
+            # 被取消时该键可能已由新的请求重新发起，只删除自己的记录
+            flight = self.inflight.get(key)
+            if flight is not None and flight["task"] is asyncio.current_task():
+                del self.inflight[key]
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": (self.hits + self.coalesced) / total if total else 0.0,
+            "inflight": len(self.inflight),
+            "entries": len(self.backend),
+            "ttls": self.ttls,
+            "negative_ttl": self.negative_ttl
+        }
+
+    def close(self):
+        self.backend.close()
\ No newline at end of file
@@ -1,32 +1,122 @@
 import aiohttp
 import asyncio
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, AsyncIterator
 import json
+import os
+import time
 from urllib.parse import quote_plus
 import requests
 
+from app.arxiv_parser import ArxivAtomParser
+from app.search_cache import SearchCache
+
 class SearchClient:
-    def __init__(self):
+    # 各外部源的默认超时（秒）
+    DEFAULT_TIMEOUTS = {
+        "wikipedia": 5.0,
+        "arxiv": 10.0,
+        "semantic_scholar": 8.0
+    }
+    
+    ARXIV_CHUNK_SIZE = 16384
+    
+    SOURCE_NAMES = {
+        "wikipedia": "Wikipedia",
+        "arxiv": "Arxiv",
+        "semantic_scholar": "Semantic Scholar"
+    }
+    
+    def __init__(self, limit: int = None, limit_per_host: int = None,
+                 dns_cache_ttl: int = None, keepalive_timeout: float = None,
+                 timeouts: Dict[str, float] = None, cache: SearchCache = None):
         self.wikipedia_api = "https://en.wikipedia.org/api/rest_v1/page/summary/"
         self.arxiv_api = "http://export.arxiv.org/api/query"
         self.semantic_scholar_api = "https://api.semanticscholar.org/graph/v1/paper/search"
         
+        # 连接池配置（未指定时读取环境变量）
+        self.limit = limit or int(os.getenv("SEARCH_POOL_LIMIT", "100"))
+        self.limit_per_host = limit_per_host or int(os.getenv("SEARCH_POOL_LIMIT_PER_HOST", "10"))
+        self.dns_cache_ttl = dns_cache_ttl or int(os.getenv("SEARCH_DNS_CACHE_TTL", "300"))
+        self.keepalive_timeout = keepalive_timeout or float(os.getenv("SEARCH_KEEPALIVE_TIMEOUT", "30"))
+        self.timeouts = {**self.DEFAULT_TIMEOUTS, **(timeouts or {})}
+        
+        # 长连接会话，在事件循环中按需创建，随应用生命周期关闭
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.connector: Optional[aiohttp.TCPConnector] = None
+        self.request_counts = {source: 0 for source in self.DEFAULT_TIMEOUTS}
+        self.error_counts = {source: 0 for source in self.DEFAULT_TIMEOUTS}
+        # 各源的调用次数与累计耗时（含缓存命中），用于估算跳过某个源节省的时间
+        self.source_calls = {source: 0 for source in self.DEFAULT_TIMEOUTS}
+        self.source_seconds = {source: 0.0 for source in self.DEFAULT_TIMEOUTS}
+        
+        # 结果缓存（按数据源TTL、负缓存、请求合并）
+        self.cache = cache or SearchCache.from_env()
+    
+    async def start(self) -> aiohttp.ClientSession:
+        """创建共享会话（已存在时直接返回）"""
+        if self.session is None or self.session.closed:
+            self.connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            self.session = aiohttp.ClientSession(
+                connector=self.connector,
+                headers={'User-Agent': 'PPT-Knowledge-Extender/1.0'}
+            )
+        return self.session
+    
+    async def close(self):
+        """关闭共享会话与连接池"""
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+        self.connector = None
+        self.cache.close()
+    
+    def _timeout(self, source: str) -> aiohttp.ClientTimeout:
+        return aiohttp.ClientTimeout(total=self.timeouts[source])
+    
+    def pool_stats(self) -> Dict[str, Any]:
+        """连接池统计，用于容量规划"""
+        stats = {
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+            "dns_cache_ttl": self.dns_cache_ttl,
+            "keepalive_timeout": self.keepalive_timeout,
+            "timeouts": self.timeouts,
+            "requests": dict(self.request_counts),
+            "errors": dict(self.error_counts),
+            "open": self.session is not None and not self.session.closed,
+            "in_use": 0,
+            "idle": 0,
+            "idle_per_host": {}
+        }
+        if self.connector is not None:
+            # aiohttp未公开这些计数，读取内部状态
+            stats["in_use"] = len(getattr(self.connector, "_acquired", ()))
+            idle_conns = getattr(self.connector, "_conns", {})
+            stats["idle_per_host"] = {f"{key.host}:{key.port}": len(conns) for key, conns in idle_conns.items()}
+            stats["idle"] = sum(stats["idle_per_host"].values())
+        return stats
+    
     async def search_external(self, query: str, sources: List[str] = None) -> Dict[str, Any]:
         """
         从多个外部源搜索相关信息
         """
         if sources is None:
             sources = ["wikipedia", "arxiv", "semantic_scholar"]
+        searches = {
+            "wikipedia": self.search_wikipedia,
+            "arxiv": self.search_arxiv,
+            "semantic_scholar": self.search_semantic_scholar
+        }
+        # 只查询请求的源（忽略未知的源），结果与源一一对应
+        sources = [source for source in searches if source in sources]
         
         # 并行搜索
-        tasks = []
-        if "wikipedia" in sources:
-            tasks.append(self.search_wikipedia(query))
-        if "arxiv" in sources:
-            tasks.append(self.search_arxiv(query))
-        if "semantic_scholar" in sources:
-            tasks.append(self.search_semantic_scholar(query))
-        
+        tasks = [self._timed(source, searches[source](query)) for source in sources]
         results = await asyncio.gather(*tasks, return_exceptions=True)
         
         # 合并结果
@@ -37,10 +127,11 @@ class SearchClient:
             "all_sources": []
         }
         
-        for i, source in enumerate(sources):
-            if i < len(results) and not isinstance(results[i], Exception):
-                combined_results[source] = results[i]
-                combined_results["all_sources"].extend(results[i][:3])  # 每个源取前3个
+        for source, result in zip(sources, results):
+            # 被取消的源返回CancelledError（BaseException），同样跳过
+            if not isinstance(result, BaseException):
+                combined_results[source] = result
+                combined_results["all_sources"].extend(result[:3])  # 每个源取前3个
         
         # 按相关性排序（简单实现）
         combined_results["all_sources"] = sorted(
@@ -51,114 +142,124 @@ class SearchClient:
         
         return combined_results
     
+    async def _timed(self, source: str, search) -> List[Dict]:
+        started = time.perf_counter()
+        try:
+            return await search
+        finally:
+            self.source_calls[source] += 1
+            self.source_seconds[source] += time.perf_counter() - started
+    
+    def source_latency(self) -> Dict[str, Optional[float]]:
+        """各源平均每次检索的耗时（秒），尚未调用过的源为None"""
+        return {
+            source: self.source_seconds[source] / calls if calls else None
+            for source, calls in self.source_calls.items()
+        }
+    
+    async def _cached_search(self, source: str, query: str, fetch, variant: Any = None) -> List[Dict]:
+        """经过结果缓存与请求合并执行检索，失败时返回空列表（不缓存）"""
+        try:
+            return await self.cache.get_or_fetch(source, query, fetch, variant=variant)
+        except Exception as e:
+            self.error_counts[source] += 1
+            print(f"{self.SOURCE_NAMES[source]}搜索错误: {e}")
+            return []
+    
     async def search_wikipedia(self, query: str) -> List[Dict]:
         """搜索Wikipedia"""
+        return await self._cached_search("wikipedia", query, lambda: self._fetch_wikipedia(query))
+    
+    async def _fetch_wikipedia(self, query: str) -> List[Dict]:
         url = f"{self.wikipedia_api}{quote_plus(query)}"
         
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return [{
-                            "source": "Wikipedia",
-                            "title": data.get("title", ""),
-                            "summary": data.get("extract", ""),
-                            "url": data.get("content_urls", {}).get("desktop", {}).get("page", ""),
-                            "relevance_score": 0.9
-                        }]
-        except Exception as e:
-            print(f"Wikipedia搜索错误: {e}")
-        
-        return []
+        self.request_counts["wikipedia"] += 1
+        session = await self.start()
+        async with session.get(url, timeout=self._timeout("wikipedia")) as response:
+            if response.status == 404:
+                return []  # 没有对应词条，作为空结果缓存
+            response.raise_for_status()
+            data = await response.json()
+            return [{
+                "source": "Wikipedia",
+                "title": data.get("title", ""),
+                "summary": data.get("extract", ""),
+                "url": data.get("content_urls", {}).get("desktop", {}).get("page", ""),
+                "relevance_score": 0.9
+            }]
     
-    async def search_arxiv(self, query: str, max_results: int = 5) -> List[Dict]:
+    async def search_arxiv(self, query: str, max_results: int = 5,
+                           sort_by: str = "relevance", sort_order: str = "descending") -> List[Dict]:
         """搜索Arxiv学术论文"""
+        return await self._cached_search(
+            "arxiv", query,
+            lambda: self._fetch_arxiv(query, max_results, sort_by, sort_order),
+            variant=f"{max_results}:{sort_by}:{sort_order}"
+        )
+    
+    async def _fetch_arxiv(self, query: str, max_results: int, sort_by: str, sort_order: str) -> List[Dict]:
+        return [entry async for entry in self.stream_arxiv(query, max_results, sort_by, sort_order)]
+    
+    async def stream_arxiv(self, query: str, max_results: int = 5,
+                           sort_by: str = "relevance", sort_order: str = "descending") -> AsyncIterator[Dict]:
+        """
+        流式请求arXiv：按块读取响应体，每解析完一个条目立即产出（不经过缓存）
+        """
         params = {
-            "search_query": f"all:{quote_plus(query)}",
+            "search_query": f"all:{query}",
             "start": 0,
             "max_results": max_results,
-            "sortBy": "relevance",
-            "sortOrder": "descending"
+            "sortBy": sort_by,
+            "sortOrder": sort_order
         }
         
-        url = f"{self.arxiv_api}?search_query={params['search_query']}&start={params['start']}&max_results={params['max_results']}"
-        
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        content = await response.text()
-                        
-                        # 解析Atom格式（简化版）
-                        results = []
-                        lines = content.split('\n')
-                        
-                        entry = {}
-                        for line in lines:
-                            line = line.strip()
-                            if line.startswith('<entry>'):
-                                entry = {}
-                            elif line.startswith('<title>'):
-                                entry['title'] = line.replace('<title>', '').replace('</title>', '').strip()
-                            elif line.startswith('<summary>'):
-                                entry['summary'] = line.replace('<summary>', '').replace('</summary>', '').strip()
-                            elif line.startswith('<id>'):
-                                entry['url'] = line.replace('<id>', '').replace('</id>', '').strip()
-                            elif line.startswith('</entry>'):
-                                if entry:
-                                    results.append({
-                                        "source": "Arxiv",
-                                        "title": entry.get('title', ''),
-                                        "summary": entry.get('summary', '')[:200] + "...",
-                                        "url": entry.get('url', ''),
-                                        "relevance_score": 0.8
-                                    })
-                        
-                        return results
-        except Exception as e:
-            print(f"Arxiv搜索错误: {e}")
-        
-        return []
+        self.request_counts["arxiv"] += 1
+        session = await self.start()
+        async with session.get(self.arxiv_api, params=params, timeout=self._timeout("arxiv")) as response:
+            response.raise_for_status()
+            parser = ArxivAtomParser()
+            async for chunk in response.content.iter_chunked(self.ARXIV_CHUNK_SIZE):
+                for entry in parser.feed(chunk):
+                    yield entry
+            for entry in parser.close():
+                yield entry
     
     async def search_semantic_scholar(self, query: str, limit: int = 5) -> List[Dict]:
         """搜索Semantic Scholar学术论文"""
-        headers = {
-            'User-Agent': 'PPT-Knowledge-Extender/1.0'
-        }
-        
+        return await self._cached_search(
+            "semantic_scholar", query, lambda: self._fetch_semantic_scholar(query, limit), variant=limit
+        )
+    
+    async def _fetch_semantic_scholar(self, query: str, limit: int) -> List[Dict]:
         params = {
             'query': query,
             'limit': limit,
             'fields': 'title,abstract,url,year,authors,citationCount'
         }
         
-        try:
-            async with aiohttp.ClientSession(headers=headers) as session:
-                async with session.get(self.semantic_scholar_api, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        
-                        results = []
-                        for paper in data.get('data', [])[:limit]:
-                            authors = [author['name'] for author in paper.get('authors', [])[:3]]
-                            
-                            results.append({
-                                "source": "Semantic Scholar",
-                                "title": paper.get('title', ''),
-                                "summary": paper.get('abstract', '')[:200] + "...",
-                                "url": paper.get('url', ''),
-                                "authors": authors,
-                                "year": paper.get('year'),
-                                "citations": paper.get('citationCount', 0),
-                                "relevance_score": 0.85
-                            })
-                        
-                        return results
-        except Exception as e:
-            print(f"Semantic Scholar搜索错误: {e}")
-        
-        return []
+        self.request_counts["semantic_scholar"] += 1
+        session = await self.start()
+        async with session.get(self.semantic_scholar_api, params=params,
+                               timeout=self._timeout("semantic_scholar")) as response:
+            response.raise_for_status()
+            data = await response.json()
+            
+            results = []
+            for paper in data.get('data', [])[:limit]:
+                authors = [author['name'] for author in paper.get('authors', [])[:3]]
+                
+                results.append({
+                    "source": "Semantic Scholar",
+                    "title": paper.get('title', ''),
+                    "summary": paper.get('abstract', '')[:200] + "...",
+                    "url": paper.get('url', ''),
+                    "authors": authors,
+                    "year": paper.get('year'),
+                    "citations": paper.get('citationCount', 0),
+                    "relevance_score": 0.85
+                })
+            
+            return results
     
     async def search_multiple_sources_concurrently(self, queries: List[str]) -> Dict[str, List]:
         """
@@ -0,0 +1,30 @@
+import threading
+from typing import Any, Dict, Optional
+
+class StageTimings:
+    """
+    各处理阶段（按扩展深度区分的LLM扩展、问题生成等）的累计耗时
+    用于估算请求跳过或缩减某个阶段时节省的时间
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls: Dict[str, int] = {}
+        self.seconds: Dict[str, float] = {}
+
+    def record(self, stage: str, seconds: float):
+        with self.lock:
+            self.calls[stage] = self.calls.get(stage, 0) + 1
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    def average(self, stage: str) -> Optional[float]:
+        """平均每次耗时（秒），尚未执行过的阶段返回None"""
+        with self.lock:
+            calls = self.calls.get(stage)
+            return self.seconds[stage] / calls if calls else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                stage: {"calls": calls, "seconds_avg": round(self.seconds[stage] / calls, 4)}
+                for stage, calls in self.calls.items()
+            }
\ No newline at end of file
@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+import os
+import re
+import time
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+from fastapi import UploadFile
+
+class UploadTooLargeError(Exception):
+    """上传文件超过大小限制"""
+
+def sanitize_filename(filename: Optional[str], max_length: int = 100) -> str:
+    """
+    清理上传文件名：去掉路径部分，只保留字母数字（含中文）、点、横线和下划线
+    """
+    name = os.path.basename((filename or "").replace("\\", "/"))
+    name = re.sub(r"[^\w.\-]+", "_", name).strip("._")
+    if len(name) > max_length:
+        stem, ext = os.path.splitext(name)
+        name = stem[:max_length - len(ext)] + ext
+    return name or "upload"
+
+class TempFileManager:
+    """
+    上传临时文件管理
+    - 分块写入磁盘并计算SHA-256，超过大小限制立即中止并删除
+    - 请求处理中的文件与未完成任务的文件受保护，其余文件由清理任务按
+      过期时间与目录配额（最旧的先删）回收
+    """
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, directory: str = "temp", max_upload_bytes: int = 200 * 1024 ** 2,
+                 quota_bytes: int = 2 * 1024 ** 3, max_age: float = 3600,
+                 protected: Callable[[], Iterable[str]] = None):
+        self.directory = directory
+        self.max_upload_bytes = max_upload_bytes
+        self.quota_bytes = quota_bytes
+        self.max_age = max_age
+        self.protected = protected or (lambda: ())
+        self.active: Set[str] = set()
+        os.makedirs(directory, exist_ok=True)
+
+        self.rejected = 0
+        self.removed_files = 0
+        self.removed_bytes = 0
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "TempFileManager":
+        return cls(
+            directory=os.getenv("UPLOAD_FOLDER", "temp"),
+            max_upload_bytes=int(os.getenv("MAX_CONTENT_LENGTH", str(200 * 1024 ** 2))),
+            quota_bytes=int(os.getenv("TEMP_QUOTA_BYTES", str(2 * 1024 ** 3))),
+            max_age=float(os.getenv("TEMP_MAX_AGE", "3600")),
+            **kwargs
+        )
+
+    async def save(self, file: UploadFile, file_id: str) -> Tuple[str, str]:
+        """
+        分块保存上传文件，同时计算SHA-256
+        返回: (文件路径, 内容哈希)；超过大小限制时抛出UploadTooLargeError
+        """
+        if file.size is not None and file.size > self.max_upload_bytes:
+            self.rejected += 1
+            raise UploadTooLargeError(f"文件大小超过限制 {self.max_upload_bytes} 字节")
+
+        path = os.path.join(self.directory, f"{file_id}_{sanitize_filename(file.filename)}")
+        self.active.add(path)
+        hasher = hashlib.sha256()
+        written = 0
+        try:
+            with open(path, "wb") as f:
+                while True:
+                    chunk = await file.read(self.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    written += len(chunk)
+                    if written > self.max_upload_bytes:
+                        self.rejected += 1
+                        raise UploadTooLargeError(f"文件大小超过限制 {self.max_upload_bytes} 字节")
+                    hasher.update(chunk)
+                    f.write(chunk)
+        except BaseException:
+            self.release(path)
+            raise
+        return path, hasher.hexdigest()
+
+    def release(self, path: str, delete: bool = True):
+        """请求结束时释放文件；delete=False表示文件交给后台任务继续使用"""
+        self.active.discard(path)
+        if delete:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _files(self):
+        """目录中的文件: (路径, 修改时间, 大小)，按修改时间从旧到新"""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file():
+                    stat = entry.stat()
+                    entries.append((entry.path, stat.st_mtime, stat.st_size))
+        return sorted(entries, key=lambda item: item[1])
+
+    def usage(self) -> int:
+        return sum(size for _, _, size in self._files())
+
+    def cleanup(self) -> Dict[str, int]:
+        """删除过期文件，再从最旧的开始删除直到低于配额；受保护的文件跳过"""
+        keep = {os.path.normpath(path) for path in (*self.active, *self.protected())}
+        files = self._files()
+        total = sum(size for _, _, size in files)
+        now = time.time()
+        removed, freed = 0, 0
+        for path, mtime, size in files:
+            if os.path.normpath(path) in keep:
+                continue
+            if now - mtime < self.max_age and total <= self.quota_bytes:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+            freed += size
+        self.removed_files += removed
+        self.removed_bytes += freed
+        return {"removed": removed, "freed_bytes": freed, "usage_bytes": total}
+
+    async def run_janitor(self, interval: float = 60):
+        """后台定期清理"""
+        while True:
+            try:
+                result = await asyncio.to_thread(self.cleanup)
+                if result["removed"]:
+                    print(f"临时目录清理: 删除 {result['removed']} 个文件，释放 {result['freed_bytes']} 字节")
+            except Exception as e:
+                print(f"临时目录清理失败: {e}")
+            await asyncio.sleep(interval)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "directory": self.directory,
+            "usage_bytes": self.usage(),
+            "quota_bytes": self.quota_bytes,
+            "max_upload_bytes": self.max_upload_bytes,
+            "active_uploads": len(self.active),
+            "rejected": self.rejected,
+            "removed_files": self.removed_files,
+            "removed_bytes": self.removed_bytes
+        }
\ No newline at end of file
@@ -0,0 +1,40 @@
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+class VectorBackend:
+    """
+    向量存储后端接口
+    VectorStore负责文本编码与缓存，后端只处理已编码的向量与元数据
+    """
+    def add_documents(self, texts: List[str], embeddings: np.ndarray, metadatas: List[Dict]) -> List[int]:
+        """写入一批文档，返回与输入顺序一致的ID"""
+        raise NotImplementedError
+
+    def search_similar(self, embedding: np.ndarray, top_k: int = 5, ppt_id: Optional[str] = None,
+                       course: Optional[str] = None) -> List[Dict]:
+        """
+        按L2距离检索最相近的文档
+        ppt_id / course: 只在指定PPT或课程的文档中检索（先按标量过滤缩小范围，再计算距离）
+        """
+        raise NotImplementedError
+
+    def get_by_id(self, doc_id: int) -> Optional[Dict]:
+        """根据ID获取文档"""
+        raise NotImplementedError
+
+    def delete_by_ppt_id(self, ppt_id: str):
+        """删除指定PPT的所有文档"""
+        raise NotImplementedError
+
+    def delete_by_ids(self, doc_ids: List[int]):
+        """按ID删除文档（不存在的ID忽略）"""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        """后端状态统计"""
+        return {}
+
+    def close(self):
+        """释放后端资源"""
+        pass
\ No newline at end of file
@@ -1,40 +1,74 @@
 from pymilvus import connections, Collection, CollectionSchema, FieldSchema, DataType
 import numpy as np
 from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Optional, Union
+import hashlib
 import json
+import os
+import threading
 
-class VectorStore:
-    def __init__(self, host: str = "localhost", port: str = "19530"):
-        """
-        初始化Milvus向量数据库连接
-        """
+from app.embedding_cache import EmbeddingCache
+from app.local_vector_backend import LocalVectorBackend
+from app.vector_backend import VectorBackend
+
+def _quote(value: str) -> str:
+    """过滤表达式中的字符串字面量（转义引号与反斜杠）"""
+    return json.dumps(value, ensure_ascii=False)
+
+class MilvusBackend(VectorBackend):
+    """
+    基于Milvus的向量存储后端
+    partitioning:
+        key: ppt_id作为分区键（仅新建集合时生效），按ppt_id过滤时只搜索对应的分区（默认）
+        deck: 按deck_id上传的PPT（元数据versioned为真）各自一个物理分区，删除PPT即删除分区；
+              其余上传写入默认分区，避免每次上传新建分区而超出Milvus的分区数上限
+        没有分区键的已有集合按deck模式处理
+    ppt_id与course建有标量索引（Milvus 2.3使用Trie，2.4及以上可使用INVERTED），过滤条件在向量检索前裁剪候选行
+    """
+    DEFAULT_PARTITION = "_default"
+
+    def __init__(self, host: str = "localhost", port: str = "19530", dim: int = 384,
+                 partitioning: str = "key", scalar_index: str = "Trie"):
+        if partitioning not in ("deck", "key"):
+            raise ValueError(f"Unsupported partitioning: {partitioning}")
         self.host = host
         self.port = port
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        self.dim = dim
+        self.scalar_index = scalar_index
         
         # 连接Milvus
         connections.connect(host=host, port=port)
         
         # 定义集合结构
         self.collection_name = "ppt_slides"
-        self._create_collection_if_not_exists()
+        self._create_collection_if_not_exists(partitioning)
         
         # 加载集合
         self.collection = Collection(self.collection_name)
         
-    def _create_collection_if_not_exists(self):
+        # 已有集合以实际结构为准：有分区键时按分区键路由；没有course字段的旧集合不写入course
+        fields = list(self.collection.schema.fields)
+        self.partitioning = "key" if any(getattr(field, "is_partition_key", False) for field in fields) else "deck"
+        self.has_course = any(field.name == "course" for field in fields)
+        self._ensure_scalar_indexes()
+        
+        self.partitions_lock = threading.Lock()
+        self.known_partitions = set()
+        
+    def _create_collection_if_not_exists(self, partitioning: str):
         """创建集合（如果不存在）"""
         if not connections.has_collection(self.collection_name):
             # 定义字段
             fields = [
                 FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
-                FieldSchema(name="ppt_id", dtype=DataType.VARCHAR, max_length=100),
+                FieldSchema(name="ppt_id", dtype=DataType.VARCHAR, max_length=100,
+                            is_partition_key=partitioning == "key"),
                 FieldSchema(name="page_num", dtype=DataType.INT64),
                 FieldSchema(name="title", dtype=DataType.VARCHAR, max_length=500),
                 FieldSchema(name="content", dtype=DataType.VARCHAR, max_length=10000),
-                FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=384),
-                FieldSchema(name="metadata", dtype=DataType.JSON)
+                FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=self.dim),
+                FieldSchema(name="metadata", dtype=DataType.JSON),
+                FieldSchema(name="course", dtype=DataType.VARCHAR, max_length=100)
             ]
             
             # 创建模式
@@ -61,48 +95,105 @@ class VectorStore:
             
             print(f"Collection '{self.collection_name}' created successfully.")
     
-    def add_document(self, text: str, metadata: Dict = None) -> int:
-        """
-        添加文档到向量数据库
-        返回: 文档ID
-        """
-        # 生成嵌入向量
-        embedding = self.embedding_model.encode(text).tolist()
-        
-        # 准备数据
+    def _ensure_scalar_indexes(self):
+        """为过滤字段建立标量索引（已有集合缺少时补建）"""
+        for field_name in ("ppt_id", "course") if self.has_course else ("ppt_id",):
+            index_name = f"{field_name}_index"
+            if not self.collection.has_index(index_name=index_name):
+                self.collection.create_index(field_name=field_name, index_name=index_name,
+                                             index_params={"index_type": self.scalar_index})
+    
+    @staticmethod
+    def partition_name(ppt_id: str) -> str:
+        """PPT对应的分区名（分区名只允许字母、数字与下划线，使用ppt_id的哈希）"""
+        return "deck_" + hashlib.sha256(ppt_id.encode("utf-8")).hexdigest()
+    
+    def _has_partition(self, name: str) -> bool:
+        if name in self.known_partitions:
+            return True
+        if self.collection.has_partition(name):
+            self.known_partitions.add(name)
+            return True
+        return False
+    
+    def _ensure_partition(self, name: str):
+        with self.partitions_lock:
+            if not self._has_partition(name):
+                try:
+                    self.collection.create_partition(name)
+                except Exception:
+                    # 其他进程可能同时创建了该分区
+                    if not self.collection.has_partition(name):
+                        raise
+                self.known_partitions.add(name)
+    
+    def add_documents(self, texts: List[str], embeddings: np.ndarray, metadatas: List[Dict]) -> List[int]:
+        """一次列式插入、一次flush；deck分区模式下按deck_id上传的PPT写入各自的分区"""
+        # 准备列式数据
         data = [
-            [metadata.get("ppt_id", "")] if metadata else [""],
-            [metadata.get("page_num", 0)] if metadata else [0],
-            [metadata.get("title", "")] if metadata else [""],
-            [text],
-            [embedding],
-            [json.dumps(metadata) if metadata else "{}"]
+            [metadata.get("ppt_id", "") for metadata in metadatas],
+            [metadata.get("page_num", 0) for metadata in metadatas],
+            [metadata.get("title", "") for metadata in metadatas],
+            list(texts),
+            np.asarray(embeddings).tolist(),
+            [json.dumps(metadata) if metadata else "{}" for metadata in metadatas]
         ]
+        if self.has_course:
+            data.append([metadata.get("course", "") for metadata in metadatas])
         
-        # 插入数据
-        insert_result = self.collection.insert(data)
+        # 按目标分区分组插入（一批通常只属于一份PPT）；None表示由分区键路由或写入默认分区
+        groups = {}
+        for i, metadata in enumerate(metadatas):
+            deck_partition = self.partitioning == "deck" and metadata.get("versioned")
+            groups.setdefault(self.partition_name(metadata["ppt_id"]) if deck_partition else None, []).append(i)
+        primary_keys = [None] * len(texts)
+        for partition, rows in groups.items():
+            rows_data = data if len(rows) == len(texts) else [[column[i] for i in rows] for column in data]
+            if partition is None:
+                insert_result = self.collection.insert(rows_data)
+            else:
+                self._ensure_partition(partition)
+                insert_result = self.collection.insert(rows_data, partition_name=partition)
+            for i, key in zip(rows, insert_result.primary_keys):
+                primary_keys[i] = key
         
-        # 刷新集合
+        # 整批只刷新一次
         self.collection.flush()
         
-        return insert_result.primary_keys[0]
+        return primary_keys
     
-    def search_similar(self, query: str, top_k: int = 5) -> List[Dict]:
+    def search_similar(self, embedding: np.ndarray, top_k: int = 5, ppt_id: Optional[str] = None,
+                       course: Optional[str] = None) -> List[Dict]:
         """
-        语义搜索相似内容
+        按向量检索；ppt_id/course转换为标量过滤表达式
+        deck分区模式下按ppt_id检索只搜索该PPT的分区（以及旧版本写入的默认分区）
         """
-        # 生成查询向量
-        query_embedding = self.embedding_model.encode(query).tolist()
+        query_embedding = np.asarray(embedding).tolist()
         
         # 搜索参数
         search_params = {"metric_type": "L2", "params": {"nprobe": 10}}
         
+        # 过滤条件
+        conditions, partition_names = [], None
+        if ppt_id is not None:
+            conditions.append(f"ppt_id == {_quote(ppt_id)}")
+            if self.partitioning == "deck":
+                partition_names = [self.DEFAULT_PARTITION]
+                if self._has_partition(self.partition_name(ppt_id)):
+                    partition_names.append(self.partition_name(ppt_id))
+        if course is not None:
+            if not self.has_course:
+                raise ValueError(f"集合 '{self.collection_name}' 没有course字段，无法按课程过滤")
+            conditions.append(f"course == {_quote(course)}")
+        
         # 执行搜索
         results = self.collection.search(
             data=[query_embedding],
             anns_field="embedding",
             param=search_params,
             limit=top_k,
+            expr=" and ".join(conditions) or None,
+            partition_names=partition_names,
             output_fields=["content", "title", "page_num", "ppt_id", "metadata"]
         )
         
@@ -116,7 +207,7 @@ class VectorStore:
                     "content": hit.entity.get("content"),
                     "title": hit.entity.get("title"),
                     "page_num": hit.entity.get("page_num"),
-                    "metadata": json.loads(hit.entity.get("metadata", "{}"))
+                    "metadata": json.loads(hit.entity.get("metadata") or "{}")
                 })
         
         return formatted_results
@@ -139,7 +230,166 @@ class VectorStore:
             }
         return None
     
+    def delete_by_ppt_id(self, ppt_id: str):
+        """
+        删除指定PPT的所有文档
+        deck分区模式下释放并删除该PPT的分区，旧版本写入默认分区的文档按表达式删除
+        """
+        expr = f"ppt_id == {_quote(ppt_id)}"
+        if self.partitioning == "key":
+            self.collection.delete(expr=expr)
+        else:
+            partition = self.partition_name(ppt_id)
+            with self.partitions_lock:
+                if self._has_partition(partition):
+                    self.collection.partition(partition).release()
+                    self.collection.drop_partition(partition)
+                    self.known_partitions.discard(partition)
+            self.collection.delete(expr=expr, partition_name=self.DEFAULT_PARTITION)
+        self.collection.flush()
+    
+    def delete_by_ids(self, doc_ids: List[int]):
+        if not doc_ids:
+            return
+        self.collection.delete(expr=f"id in {[int(doc_id) for doc_id in doc_ids]}")
+        self.collection.flush()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "milvus", "collection": self.collection_name, "partitioning": self.partitioning,
+                "course_filter": self.has_course}
+    
+    def close(self):
+        connections.disconnect("default")
+
+class VectorStore:
+    def __init__(self, host: str = "localhost", port: str = "19530", encode_batch_size: int = 64,
+                 backend: Union[str, VectorBackend] = None):
+        """
+        初始化向量存储
+        backend: "milvus"（默认）、"local"（进程内NumPy/mmap引擎）或VectorBackend实例，
+        未指定时读取VECTOR_BACKEND
+        """
+        self.host = host
+        self.port = port
+        self.encode_batch_size = encode_batch_size
+        self.model_name = 'all-MiniLM-L6-v2'
+        self.dim = 384
+        self.embedding_model = SentenceTransformer(self.model_name)
+        
+        # 嵌入向量缓存（内存LRU + 可选磁盘层）
+        self.embedding_cache = EmbeddingCache(
+            model_name=self.model_name,
+            dim=self.dim,
+            max_memory_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "10000")),
+            disk_dir=os.getenv("EMBEDDING_CACHE_DIR") or None
+        )
+        
+        # 选择存储后端
+        if isinstance(backend, VectorBackend):
+            self.backend_name = type(backend).__name__
+            self.backend = backend
+            return
+        
+        self.backend_name = backend or os.getenv("VECTOR_BACKEND", "milvus")
+        if self.backend_name == "milvus":
+            self.backend = MilvusBackend(
+                host=host, port=port, dim=self.dim,
+                partitioning=os.getenv("MILVUS_PARTITIONING", "key"),
+                scalar_index=os.getenv("MILVUS_SCALAR_INDEX", "Trie")
+            )
+        elif self.backend_name == "local":
+            self.backend = LocalVectorBackend(
+                data_dir=os.getenv("VECTOR_DATA_DIR", "./data/vectors"),
+                dim=self.dim
+            )
+        else:
+            raise ValueError(f"Unsupported vector backend: {self.backend_name}")
+    
+    @property
+    def collection_name(self) -> str:
+        return getattr(self.backend, "collection_name", None)
+    
+    @property
+    def collection(self):
+        return getattr(self.backend, "collection", None)
+    
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """批量生成嵌入向量（经过缓存），返回 (n, dim) 的float32矩阵"""
+        return self.embedding_cache.encode(texts, self._encode_uncached)
+    
+    def _encode_uncached(self, texts: List[str]) -> np.ndarray:
+        """直接调用模型编码"""
+        embeddings = self.embedding_model.encode(
+            texts,
+            batch_size=self.encode_batch_size,
+            convert_to_numpy=True
+        )
+        return np.asarray(embeddings, dtype=np.float32).reshape(len(texts), -1)
+    
+    def warm_up(self, batch_size: int = 8):
+        """用一批虚拟文本预热模型（不经过缓存，避免污染命中统计）"""
+        self._encode_uncached(["warm up"] * batch_size)
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """嵌入缓存命中统计"""
+        return self.embedding_cache.stats()
+    
+    def add_document(self, text: str, metadata: Dict = None) -> int:
+        """
+        添加文档到向量数据库
+        返回: 文档ID
+        """
+        return self.add_documents([text], [metadata])[0]
+    
+    def add_documents(self, texts: List[str], metadatas: List[Dict] = None) -> List[int]:
+        """
+        批量添加文档：一次编码、一次列式插入、一次flush
+        返回: 与texts顺序一致的文档ID列表
+        """
+        if not texts:
+            return []
+        if metadatas is None:
+            metadatas = [None] * len(texts)
+        if len(metadatas) != len(texts):
+            raise ValueError("texts和metadatas长度不一致")
+        
+        metadatas = [metadata or {} for metadata in metadatas]
+        
+        # 批量生成嵌入向量
+        embeddings = self._encode(texts)
+        
+        return self.backend.add_documents(texts, embeddings, metadatas)
+    
+    def search_similar(self, query: str, top_k: int = 5, exclude_ids: Iterable[int] = (),
+                       ppt_id: Optional[str] = None, course: Optional[str] = None) -> List[Dict]:
+        """
+        语义搜索相似内容
+        exclude_ids: 不返回的文档ID（如页面自身的向量），多取相应条数后过滤，保证返回top_k条
+        ppt_id / course: 只在指定PPT或课程的文档中检索
+        """
+        # 生成查询向量
+        query_embedding = self._encode([query])[0]
+        exclude_ids = set(exclude_ids)
+        filters = {name: value for name, value in (("ppt_id", ppt_id), ("course", course)) if value is not None}
+        results = self.backend.search_similar(query_embedding, top_k=top_k + len(exclude_ids), **filters)
+        return [result for result in results if result["id"] not in exclude_ids][:top_k]
+    
+    def get_by_id(self, doc_id: int) -> Dict:
+        """根据ID获取文档"""
+        return self.backend.get_by_id(doc_id)
+    
     def delete_by_ppt_id(self, ppt_id: str):
         """删除指定PPT的所有文档"""
-        self.collection.delete(expr=f'ppt_id == "{ppt_id}"')
-        self.collection.flush()
\ No newline at end of file
+        self.backend.delete_by_ppt_id(ppt_id)
+    
+    def delete_by_ids(self, doc_ids: List[int]):
+        """按ID删除文档（如新版本PPT中被修改或删除的页面）"""
+        self.backend.delete_by_ids(doc_ids)
+    
+    def backend_stats(self) -> Dict[str, Any]:
+        return self.backend.stats()
+    
+    def close(self):
+        """释放缓存文件与后端资源"""
+        self.embedding_cache.close()
+        self.backend.close()
\ No newline at end of file
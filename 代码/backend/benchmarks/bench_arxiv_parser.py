@@ -0,0 +1,98 @@
+"""
+arXiv Atom解析基准测试：旧的按行切分解析 vs 增量XMLPullParser解析
+
+用法:
+    python benchmarks/bench_arxiv_parser.py
+    python benchmarks/bench_arxiv_parser.py --entries 2000 --chunk-size 16384
+
+将 test/test_data 中录制的响应条目复制N份拼成一个大feed，分别统计解析耗时、
+tracemalloc峰值内存，以及解析出的条目中标题/摘要不完整的数量。
+"""
+import argparse
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from app.arxiv_parser import ArxivAtomParser
+
+FIXTURE = os.path.join(BACKEND_DIR, "test", "test_data", "arxiv_neural_networks.xml")
+
+def legacy_parse(content: str):
+    """旧实现：整体读入后按行匹配标签（多行字段会被截断）"""
+    results = []
+    entry = {}
+    for line in content.split('\n'):
+        line = line.strip()
+        if line.startswith('<entry>'):
+            entry = {}
+        elif line.startswith('<title>'):
+            entry['title'] = line.replace('<title>', '').replace('</title>', '').strip()
+        elif line.startswith('<summary>'):
+            entry['summary'] = line.replace('<summary>', '').replace('</summary>', '').strip()
+        elif line.startswith('<id>'):
+            entry['url'] = line.replace('<id>', '').replace('</id>', '').strip()
+        elif line.startswith('</entry>'):
+            if entry:
+                results.append({
+                    "source": "Arxiv",
+                    "title": entry.get('title', ''),
+                    "summary": entry.get('summary', '')[:200] + "...",
+                    "url": entry.get('url', ''),
+                    "relevance_score": 0.8
+                })
+    return results
+
+def streaming_parse(data: bytes, chunk_size: int):
+    parser = ArxivAtomParser()
+    results = []
+    for offset in range(0, len(data), chunk_size):
+        results.extend(parser.feed(data[offset:offset + chunk_size]))
+    results.extend(parser.close())
+    return results
+
+def build_feed(entries: int) -> bytes:
+    with open(FIXTURE, "rb") as f:
+        data = f.read()
+    head = data[:data.index(b"<entry>")]
+    tail = data[data.rindex(b"</entry>") + len(b"</entry>"):]
+    items = re.findall(rb"<entry>.*?</entry>", data, flags=re.S)
+    body = b"\n  ".join(items[i % len(items)] for i in range(entries))
+    return head + body + tail
+
+def measure(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    results = fn()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return results, elapsed, peak
+
+def broken_fields(results, reference):
+    """与参考标题对比，统计被截断的标题"""
+    return sum(1 for r, ref in zip(results, reference) if r["title"] != ref["title"])
+
+def main(args):
+    data = build_feed(args.entries)
+    print(f"feed: {args.entries} entries, {len(data) / 1024:.1f} KiB")
+
+    # 旧实现需要先读入完整响应文本
+    legacy, legacy_time, legacy_peak = measure(lambda: legacy_parse(data.decode("utf-8")))
+    streaming, streaming_time, streaming_peak = measure(lambda: streaming_parse(data, args.chunk_size))
+
+    print(f"{'parser':<10} {'time':>9} {'peak mem':>11} {'entries':>8} {'bad titles':>11}")
+    print(f"{'legacy':<10} {legacy_time * 1000:>7.1f}ms {legacy_peak / 1024:>8.1f}KiB "
+          f"{len(legacy):>8} {broken_fields(legacy, streaming):>11}")
+    print(f"{'streaming':<10} {streaming_time * 1000:>7.1f}ms {streaming_peak / 1024:>8.1f}KiB "
+          f"{len(streaming):>8} {0:>11}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="arXiv Atom解析基准测试")
+    parser.add_argument("--entries", type=int, default=1000)
+    parser.add_argument("--chunk-size", type=int, default=16384)
+    main(parser.parse_args())
\ No newline at end of file
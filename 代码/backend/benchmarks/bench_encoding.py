@@ -0,0 +1,106 @@
+"""
+响应编码基准测试：pydantic模型 + 标准json 与 直接组装字典 + orjson/msgpack，以及压缩后的传输字节
+
+用法:
+    python benchmarks/bench_encoding.py
+    python benchmarks/bench_encoding.py --pages 500 --repeat 5
+
+生成一份带正文、元素、图片引用、扩展与参考文献的大型结果，分别统计：
+- 旧路径：逐页 PageContent(**page) 与 ExtendResponse 校验，再 jsonable_encoder + json.dumps
+- 新路径：page_record/build_result 组装字典，再 orjson 或 msgpack 编码
+- 各编码在 identity / gzip / zstd 下的传输字节与压缩耗时
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from fastapi.encoders import jsonable_encoder
+
+from app.main import build_result, page_record
+from app.models import ExtendResponse, PageContent
+from app.response_encoding import ResponseEncoder, msgpack, zstandard
+
+def make_pages(count: int):
+    pages = []
+    for i in range(1, count + 1):
+        pages.append({
+            "page_num": i,
+            "title": f"{i}. 第{i}节 神经网络基础",
+            "text": "反向传播通过链式法则计算梯度。\n" * 20,
+            "elements": [{"type": "text", "content": "反向传播通过链式法则计算梯度。" * 5,
+                          "position": {"left": 457200, "top": 1600200, "width": 8229600, "height": 4525963}}
+                         for _ in range(3)],
+            "images": [{"id": f"{i:064x}", "format": "png", "width": 640, "height": 480, "size": 48213,
+                        "url": f"/api/images/{i:064x}"}],
+        })
+    return pages
+
+def extensions(i: int):
+    return {
+        "extensions": {"extended_content": f"第{i}页的扩展内容，包含公式 $E=mc^2$ 与代码示例。" * 30,
+                       "template_type": "default", "cached": False},
+        "external_references": {"all_sources": [{"source": "Arxiv", "title": f"Paper {j}",
+                                                 "summary": "Abstract text " * 20} for j in range(3)]},
+        "vector_id": i
+    }
+
+def timed(fn, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        value = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, value
+
+def main(args):
+    pages = make_pages(args.pages)
+    structure = {"filename": "deck.pptx", "total_pages": len(pages), "pages": pages,
+                 "toc": [{"page": p["page_num"], "title": p["title"], "level": 2} for p in pages]}
+
+    def pydantic_path():
+        extended = [PageContent(**page, **extensions(page["page_num"])) for page in pages]
+        response = ExtendResponse(ppt_id="bench", original_filename="deck.pptx", total_pages=len(extended),
+                                  pages=extended, structure=structure, processing_time=1.0)
+        return json.dumps(jsonable_encoder(response), ensure_ascii=False).encode("utf-8")
+
+    def dict_path():
+        extended = [page_record(page, **extensions(page["page_num"])) for page in pages]
+        return build_result("bench", "deck.pptx", extended, structure, 1.0)
+
+    encoder = ResponseEncoder(min_bytes=0)
+    old_seconds, old_body = timed(pydantic_path, args.repeat)
+    build_seconds, result = timed(dict_path, args.repeat)
+    orjson_seconds, json_body = timed(lambda: encoder.serialize(result)[0], args.repeat)
+    print(f"{args.pages} pages")
+    print(f"  pydantic + json.dumps   {old_seconds * 1000:>8.1f} ms  {len(old_body):>10} bytes")
+    print(f"  dict + orjson           {(build_seconds + orjson_seconds) * 1000:>8.1f} ms  {len(json_body):>10} bytes"
+          f"  speedup {old_seconds / (build_seconds + orjson_seconds):.1f}x")
+
+    bodies = {"json": json_body}
+    if msgpack is not None:
+        msgpack_seconds, bodies["msgpack"] = timed(
+            lambda: encoder.serialize(result, "application/msgpack")[0], args.repeat)
+        print(f"  dict + msgpack          {(build_seconds + msgpack_seconds) * 1000:>8.1f} ms  "
+              f"{len(bodies['msgpack']):>10} bytes")
+    else:
+        print("  msgpack not installed, skipped")
+
+    encodings = ["gzip"] + (["zstd"] if zstandard is not None else [])
+    for name, body in bodies.items():
+        for encoding in encodings:
+            seconds, (compressed, _) = timed(lambda: encoder.compress(body, encoding), args.repeat)
+            print(f"  {name:<7} + {encoding:<4}          {seconds * 1000:>8.1f} ms  {len(compressed):>10} bytes "
+                  f"({len(compressed) / len(old_body):.1%} of old response)")
+    if zstandard is None:
+        print("  zstandard not installed, zstd skipped")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="响应编码基准测试")
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=3)
+    main(parser.parse_args())
\ No newline at end of file
@@ -0,0 +1,110 @@
+"""
+向量入库基准测试：逐页 add_document 与整份 add_documents 的耗时随页数的变化
+
+用法:
+    python benchmarks/bench_ingest.py
+    python benchmarks/bench_ingest.py --sizes 50 200 500 --flush-ms 20
+
+默认使用模拟的编码器与Milvus集合（固定的单次调用开销 + 按条目线性开销），
+便于在没有Milvus与模型的环境下复现；传入 --real-model 使用真实的SentenceTransformer。
+"""
+import argparse
+import os
+import sys
+import time
+from unittest.mock import patch, MagicMock
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.vector_store import VectorStore
+
+class FakeEncoder:
+    """模拟编码器：每次调用有固定开销，每条文本有线性开销"""
+    def __init__(self, call_ms: float, item_ms: float, dim: int = 384):
+        self.call_ms = call_ms
+        self.item_ms = item_ms
+        self.dim = dim
+        self.calls = 0
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True):
+        if isinstance(texts, str):
+            texts = [texts]
+        self.calls += 1
+        time.sleep((self.call_ms + self.item_ms * len(texts)) / 1000)
+        return np.random.rand(len(texts), self.dim).astype(np.float32)
+
+class FakeCollection:
+    """模拟Milvus集合：insert按行数计时，flush有固定开销"""
+    def __init__(self, insert_ms: float, flush_ms: float):
+        self.insert_ms = insert_ms
+        self.flush_ms = flush_ms
+        self.next_id = 0
+        self.flushes = 0
+        self.schema = MagicMock(fields=[])
+
+    def has_index(self, index_name=None):
+        return True
+
+    def has_partition(self, name):
+        return True
+
+    def insert(self, data, partition_name=None):
+        rows = len(data[0])
+        time.sleep(self.insert_ms / 1000)
+        result = MagicMock()
+        result.primary_keys = list(range(self.next_id, self.next_id + rows))
+        self.next_id += rows
+        return result
+
+    def flush(self):
+        self.flushes += 1
+        time.sleep(self.flush_ms / 1000)
+
+def make_deck(num_pages: int):
+    texts = [f"Slide {i}: gradient descent, backpropagation and loss functions " * 4 for i in range(num_pages)]
+    metadatas = [{"ppt_id": "bench", "page_num": i + 1, "title": f"Slide {i + 1}"} for i in range(num_pages)]
+    return texts, metadatas
+
+def build_store(args) -> VectorStore:
+    collection = FakeCollection(args.insert_ms, args.flush_ms)
+    encoder = None if args.real_model else FakeEncoder(args.call_ms, args.item_ms)
+    with patch('app.vector_store.connections') as mock_connections, \
+         patch('app.vector_store.Collection', return_value=collection):
+        mock_connections.has_collection.return_value = True
+        if encoder is None:
+            return VectorStore()
+        with patch('app.vector_store.SentenceTransformer', return_value=encoder):
+            return VectorStore()
+
+def run(args):
+    print(f"{'pages':>6} {'per-page (s)':>14} {'bulk (s)':>10} {'speedup':>8} {'flushes':>14}")
+    for size in args.sizes:
+        texts, metadatas = make_deck(size)
+
+        store = build_store(args)
+        start = time.perf_counter()
+        for text, metadata in zip(texts, metadatas):
+            store.add_document(text, metadata)
+        per_page = time.perf_counter() - start
+        per_page_flushes = store.collection.flushes
+
+        store = build_store(args)
+        start = time.perf_counter()
+        ids = store.add_documents(texts, metadatas)
+        bulk = time.perf_counter() - start
+        assert len(ids) == size
+
+        print(f"{size:>6} {per_page:>14.3f} {bulk:>10.3f} {per_page / bulk:>7.1f}x "
+              f"{per_page_flushes:>6} -> {store.collection.flushes}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="VectorStore批量入库基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200, 500])
+    parser.add_argument("--call-ms", type=float, default=8.0, help="模拟编码器单次调用开销")
+    parser.add_argument("--item-ms", type=float, default=0.5, help="模拟编码器每条文本开销")
+    parser.add_argument("--insert-ms", type=float, default=3.0, help="模拟单次insert开销")
+    parser.add_argument("--flush-ms", type=float, default=15.0, help="模拟单次flush开销")
+    parser.add_argument("--real-model", action="store_true", help="使用真实的SentenceTransformer模型")
+    run(parser.parse_args())
\ No newline at end of file
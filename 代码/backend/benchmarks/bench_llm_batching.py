@@ -0,0 +1,97 @@
+"""
+LLM扩展基准测试：逐页请求 vs 多页合并的批量请求
+
+用法:
+    python benchmarks/bench_llm_batching.py
+    python benchmarks/bench_llm_batching.py --slides 100 --batch-pages 8 --concurrency 8
+
+使用模拟的chat.completions接口：每次请求有固定开销，另按Prompt字符数与每页补全token数计时；
+报告整份PPT的总耗时、请求数与Prompt token数（按字符数计，与限流器的估算一致）。
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.llm_cache import LLMCache
+from app.llm_client import ExtensionBatcher, LLMClient
+from app.rate_limiter import RateLimiter
+
+class FakeCompletions:
+    """模拟接口：延迟 = 固定开销 + Prompt字符数 × prompt_us + 页数 × 补全耗时"""
+    def __init__(self, overhead_ms: float, prompt_us: float, page_ms: float):
+        self.overhead_ms = overhead_ms
+        self.prompt_us = prompt_us
+        self.page_ms = page_ms
+        self.requests = 0
+        self.prompt_tokens = 0
+
+    async def create(self, messages, **kwargs):
+        prompt_tokens = sum(len(message["content"]) for message in messages)
+        pages = re.findall(r"【第(\d+)页】", messages[-1]["content"])
+        self.requests += 1
+        self.prompt_tokens += prompt_tokens
+        await asyncio.sleep((self.overhead_ms + prompt_tokens * self.prompt_us / 1000
+                             + self.page_ms * max(len(pages), 1)) / 1000)
+        if pages:
+            content = json.dumps({page: {"extended_content": f"扩展{page}"} for page in pages})
+        else:
+            content = json.dumps({"extended_content": "扩展"})
+        response = MagicMock()
+        response.choices[0].message.content = content
+        response.usage.total_tokens = prompt_tokens
+        return response
+
+def make_slides(count: int):
+    """短页面为主：每页几条要点，每5页有一页较长的正文"""
+    slides = []
+    for page_num in range(1, count + 1):
+        bullets = 12 if page_num % 5 == 0 else 3
+        text = "\n".join(f"第{page_num}页要点{i}：梯度下降的学习率与收敛条件" for i in range(bullets))
+        slides.append({"page_num": page_num, "text": text})
+    return slides
+
+async def run_deck(args, batch_pages: int):
+    completions = FakeCompletions(args.overhead_ms, args.prompt_us, args.page_ms)
+    with patch("app.llm_client.AsyncOpenAI") as mock_openai:
+        mock_openai.return_value.chat.completions.create = completions.create
+        client = LLMClient(cache=LLMCache(), batch_pages=batch_pages, batch_tokens=args.batch_tokens,
+                           rate_limiter=RateLimiter(None, None, max_concurrency=args.concurrency))
+    slides = make_slides(args.slides)
+    context = [{"content": "相邻页面的内容" * 20}] * 3
+
+    started = time.perf_counter()
+    if batch_pages > 1:
+        batcher = ExtensionBatcher(client, slides)
+        results = await asyncio.gather(*(batcher.extend(slide["page_num"], slide["text"], context) for slide in slides))
+    else:
+        results = await asyncio.gather(*(client.extend_knowledge(slide["text"], context) for slide in slides))
+    elapsed = time.perf_counter() - started
+
+    assert all("extended_content" in result for result in results)
+    label = f"batch x{batch_pages}" if batch_pages > 1 else "per-slide"
+    print(f"{label:<10} {elapsed:>6.2f}s  requests {completions.requests:>4}  "
+          f"prompt tokens {completions.prompt_tokens:>7}  fallback pages {client.batch_stats()['fallback_pages']}")
+
+async def main(args):
+    print(f"{args.slides} slides, concurrency {args.concurrency}, request overhead {args.overhead_ms} ms")
+    await run_deck(args, 1)
+    for batch_pages in args.batch_pages:
+        await run_deck(args, batch_pages)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LLM批量扩展基准测试")
+    parser.add_argument("--slides", type=int, default=100)
+    parser.add_argument("--batch-pages", type=int, nargs="+", default=[4, 8])
+    parser.add_argument("--batch-tokens", type=int, default=8000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--overhead-ms", type=float, default=400)
+    parser.add_argument("--prompt-us", type=float, default=50)
+    parser.add_argument("--page-ms", type=float, default=300)
+    asyncio.run(main(parser.parse_args()))
\ No newline at end of file
@@ -0,0 +1,89 @@
+"""
+单页处理基准测试：旧的串行 检索 -> LLM -> 外部搜索 vs 外部搜索与检索、LLM并发
+
+用法:
+    python benchmarks/bench_page_pipeline.py
+    python benchmarks/bench_page_pipeline.py --pages 20 --retrieve-ms 30 --llm-ms 800 --search-ms 600
+
+使用模拟的向量库、LLM与检索客户端（固定延迟），报告每页平均耗时与整份PPT耗时；
+模拟向量库总是把页面自身排在第一位，同时统计上下文中的自身命中数。
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app.main as main_module
+
+class FakeVectorStore:
+    """模拟向量库：检索阻塞retrieve_ms，页面自身总是最相似的结果"""
+    def __init__(self, retrieve_ms: float, pages: int):
+        self.retrieve_ms = retrieve_ms
+        self.pages = pages
+
+    def search_similar(self, query: str, top_k: int = 5, exclude_ids=()):
+        time.sleep(self.retrieve_ms / 1000)
+        own_id = int(query.split()[1])
+        candidates = [own_id] + [i for i in range(1, self.pages + 1) if i != own_id]
+        return [{"id": i, "content": f"page {i}"} for i in candidates if i not in set(exclude_ids)][:top_k]
+
+class FakeLLMClient:
+    def __init__(self, llm_ms: float):
+        self.llm_ms = llm_ms
+        self.self_hits = 0
+
+    async def extend_knowledge(self, content: str, context=None):
+        own_id = int(content.split()[1])
+        self.self_hits += sum(1 for chunk in context or [] if chunk["id"] == own_id)
+        await asyncio.sleep(self.llm_ms / 1000)
+        return {"extended_content": content}
+
+class FakeSearchClient:
+    def __init__(self, search_ms: float):
+        self.search_ms = search_ms
+
+    async def search_external(self, query: str):
+        await asyncio.sleep(self.search_ms / 1000)
+        return {"all_sources": []}
+
+async def sequential_page(page_data, file_id, vector_id=None):
+    """旧实现：各阶段依次执行，检索不排除页面自身"""
+    text_content = page_data["text"]
+    similar_chunks = main_module.vector_store.search_similar(text_content, top_k=3)
+    llm_extensions = await main_module.llm_client.extend_knowledge(content=text_content, context=similar_chunks)
+    search_results = await main_module.search_client.search_external(query=page_data["title"])
+    return main_module.page_record(page_data, extensions=llm_extensions,
+                                   external_references=search_results, vector_id=vector_id)
+
+async def measure(label: str, process, pages, args):
+    llm_client = FakeLLMClient(args.llm_ms)
+    with patch.multiple(main_module, vector_store=FakeVectorStore(args.retrieve_ms, len(pages)),
+                        llm_client=llm_client, search_client=FakeSearchClient(args.search_ms)):
+        started = time.perf_counter()
+        single = await process(pages[0], "bench", pages[0]["page_num"])
+        single_elapsed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        await asyncio.gather(*(process(page, "bench", page["page_num"]) for page in pages))
+        deck_elapsed = time.perf_counter() - started
+    assert single["extensions"]
+    print(f"{label:<12} page {single_elapsed * 1000:>7.1f} ms  "
+          f"{len(pages)}-page deck {deck_elapsed:>6.2f}s  self-matches in context {llm_client.self_hits}")
+
+async def main(args):
+    pages = [{"page_num": i, "title": f"Slide {i}", "text": f"slide {i} content"} for i in range(1, args.pages + 1)]
+    print(f"retrieve {args.retrieve_ms} ms  llm {args.llm_ms} ms  external search {args.search_ms} ms")
+    await measure("sequential", sequential_page, pages, args)
+    await measure("concurrent", main_module.process_page_content, pages, args)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="单页处理基准测试")
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--retrieve-ms", type=float, default=30)
+    parser.add_argument("--llm-ms", type=float, default=800)
+    parser.add_argument("--search-ms", type=float, default=600)
+    asyncio.run(main(parser.parse_args()))
\ No newline at end of file
@@ -0,0 +1,76 @@
+"""
+PPT解析基准测试：线程模式 vs 按页范围拆分的多进程模式
+
+用法:
+    python benchmarks/bench_parser.py
+    python benchmarks/bench_parser.py --slides 50 200 500 --workers 1 2 4 --chunk-size 25
+
+为每种页数生成一份带标题、正文与图片的PPTX，分别统计各模式的解析耗时；
+多进程模式的首次调用包含进程池启动时间，因此先预热一次再计时。
+"""
+import argparse
+import asyncio
+import io
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from app.ppt_parser import PPTParser
+
+def build_deck(path: str, slides: int, image_every: int = 3) -> str:
+    """生成测试PPTX：每页一个标题与两段正文，每隔image_every页一张图片"""
+    from pptx import Presentation
+    from pptx.util import Inches
+    from PIL import Image
+
+    prs = Presentation()
+    for i in range(slides):
+        slide = prs.slides.add_slide(prs.slide_layouts[1])
+        slide.shapes.title.text = f"{i + 1}. Section {i + 1}"
+        slide.placeholders[1].text = "\n".join(f"Point {j} of slide {i + 1} " * 4 for j in range(5))
+        if image_every and i % image_every == 0:
+            buffer = io.BytesIO()
+            Image.new("RGB", (320, 240), color=(i * 7 % 256, 90, 150)).save(buffer, format="JPEG")
+            buffer.seek(0)
+            slide.shapes.add_picture(buffer, Inches(1), Inches(5), Inches(3), Inches(2))
+    prs.save(path)
+    return path
+
+async def time_parse(parser: PPTParser, path: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await parser.parse_ppt(path)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+async def main(args):
+    print(f"cpu count: {os.cpu_count()}, chunk size: {args.chunk_size}")
+    with tempfile.TemporaryDirectory() as directory:
+        for slides in args.slides:
+            path = build_deck(os.path.join(directory, f"deck_{slides}.pptx"), slides)
+
+            thread_parser = PPTParser(mode="thread")
+            baseline = await time_parse(thread_parser, path, args.repeat)
+            thread_parser.close()
+            print(f"{slides:>4} slides  thread          {baseline:>7.3f}s")
+
+            for workers in args.workers:
+                parser = PPTParser(mode="process", workers=workers, chunk_size=args.chunk_size)
+                await parser.parse_ppt(path)  # 预热进程池
+                elapsed = await time_parse(parser, path, args.repeat)
+                parser.close()
+                print(f"{slides:>4} slides  process x{workers:<2}     {elapsed:>7.3f}s  "
+                      f"speedup {baseline / elapsed:.2f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PPT解析基准测试")
+    parser.add_argument("--slides", type=int, nargs="+", default=[50, 200, 500])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--chunk-size", type=int, default=25)
+    parser.add_argument("--repeat", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
\ No newline at end of file
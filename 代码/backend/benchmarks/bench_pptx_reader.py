@@ -0,0 +1,44 @@
+"""
+PPTX提取基准测试：python-pptx对象模型 vs 直接读取幻灯片XML
+
+用法:
+    python benchmarks/bench_pptx_reader.py
+    python benchmarks/bench_pptx_reader.py --slides 100 500 --image-every 0
+
+image-every 为0时生成纯文本幻灯片，只比较文本、标题与几何信息的提取耗时。
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from app.ppt_parser import PPTParser
+from bench_parser import build_deck
+
+def time_engine(path: str, engine: str, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        pages = PPTParser._parse_pptx_pages(path, engine=engine)
+        best = min(best, time.perf_counter() - started)
+    return best, pages
+
+def main(args):
+    with tempfile.TemporaryDirectory() as directory:
+        for slides in args.slides:
+            path = build_deck(os.path.join(directory, f"deck_{slides}.pptx"), slides, args.image_every)
+            baseline, expected = time_engine(path, "python-pptx", args.repeat)
+            elapsed, pages = time_engine(path, "xml", args.repeat)
+            print(f"{slides:>4} slides  python-pptx {baseline:>7.3f}s  xml {elapsed:>7.3f}s  "
+                  f"speedup {baseline / elapsed:.2f}x  identical={pages == expected}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PPTX提取基准测试")
+    parser.add_argument("--slides", type=int, nargs="+", default=[50, 200, 500])
+    parser.add_argument("--image-every", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    main(parser.parse_args())
\ No newline at end of file
@@ -0,0 +1,84 @@
+"""
+启动耗时基准测试：从进程启动到首个 /health 响应、到 /ready 就绪的时间
+
+用法:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 5 --ready-timeout 120
+
+每轮启动一个新的uvicorn进程并轮询端点；同时打印服务自身在 /ready 中报告的
+first_health_seconds、ready_seconds 与各组件的初始化耗时。
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def get(url: str):
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+    except (urllib.error.URLError, ConnectionError, socket.timeout):
+        return None, None
+
+def wait_for(url: str, timeout: float, predicate) -> float:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        status, body = get(url)
+        if predicate(status, body):
+            return time.perf_counter()
+        time.sleep(0.01)
+    return float("nan")
+
+def run_once(ready_timeout: float):
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR
+    )
+    try:
+        health_at = wait_for(f"{base}/health", 60, lambda status, body: status == 200)
+        ready_at = wait_for(f"{base}/ready", ready_timeout,
+                            lambda status, body: body is not None and body.get("status") != "starting")
+        _, report = get(f"{base}/ready")
+        return health_at - started, ready_at - started, report
+    finally:
+        process.terminate()
+        process.wait()
+
+def main(args):
+    health_times, ready_times = [], []
+    for i in range(args.runs):
+        health, ready, report = run_once(args.ready_timeout)
+        health_times.append(health)
+        ready_times.append(ready)
+        print(f"run {i + 1}: first /health {health:.3f}s, /ready settled {ready:.3f}s")
+        if report:
+            print(f"  status={report['status']} startup={report['startup']}")
+            for name, component in report["components"].items():
+                print(f"  {name:<14} ready={component['ready']!s:<5} init={component['init_seconds']}s "
+                      f"error={component['error']}")
+    print(f"median first /health: {statistics.median(health_times):.3f}s")
+    print(f"median /ready settled: {statistics.median(ready_times):.3f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="服务启动耗时基准测试")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--ready-timeout", type=float, default=120.0)
+    main(parser.parse_args())
\ No newline at end of file
@@ -0,0 +1,75 @@
+"""
+上传保存内存基准测试：旧的整体读入 vs 分块流式写盘
+
+用法:
+    python benchmarks/bench_upload.py
+    python benchmarks/bench_upload.py --size-mb 150 --concurrency 4
+
+与Starlette一致，上传内容先落在磁盘上的临时文件中，再分别用两种方式保存到
+临时目录，用tracemalloc统计Python堆峰值内存。
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from fastapi import UploadFile
+
+from app.temp_files import TempFileManager
+
+def make_uploads(size: int, count: int):
+    """构造count个已落盘的上传文件"""
+    uploads = []
+    block = os.urandom(1024 * 1024)
+    for _ in range(count):
+        spooled = tempfile.TemporaryFile()
+        for _ in range(size // len(block)):
+            spooled.write(block)
+        spooled.seek(0)
+        uploads.append(UploadFile(spooled, size=size, filename="lecture.pptx"))
+    return uploads
+
+async def legacy_save(file: UploadFile, directory: str, file_id: str):
+    """旧实现：一次性读入内存再写盘"""
+    path = os.path.join(directory, f"{file_id}_{file.filename}")
+    with open(path, "wb") as f:
+        content = await file.read()
+        f.write(content)
+    os.remove(path)
+
+async def streaming_save(manager: TempFileManager, file: UploadFile, file_id: str):
+    path, _ = await manager.save(file, file_id)
+    manager.release(path)
+
+async def measure(label: str, coroutines):
+    tracemalloc.start()
+    started = time.perf_counter()
+    await asyncio.gather(*coroutines)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<10} {elapsed:>7.2f}s  peak {peak / 1024 ** 2:>8.1f} MiB")
+
+async def main(args):
+    size = args.size_mb * 1024 * 1024
+    with tempfile.TemporaryDirectory() as directory:
+        manager = TempFileManager(directory, max_upload_bytes=size * 2)
+        print(f"{args.concurrency} concurrent upload(s) of {args.size_mb} MiB")
+
+        uploads = make_uploads(size, args.concurrency)
+        await measure("legacy", [legacy_save(f, directory, f"legacy{i}") for i, f in enumerate(uploads)])
+
+        uploads = make_uploads(size, args.concurrency)
+        await measure("streaming", [streaming_save(manager, f, f"stream{i}") for i, f in enumerate(uploads)])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="上传保存内存基准测试")
+    parser.add_argument("--size-mb", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=2)
+    asyncio.run(main(parser.parse_args()))
\ No newline at end of file
@@ -0,0 +1,77 @@
+"""
+过滤检索基准测试：集合规模增长时，全集合检索与按ppt_id/course过滤检索的延迟
+
+用法:
+    python benchmarks/bench_vector_filter.py
+    python benchmarks/bench_vector_filter.py --sizes 100000 1000000 --deck-pages 40
+
+使用进程内后端（LocalVectorBackend）与随机向量，便于在没有Milvus的环境下复现；
+每份PPT deck-pages页，每门课程course-decks份PPT。
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.local_vector_backend import LocalVectorBackend
+
+def add_rows(store, start: int, end: int, args, rng):
+    """按PPT分批追加[start, end)行"""
+    for deck_start in range(start, end, args.deck_pages):
+        deck = deck_start // args.deck_pages
+        rows = min(args.deck_pages, end - deck_start)
+        course = f"course-{deck // args.course_decks}"
+        metadatas = [{"ppt_id": f"deck-{deck}", "page_num": i + 1, "title": "", "course": course} for i in range(rows)]
+        store.add_documents([""] * rows, rng.random((rows, args.dim), dtype=np.float32), metadatas)
+
+def time_ms(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+def run(args):
+    rng = np.random.default_rng(0)
+    queries = rng.random((args.queries, args.dim), dtype=np.float32)
+    print(f"{'rows':>9} {'decks':>7} {'full (ms)':>10} {'ivf (ms)':>9} {'ppt_id (ms)':>12} "
+          f"{'course (ms)':>12} {'delete deck (ms)':>17}")
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = LocalVectorBackend(data_dir=data_dir, dim=args.dim, use_ivf=False, compact_ratio=1.0)
+        count = 0
+        for size in args.sizes:
+            add_rows(store, count, size, args, rng)
+            count = size
+            decks = (size + args.deck_pages - 1) // args.deck_pages
+
+            def search(**filters):
+                for query in queries:
+                    store.search_similar(query, top_k=3, **filters)
+
+            full = time_ms(search, 1) / args.queries
+            deck = time_ms(lambda: search(ppt_id=f"deck-{decks // 2}"), 1) / args.queries
+            course = time_ms(lambda: search(course=f"course-{decks // 2 // args.course_decks}"), 1) / args.queries
+
+            # IVF：在同一数据上训练粗量化器后检索
+            store.use_ivf, store.ivf_min_rows = True, 0
+            store._maybe_train_ivf()
+            ivf = time_ms(search, 1) / args.queries
+            store.use_ivf = False
+            store._reset_ivf()
+
+            delete = time_ms(lambda: store.delete_by_ppt_id(f"deck-{decks - 1}"), 1)
+            print(f"{size:>9} {decks:>7} {full:>10.2f} {ivf:>9.2f} {deck:>12.3f} {course:>12.3f} {delete:>17.3f}")
+        store.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="向量过滤检索基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 300000])
+    parser.add_argument("--deck-pages", type=int, default=40, help="每份PPT的页数")
+    parser.add_argument("--course-decks", type=int, default=20, help="每门课程的PPT数")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--dim", type=int, default=384)
+    run(parser.parse_args())
\ No newline at end of file
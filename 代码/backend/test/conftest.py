@@ -6,7 +6,7 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 @pytest.fixture(autouse=True)
-def setup_test_env():
+def setup_test_env(tmp_path):
     """设置测试环境变量"""
     # 设置测试用的环境变量
     import os
@@ -14,4 +14,8 @@ def setup_test_env():
     os.environ['MILVUS_HOST'] = 'localhost'
     os.environ['REDIS_HOST'] = 'localhost'
     os.environ['POSTGRES_HOST'] = 'localhost'
+    os.environ['JOB_DB_PATH'] = str(tmp_path / 'jobs.db')
+    os.environ['RESULT_STORE_DIR'] = str(tmp_path / 'results')
+    os.environ['UPLOAD_FOLDER'] = str(tmp_path / 'uploads')
+    os.environ['IMAGE_STORE_DIR'] = str(tmp_path / 'images')
     yield
\ No newline at end of file
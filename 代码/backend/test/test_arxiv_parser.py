@@ -0,0 +1,60 @@
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.arxiv_parser import ArxivAtomParser, parse_arxiv_feed
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_data", "arxiv_neural_networks.xml")
+
+@pytest.fixture
+def feed_bytes():
+    with open(FIXTURE, "rb") as f:
+        return f.read()
+
+def test_parse_multiline_fields(feed_bytes):
+    """测试多行标题与摘要被完整解析"""
+    entries = parse_arxiv_feed(feed_bytes)
+
+    assert len(entries) == 3
+    assert entries[0]["title"] == "Deep Residual Learning for Image Recognition"
+    assert entries[2]["title"] == "Adam: A Method for Stochastic Optimization"
+    assert entries[0]["summary"].startswith("Deeper neural networks are more difficult to train. This entry")
+    assert "\n" not in entries[0]["summary"]
+    assert entries[0]["url"] == "http://arxiv.org/abs/1512.03385v1"
+    assert entries[0]["pdf_url"] == "http://arxiv.org/pdf/1512.03385v1"
+    assert entries[0]["authors"] == ["Kaiming He", "Xiangyu Zhang", "Shaoqing Ren"]
+    assert entries[1]["category"] == "cs.CL"
+    assert all(entry["source"] == "Arxiv" for entry in entries)
+
+def test_feed_title_is_not_an_entry(feed_bytes):
+    """测试feed自身的title不会被当作条目"""
+    titles = [entry["title"] for entry in parse_arxiv_feed(feed_bytes)]
+    assert not any(title.startswith("ArXiv Query") for title in titles)
+
+def test_entries_emitted_incrementally(feed_bytes):
+    """测试小块喂入时条目在结束标签到达后立即产出"""
+    parser = ArxivAtomParser()
+    emitted_at = []
+    for offset in range(0, len(feed_bytes), 64):
+        for entry in parser.feed(feed_bytes[offset:offset + 64]):
+            emitted_at.append((offset, entry["title"]))
+    assert parser.close() == []
+
+    assert len(emitted_at) == 3
+    first_entry_end = feed_bytes.index(b"</entry>") + len(b"</entry>") - 1
+    assert emitted_at[0][0] <= first_entry_end < emitted_at[0][0] + 64
+    assert emitted_at[0][0] < emitted_at[1][0] < emitted_at[2][0]
+
+def test_parsed_entries_released(feed_bytes):
+    """测试已产出的条目从树中移除"""
+    parser = ArxivAtomParser()
+    parser.feed(feed_bytes)
+    assert len(parser.root.findall("{http://www.w3.org/2005/Atom}entry")) == 0
+
+def test_summary_truncation(feed_bytes):
+    """测试摘要截断长度"""
+    parser = ArxivAtomParser(summary_chars=20)
+    entries = parser.feed(feed_bytes) + parser.close()
+    assert all(len(entry["summary"]) <= 23 for entry in entries)
\ No newline at end of file
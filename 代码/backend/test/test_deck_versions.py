@@ -0,0 +1,55 @@
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.deck_versions import plan_deck_version, slide_fingerprint
+
+def make_page(page_num, text, vector_id=None, images=()):
+    return {"page_num": page_num, "title": f"标题{text}", "text": text, "vector_id": vector_id,
+            "images": [{"id": image_id} for image_id in images], "extensions": {"extended_content": f"扩展{text}"}}
+
+def test_fingerprint_ignores_page_number():
+    """测试指纹由标题、正文与图片决定，与页码无关"""
+    image_id = "a" * 64
+    assert slide_fingerprint(make_page(1, "梯度")) == slide_fingerprint(make_page(7, "梯度"))
+    assert slide_fingerprint(make_page(1, "梯度")) != slide_fingerprint(make_page(1, "梯度", images=[image_id]))
+    # PDF延迟提取的图片ID含源文件哈希，按格式、尺寸与字节数比较
+    first = {"page_num": 1, "images": [{"id": f"{'b' * 64}-12", "format": "jpeg", "width": 4, "height": 3, "size": 99}]}
+    second = {"page_num": 1, "images": [{"id": f"{'c' * 64}-15", "format": "jpeg", "width": 4, "height": 3, "size": 99}]}
+    assert slide_fingerprint(first) == slide_fingerprint(second)
+
+def test_plan_reuses_unchanged_slides():
+    """测试只有修改、删除的页面需要重新处理，其向量被删除"""
+    previous = [make_page(1, "一", 11), make_page(2, "二", 12), make_page(3, "三", 13)]
+    pages = [make_page(1, "一"), make_page(2, "二（已修改）")]
+
+    plan = plan_deck_version(previous, pages)
+
+    assert set(plan["reused"]) == {1}
+    assert plan["reused"][1]["extensions"]["extended_content"] == "扩展一"
+    assert plan["vector_ids"] == {1: 11}
+    assert sorted(plan["stale_vector_ids"]) == [12, 13]
+
+def test_plan_moved_slide_keeps_extensions_but_not_vector():
+    """测试移动到其他页码的页面复用扩展，但向量元数据中的页码已过期，需要重新写入"""
+    previous = [make_page(1, "一", 11), make_page(2, "二", 12)]
+    pages = [make_page(1, "新插入"), make_page(2, "一"), make_page(3, "二")]
+
+    plan = plan_deck_version(previous, pages)
+
+    assert set(plan["reused"]) == {2, 3}
+    assert plan["vector_ids"] == {}
+    assert sorted(plan["stale_vector_ids"]) == [11, 12]
+
+def test_plan_options_changed_keeps_only_vectors():
+    """测试处理选项变化时不复用扩展，只保留未变化页面的向量"""
+    previous = [make_page(1, "一", 11), make_page(2, "二", 12)]
+    pages = [make_page(1, "一"), make_page(2, "二")]
+
+    plan = plan_deck_version(previous, pages, reuse_extensions=False)
+
+    assert plan["reused"] == {}
+    assert plan["vector_ids"] == {1: 11, 2: 12}
+    assert plan["stale_vector_ids"] == []
\ No newline at end of file
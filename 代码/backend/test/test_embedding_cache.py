@@ -0,0 +1,94 @@
+import pytest
+import sys
+import os
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.embedding_cache import EmbeddingCache
+
+class CountingEncoder:
+    """记录调用次数的模拟编码器"""
+    def __init__(self, dim=4):
+        self.dim = dim
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return np.array([[float(len(text))] * self.dim for text in texts], dtype=np.float32)
+
+def test_cache_hit_and_miss():
+    """测试命中与未命中计数"""
+    cache = EmbeddingCache("test-model", dim=4)
+    encoder = CountingEncoder()
+
+    first = cache.encode(["Agenda", "Thank you"], encoder)
+    second = cache.encode(["Agenda"], encoder)
+
+    assert first.shape == (2, 4)
+    assert np.allclose(second[0], first[0])
+    assert len(encoder.calls) == 1
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["memory_hits"] == 1
+
+def test_cache_deduplicates_within_batch():
+    """测试同一批次内重复文本只编码一次"""
+    cache = EmbeddingCache("test-model", dim=4)
+    encoder = CountingEncoder()
+
+    result = cache.encode(["Questions?", "Intro", "Questions?"], encoder)
+
+    assert result.shape == (3, 4)
+    assert encoder.calls == [["Questions?", "Intro"]]
+    assert np.allclose(result[0], result[2])
+
+def test_cache_key_includes_model_name():
+    """测试不同模型的缓存键不同"""
+    assert EmbeddingCache("model-a").make_key("x") != EmbeddingCache("model-b").make_key("x")
+
+def test_memory_lru_eviction():
+    """测试内存层LRU淘汰"""
+    cache = EmbeddingCache("test-model", dim=4, max_memory_entries=2)
+    encoder = CountingEncoder()
+
+    cache.encode(["a"], encoder)
+    cache.encode(["b"], encoder)
+    cache.encode(["a"], encoder)  # a变为最近使用
+    cache.encode(["c"], encoder)  # 淘汰b
+
+    assert cache.make_key("a") in cache.memory
+    assert cache.make_key("b") not in cache.memory
+    assert cache.stats()["memory_entries"] == 2
+
+def test_disk_tier_persists_across_instances(tmp_path):
+    """测试磁盘层在重新打开后仍可命中"""
+    encoder = CountingEncoder()
+    cache = EmbeddingCache("test-model", dim=4, disk_dir=str(tmp_path))
+    original = cache.encode(["Neural Networks", "Agenda"], encoder)
+    cache.close()
+
+    reopened = EmbeddingCache("test-model", dim=4, disk_dir=str(tmp_path))
+    result = reopened.encode(["Agenda", "Neural Networks"], encoder)
+
+    assert len(encoder.calls) == 1
+    assert np.allclose(result[0], original[1])
+    assert reopened.stats()["disk_hits"] == 2
+    assert reopened.stats()["disk_entries"] == 2
+    reopened.close()
+
+def test_disk_tier_grows(tmp_path):
+    """测试磁盘矩阵超过初始容量时自动扩容"""
+    from app.embedding_cache import _DiskTier
+
+    tier = _DiskTier(str(tmp_path), dim=2)
+    count = _DiskTier.GROWTH_ROWS + 5
+    for i in range(count):
+        tier.put(f"k{i}", np.array([i, i], dtype=np.float32))
+
+    assert len(tier) == count
+    assert np.allclose(tier.get(f"k{count - 1}"), [count - 1, count - 1])
+    tier.close()
\ No newline at end of file
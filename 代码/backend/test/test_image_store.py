@@ -0,0 +1,99 @@
+import pytest
+import sys
+import os
+import io
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.image_store import DeckImages, ImageStore, summarize_images
+
+def make_image(size=(400, 200), color=(200, 30, 30), image_format="JPEG"):
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color=color).save(buffer, format=image_format)
+    return buffer.getvalue()
+
+def test_put_keeps_original_bytes_once(tmp_path):
+    """测试按内容哈希保存原始编码，重复图片只存一份"""
+    store = ImageStore(str(tmp_path))
+    blob = make_image()
+    
+    first = store.put(blob)
+    second = store.put(blob)
+    
+    assert first == second
+    assert first["format"] == "jpeg"
+    assert (first["width"], first["height"], first["size"]) == (400, 200, len(blob))
+    assert first["url"] == f"/api/images/{first['id']}"
+    with open(store.get_path(first["id"]), "rb") as f:
+        assert f.read() == blob  # 不重新编码为PNG
+    assert store.usage()["images"] == 1
+    assert store.usage()["bytes"] == len(blob)
+
+def test_put_skips_unknown_formats(tmp_path):
+    """测试无法识别的图片被跳过"""
+    store = ImageStore(str(tmp_path))
+    assert store.put(b"not an image") is None
+    assert store.usage()["images"] == 0
+
+def test_get_path_rejects_invalid_ids(tmp_path):
+    """测试非法或不存在的图片ID"""
+    store = ImageStore(str(tmp_path))
+    assert store.get_path("../index.db") is None
+    assert store.get_path("0" * 64) is None
+
+def test_thumbnail_is_generated_once(tmp_path):
+    """测试缩略图按档位生成并缓存，小图直接返回原图"""
+    from PIL import Image
+    
+    store = ImageStore(str(tmp_path))
+    image_id = store.put(make_image())["id"]
+    
+    assert ImageStore.thumbnail_size(100) == 128
+    assert ImageStore.thumbnail_size(5000) is None
+    path = store.get_thumbnail(image_id, 128)
+    with Image.open(path) as thumb:
+        assert max(thumb.size) == 128
+        assert thumb.format == "JPEG"
+    assert store.get_thumbnail(image_id, 128) == path
+    assert store.get_thumbnail(image_id, 512) == store.get_path(image_id)
+    assert store.stats()["thumbnails_generated"] == 1
+    assert store.stats()["thumbnail_hits"] == 1
+    
+    logo_id = store.put(make_image(image_format="PNG", size=(300, 300)))["id"]
+    assert store.get_thumbnail(logo_id, 64).endswith(".jpg")
+
+def test_deck_images_dedupe_by_content(tmp_path):
+    """测试同一份PPT中内容相同的图片只写入一次，统计去重省下的字节"""
+    store = ImageStore(str(tmp_path))
+    images = DeckImages(store)
+    logo, photo = make_image(color=(0, 0, 255)), make_image(color=(0, 255, 0))
+    
+    pages = [{"images": [images.put(logo)]}, {"images": [images.put(logo), images.put(photo)]}, {"images": []}]
+    pages[1]["images"][0]["index"] = 0  # 返回的是副本，修改不影响其他页面
+    
+    assert "index" not in pages[0]["images"][0]
+    assert images.put(b"broken") is None
+    stats = summarize_images(pages)
+    assert stats == {"total": 3, "unique": 2, "bytes_total": 2 * len(logo) + len(photo), "bytes_saved": len(logo)}
+    
+    store.record_deck(stats)
+    assert store.stats()["deck_bytes_saved"] == len(logo)
+    assert store.stats()["deck_unique_images"] == 2
+def test_sources_are_evicted_over_quota(tmp_path):
+    """测试源文件超过配额时从最久未用的开始回收，刚登记的源文件保留"""
+    store = ImageStore(str(tmp_path / "images"), source_quota_bytes=250)
+    sources = []
+    for i in range(3):
+        path = tmp_path / f"deck{i}.pdf"
+        path.write_bytes(bytes([i]) * 100)
+        sources.append(store.put_source(str(path)))
+        os.utime(store._source_path(sources[-1]), (time.time() - 100 + i,) * 2)
+    
+    assert not os.path.exists(store._source_path(sources[0]))
+    assert all(os.path.exists(store._source_path(source_id)) for source_id in sources[1:])
+    assert store.stats()["sources_removed"] == 1
+    
+    expired = ImageStore(str(tmp_path / "images"), source_max_age=60)
+    assert expired.cleanup_sources()["removed"] == 2
\ No newline at end of file
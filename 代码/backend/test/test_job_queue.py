@@ -0,0 +1,134 @@
+import pytest
+import sys
+import os
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.job_queue import JobQueue, JobStore
+
+@pytest.fixture
+def store(tmp_path):
+    job_store = JobStore(str(tmp_path / "jobs.db"))
+    yield job_store
+
+def test_store_roundtrip(store):
+    """测试任务字段与页面结果的持久化"""
+    store.create("p1", "deck.pptx", "temp/p1_deck.pptx", content_hash="abc")
+    store.update("p1", status="extending", total_pages=3, vector_ids={1: 10, 3: 12},
+                 stage_timings={"parse": 0.5})
+    store.save_page("p1", 3, {"page_num": 3, "title": "C"})
+    store.save_page("p1", 1, {"page_num": 1, "title": "A"})
+
+    job = store.get("p1")
+    assert job["status"] == "extending"
+    assert job["vector_ids"] == {1: 10, 3: 12}
+    assert job["stage_timings"] == {"parse": 0.5}
+    assert job["completed_pages"] == 2
+    assert job["content_hash"] == "abc"
+    assert list(store.completed_pages("p1")) == [1, 3]
+    assert store.get("missing") is None
+    store.close()
+
+def test_store_keeps_options_and_migrates_old_schema(tmp_path):
+    """测试任务保存处理选项，旧版本任务库打开时补充options列"""
+    import sqlite3
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE jobs (ppt_id TEXT PRIMARY KEY, filename TEXT NOT NULL, file_path TEXT NOT NULL, "
+        "content_hash TEXT, status TEXT NOT NULL, total_pages INTEGER, completed_pages INTEGER NOT NULL DEFAULT 0, "
+        "stage_timings TEXT NOT NULL DEFAULT '{}', vector_ids TEXT, error TEXT, "
+        "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+    )
+    conn.execute("INSERT INTO jobs (ppt_id, filename, file_path, status, created_at, updated_at) "
+                 "VALUES ('old', 'deck.pptx', 'x', 'queued', 0, 0)")
+    conn.commit()
+    conn.close()
+
+    store = JobStore(path)
+    store.create("p1", "deck.pptx", "x", options={"extension_depth": "simple", "include_sources": ["arxiv"]})
+
+    assert store.get("old")["options"] is None
+    assert store.get("p1")["options"] == {"extension_depth": "simple", "include_sources": ["arxiv"]}
+    store.close()
+
+@pytest.mark.asyncio
+async def test_worker_pool_is_bounded(store):
+    """测试同时运行的任务数不超过worker数"""
+    active, peak = 0, 0
+
+    async def handler(ppt_id):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        store.update(ppt_id, status="done")
+
+    queue = JobQueue(store, handler, workers=2)
+    await queue.start()
+    for i in range(6):
+        queue.submit(f"p{i}", "deck.pptx", "x")
+    await queue.queue.join()
+
+    assert peak == 2
+    assert queue.stats()["finished"] == 6
+    assert store.unfinished() == []
+    await queue.close()
+
+@pytest.mark.asyncio
+async def test_handler_error_marks_failed(store):
+    """测试处理异常时任务标记为failed"""
+    async def handler(ppt_id):
+        raise RuntimeError("parse error")
+
+    queue = JobQueue(store, handler, workers=1)
+    await queue.start()
+    queue.submit("p1", "deck.pptx", "x")
+    await queue.queue.join()
+
+    job = store.get("p1")
+    assert job["status"] == "failed"
+    assert job["error"] == "parse error"
+    await queue.close()
+
+@pytest.mark.asyncio
+async def test_resume_after_restart(tmp_path):
+    """测试worker中断后重启，从最后完成的页面继续"""
+    path = str(tmp_path / "jobs.db")
+    processed = []
+    first_page_saved = asyncio.Event()
+
+    def make_handler(job_store):
+        async def handler(ppt_id):
+            job_store.update(ppt_id, status="extending", total_pages=3)
+            done = job_store.completed_pages(ppt_id)
+            for page_num in (1, 2, 3):
+                if page_num in done:
+                    continue
+                processed.append(page_num)
+                job_store.save_page(ppt_id, page_num, {"page_num": page_num})
+                first_page_saved.set()
+                await asyncio.sleep(0.05)
+            job_store.update(ppt_id, status="done")
+        return handler
+
+    store = JobStore(path)
+    queue = JobQueue(store, make_handler(store), workers=1)
+    await queue.start()
+    queue.submit("p1", "deck.pptx", "x")
+    await first_page_saved.wait()
+    await queue.close()  # 模拟进程退出
+    assert processed == [1]
+
+    restarted_store = JobStore(path)
+    assert restarted_store.unfinished() == ["p1"]
+    restarted = JobQueue(restarted_store, make_handler(restarted_store), workers=1)
+    await restarted.start()
+    await restarted.queue.join()
+
+    assert processed == [1, 2, 3]
+    assert restarted_store.get("p1")["status"] == "done"
+    assert restarted_store.get("p1")["completed_pages"] == 3
+    await restarted.close()
\ No newline at end of file
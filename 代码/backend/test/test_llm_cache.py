@@ -0,0 +1,135 @@
+import pytest
+import sys
+import os
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.cache_backends import SQLiteCacheBackend
+from app.llm_cache import LLMCache
+from app.llm_client import LLMClient
+
+def make_response(content, total_tokens=120):
+    response = MagicMock()
+    response.choices[0].message.content = content
+    response.usage.total_tokens = total_tokens
+    return response
+
+def test_key_depends_on_all_parts():
+    """测试缓存键区分模型、模板、温度与Prompt"""
+    messages = [{"role": "user", "content": "神经网络"}]
+    key = LLMCache.make_key("gpt-4", "default", 0.7, messages)
+    assert key == LLMCache.make_key("gpt-4", "default", 0.7, [{"role": "user", "content": "神经网络"}])
+    assert key != LLMCache.make_key("gpt-3.5", "default", 0.7, messages)
+    assert key != LLMCache.make_key("gpt-4", "simple", 0.7, messages)
+    assert key != LLMCache.make_key("gpt-4", "default", 0.5, messages)
+    assert key != LLMCache.make_key("gpt-4", "default", 0.7, [{"role": "user", "content": "卷积"}])
+
+def test_cached_values_are_copies():
+    """测试调用方修改结果不会影响缓存"""
+    cache = LLMCache()
+    cache.set("k", {"sections": ["A"]}, tokens=10, seconds=0.5)
+    first = cache.get("k")
+    first["sections"].append("B")
+    assert cache.get("k") == {"sections": ["A"]}
+    assert cache.stats()["tokens_saved"] == 20
+
+@pytest.mark.asyncio
+async def test_extend_knowledge_hit_skips_api():
+    """测试相同片段重复扩展时命中缓存并统计节省量"""
+    with patch('app.llm_client.AsyncOpenAI') as mock_openai:
+        create = AsyncMock(return_value=make_response('{"extended_content": "RNN", "sections": ["背景"]}'))
+        mock_openai.return_value.chat.completions.create = create
+
+        client = LLMClient(cache=LLMCache())
+        first = await client.extend_knowledge("循环神经网络")
+        second = await client.extend_knowledge("循环神经网络")
+        other_template = await client.extend_knowledge("循环神经网络", template_type="simple")
+
+        assert create.await_count == 2
+        assert first["cached"] is False
+        assert second["cached"] is True
+        assert second["extended_content"] == "RNN"
+        assert other_template["cached"] is False
+
+        stats = client.cache_stats()
+        assert stats["hits"] == 1
+        assert stats["tokens_saved"] == 120
+        assert stats["seconds_saved"] >= 0
+
+@pytest.mark.asyncio
+async def test_fallback_is_not_cached():
+    """测试降级结果不写入缓存，服务恢复后重新请求"""
+    with patch('app.llm_client.AsyncOpenAI') as mock_openai:
+        create = AsyncMock(side_effect=Exception("API Error"))
+        mock_openai.return_value.chat.completions.create = create
+
+        client = LLMClient(cache=LLMCache())
+        result = await client.extend_knowledge("Test content")
+        assert result["fallback"] is True
+        assert client.cache_stats()["entries"] == 0
+
+        create.side_effect = None
+        create.return_value = make_response('{"extended_content": "ok"}')
+        result = await client.extend_knowledge("Test content")
+        assert result["extended_content"] == "ok"
+        assert result["cached"] is False
+
+@pytest.mark.asyncio
+async def test_non_object_responses_are_not_cached():
+    """测试JSON不是对象（或批量响应中没有任何页面）时走降级结果，且不写入缓存"""
+    with patch('app.llm_client.AsyncOpenAI') as mock_openai:
+        create = AsyncMock(return_value=make_response('["not", "an", "object"]'))
+        mock_openai.return_value.chat.completions.create = create
+
+        client = LLMClient(cache=LLMCache(), batch_pages=2)
+        assert (await client.extend_knowledge("Test content"))["fallback"] is True
+        assert client.cache_stats()["entries"] == 0
+
+        create.return_value = make_response('{"unrelated": 1}')
+        results = await client.extend_knowledge_batch(
+            [{"page_num": 1, "content": "第一页"}, {"page_num": 2, "content": "第二页"}])
+        # 批量响应无效，两页逐页回退；逐页得到的是JSON对象，各自写入缓存
+        assert set(results) == {1, 2}
+        assert client.cache_stats()["entries"] == 2
+
+@pytest.mark.asyncio
+async def test_questions_and_fact_checks_cached():
+    """测试出题与事实核查同样使用缓存，解析失败的响应不缓存"""
+    with patch('app.llm_client.AsyncOpenAI') as mock_openai:
+        create = AsyncMock(return_value=make_response('not json'))
+        mock_openai.return_value.chat.completions.create = create
+        client = LLMClient(cache=LLMCache())
+
+        assert "error" in (await client.generate_questions("梯度下降"))[0]
+
+        create.return_value = make_response('{"questions": [{"question": "Q1"}]}')
+        assert await client.generate_questions("梯度下降") == [{"question": "Q1"}]
+        assert await client.generate_questions("梯度下降") == [{"question": "Q1"}]
+        assert create.await_count == 2
+
+        create.return_value = make_response('{"checks": []}')
+        assert await client.check_facts(["地球是圆的"]) == {"checks": []}
+        assert await client.check_facts(["地球是圆的"]) == {"checks": []}
+        assert create.await_count == 3
+
+@pytest.mark.asyncio
+async def test_sqlite_cache_survives_restart(tmp_path):
+    """测试SQLite后端在客户端重建后仍然命中，读写在线程中执行"""
+    path = str(tmp_path / "llm_cache.db")
+    with patch('app.llm_client.AsyncOpenAI') as mock_openai, \
+            patch("app.cache_backends.asyncio.to_thread", wraps=asyncio.to_thread) as to_thread:
+        create = AsyncMock(return_value=make_response('{"extended_content": "CNN"}'))
+        mock_openai.return_value.chat.completions.create = create
+
+        client = LLMClient(cache=LLMCache(SQLiteCacheBackend(path, table="llm_cache")))
+        await client.extend_knowledge("卷积神经网络")
+        client.close()
+
+        restarted = LLMClient(cache=LLMCache(SQLiteCacheBackend(path, table="llm_cache")))
+        result = await restarted.extend_knowledge("卷积神经网络")
+        assert result["cached"] is True
+        assert create.await_count == 1
+        assert to_thread.call_count == 3  # 未命中读取、写入、命中读取
+        restarted.close()
\ No newline at end of file
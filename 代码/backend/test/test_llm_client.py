@@ -5,7 +5,13 @@ from unittest.mock import AsyncMock, patch
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.llm_client import LLMClient
+import asyncio
+import json
+import re
+from unittest.mock import MagicMock
+
+from app.llm_cache import LLMCache
+from app.llm_client import ExtensionBatcher, LLMClient
 
 @pytest.fixture
 def llm_client():
@@ -66,4 +72,65 @@ def test_prompt_templates():
     template = client.extension_templates["default"]
     formatted = template.format(title="Test", content="Content")
     assert "Test" in formatted
-    assert "Content" in formatted
\ No newline at end of file
+    assert "Content" in formatted
+
+def make_response(content):
+    response = MagicMock()
+    response.choices[0].message.content = content
+    response.usage.total_tokens = 100
+    return response
+
+def test_plan_batches_respects_page_and_token_limits():
+    """测试连续页面按页数上限与token预算分组，超长页面单独成组"""
+    client = LLMClient(cache=LLMCache(), batch_pages=3, batch_tokens=2100)
+    pages = [(page_num, "要点" * 20) for page_num in range(1, 8)]
+    pages[4] = (5, "长" * 5000)
+    
+    assert client.plan_batches(pages) == [[1, 2, 3], [4], [5], [6, 7]]
+
+@pytest.mark.asyncio
+async def test_extend_knowledge_batch_splits_by_page():
+    """测试批量扩展按页码拆分结果，缺失的页面回退为单页请求"""
+    prompts = []
+    
+    async def create(**kwargs):
+        prompt = kwargs["messages"][-1]["content"]
+        prompts.append(prompt)
+        if "【第" in prompt:
+            # 批量响应漏掉了第3页
+            return make_response(json.dumps({"1": {"extended_content": "扩展一"}, "2": {"extended_content": "扩展二"}}))
+        return make_response('{"extended_content": "单页扩展"}')
+    
+    with patch('app.llm_client.AsyncOpenAI') as mock_openai:
+        mock_openai.return_value.chat.completions.create = create
+        client = LLMClient(cache=LLMCache(), batch_pages=4)
+        results = await client.extend_knowledge_batch(
+            [{"page_num": i, "content": f"内容{i}", "context": [{"content": "相邻页"}]} for i in (1, 2, 3)])
+    
+    assert results[1]["extended_content"] == "扩展一"
+    assert results[2]["batch_size"] == 3
+    assert results[3]["extended_content"] == "单页扩展"
+    assert len(prompts) == 2
+    assert re.findall(r"【第(\d+)页】", prompts[0]) == ["1", "2", "3"]
+    assert client.batch_stats()["batched_pages"] == 2
+    assert client.batch_stats()["fallback_pages"] == 1
+
+@pytest.mark.asyncio
+async def test_batcher_waits_for_group_and_skips_discarded_pages():
+    """测试批量扩展器在组内页面到齐后发出一次请求，失败的页面不阻塞同组页面"""
+    client = LLMClient(cache=LLMCache(), batch_pages=3)
+    client.extend_knowledge_batch = AsyncMock(side_effect=lambda items, *args: {
+        item["page_num"]: {"extended_content": item["content"]} for item in items})
+    pages = [{"page_num": i, "text": f"内容{i}"} for i in (1, 2, 3)]
+    batcher = ExtensionBatcher(client, pages)
+    
+    first = asyncio.create_task(batcher.extend(1, "内容1"))
+    third = asyncio.create_task(batcher.extend(3, "内容3"))
+    await asyncio.sleep(0)
+    assert client.extend_knowledge_batch.await_count == 0
+    batcher.discard(2)
+    
+    assert (await first)["extended_content"] == "内容1"
+    assert (await third)["extended_content"] == "内容3"
+    client.extend_knowledge_batch.assert_awaited_once()
+    assert [item["page_num"] for item in client.extend_knowledge_batch.await_args.args[0]] == [1, 3]
\ No newline at end of file
@@ -0,0 +1,211 @@
+import pytest
+import sys
+import os
+
+import numpy as np
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.local_vector_backend import LocalVectorBackend
+
+DIM = 8
+
+@pytest.fixture
+def backend(tmp_path):
+    store = LocalVectorBackend(data_dir=str(tmp_path), dim=DIM, use_ivf=False)
+    yield store
+    store.close()
+
+def make_vectors(count, seed=0):
+    return np.random.default_rng(seed).random((count, DIM), dtype=np.float32)
+
+def add_deck(store, ppt_id, vectors):
+    texts = [f"{ppt_id} page {i}" for i in range(len(vectors))]
+    metadatas = [{"ppt_id": ppt_id, "page_num": i + 1, "title": f"T{i}"} for i in range(len(vectors))]
+    return store.add_documents(texts, vectors, metadatas)
+
+def test_add_and_exact_search(backend):
+    """测试写入后精确检索返回最近的向量"""
+    vectors = make_vectors(50)
+    ids = add_deck(backend, "deck-a", vectors)
+
+    assert len(ids) == 50
+    assert len(set(ids)) == 50
+
+    results = backend.search_similar(vectors[7], top_k=3)
+    assert len(results) == 3
+    assert results[0]["id"] == ids[7]
+    assert results[0]["score"] == pytest.approx(0.0, abs=1e-5)
+    assert results[0]["page_num"] == 8
+    assert results[0]["metadata"]["ppt_id"] == "deck-a"
+    assert results[0]["score"] <= results[1]["score"] <= results[2]["score"]
+
+def test_get_by_id(backend):
+    """测试按ID获取"""
+    ids = add_deck(backend, "deck-a", make_vectors(3))
+    doc = backend.get_by_id(ids[1])
+    assert doc["content"] == "deck-a page 1"
+    assert backend.get_by_id(9999) is None
+
+def test_tombstone_delete(backend):
+    """测试墓碑删除后不再被检索到"""
+    vectors_a = make_vectors(10, seed=1)
+    vectors_b = make_vectors(10, seed=2)
+    ids_a = add_deck(backend, "deck-a", vectors_a)
+    add_deck(backend, "deck-b", vectors_b)
+
+    backend.compact_ratio = 1.0  # 禁止自动压缩
+    backend.delete_by_ppt_id("deck-a")
+
+    results = backend.search_similar(vectors_a[0], top_k=20)
+    assert len(results) == 10
+    assert all(r["metadata"]["ppt_id"] == "deck-b" for r in results)
+    assert backend.get_by_id(ids_a[0]) is None
+    assert backend.tombstone_ratio() == pytest.approx(0.5)
+
+def test_delete_by_ids(backend):
+    """测试按ID删除单页向量，同一PPT的其他页面不受影响"""
+    vectors = make_vectors(5, seed=3)
+    ids = add_deck(backend, "deck-a", vectors)
+
+    backend.compact_ratio = 1.0
+    backend.delete_by_ids([ids[1], ids[3], 9999])
+
+    assert backend.get_by_id(ids[1]) is None
+    assert backend.get_by_id(ids[0])["content"] == "deck-a page 0"
+    results = backend.search_similar(vectors[1], top_k=5)
+    assert {result["id"] for result in results} == {ids[0], ids[2], ids[4]}
+
+def test_persistence_across_reopen(tmp_path):
+    """测试重新打开后数据与墓碑仍然有效"""
+    store = LocalVectorBackend(data_dir=str(tmp_path), dim=DIM, use_ivf=False, compact_ratio=1.0)
+    vectors = make_vectors(5)
+    ids = add_deck(store, "deck-a", vectors)
+    add_deck(store, "deck-b", make_vectors(5, seed=3))
+    store.delete_by_ppt_id("deck-b")
+    store.close()
+
+    reopened = LocalVectorBackend(data_dir=str(tmp_path), dim=DIM, use_ivf=False)
+    results = reopened.search_similar(vectors[2], top_k=10)
+    assert [r["metadata"]["ppt_id"] for r in results] == ["deck-a"] * 5
+    assert results[0]["id"] == ids[2]
+
+    new_ids = add_deck(reopened, "deck-c", make_vectors(1, seed=4))
+    assert new_ids[0] > max(ids)
+    reopened.close()
+
+def test_compaction_removes_tombstones(tmp_path):
+    """测试压缩后物理删除墓碑行并切换到新一代文件"""
+    store = LocalVectorBackend(data_dir=str(tmp_path), dim=DIM, use_ivf=False, compact_ratio=1.0)
+    vectors = make_vectors(20)
+    ids = add_deck(store, "deck-a", vectors[:10])
+    ids_b = add_deck(store, "deck-b", vectors[10:])
+    store.delete_by_ppt_id("deck-a")
+
+    store.compact()
+
+    stats = store.stats()
+    assert stats["rows"] == 10
+    assert stats["tombstone_ratio"] == 0.0
+    assert stats["generation"] == 1
+    assert not os.path.exists(os.path.join(str(tmp_path), "gen-0"))
+    assert store.search_similar(vectors[15], top_k=1)[0]["id"] == ids_b[5]
+    assert store.get_by_id(ids[0]) is None
+    store.close()
+
+def test_ids_not_reused_after_compaction(tmp_path):
+    """测试压缩删除了持有最大ID的行后，重新打开时不会复用这些ID"""
+    store = LocalVectorBackend(data_dir=str(tmp_path), dim=DIM, use_ivf=False, compact_ratio=1.0)
+    ids = add_deck(store, "deck-a", make_vectors(4))
+    store.delete_by_ids(ids[2:])
+    store.compact()
+    store.close()
+
+    reopened = LocalVectorBackend(data_dir=str(tmp_path), dim=DIM, use_ivf=False)
+    new_ids = add_deck(reopened, "deck-b", make_vectors(1, seed=7))
+    assert new_ids[0] > max(ids)
+    reopened.close()
+
+def test_compaction_copies_from_snapshot_while_store_grows(tmp_path):
+    """测试复制阶段并发写入触发扩容（重新映射向量文件）时，压缩仍从加锁时的映射复制"""
+    store = LocalVectorBackend(data_dir=str(tmp_path), dim=DIM, use_ivf=False, compact_ratio=1.0)
+    vectors = make_vectors(12)
+    ids = add_deck(store, "deck-a", vectors[:10])
+    store.delete_by_ids(ids[:2])
+    write_generation = LocalVectorBackend._write_generation
+    
+    def write_during_growth(gen_dir, rows, mapped, records, append=False):
+        if not append:
+            old_mapping = store.vectors
+            add_deck(store, "deck-b", np.repeat(vectors[10:], store.GROWTH_ROWS, axis=0))
+            assert store.vectors is not old_mapping and mapped is old_mapping
+        write_generation(gen_dir, rows, mapped, records, append)
+    
+    with patch.object(LocalVectorBackend, "_write_generation", staticmethod(write_during_growth)):
+        store.compact()
+    
+    assert store.stats()["rows"] == 8 + 2 * store.GROWTH_ROWS
+    assert store.search_similar(vectors[5], top_k=1)[0]["id"] == ids[5]
+    assert store.search_similar(vectors[11], top_k=1)[0]["metadata"]["ppt_id"] == "deck-b"
+    store.close()
+
+def test_background_compaction_triggered(tmp_path):
+    """测试墓碑比例超过阈值时触发后台压缩"""
+    store = LocalVectorBackend(data_dir=str(tmp_path), dim=DIM, use_ivf=False, compact_ratio=0.3)
+    add_deck(store, "deck-a", make_vectors(10))
+    add_deck(store, "deck-b", make_vectors(10, seed=5))
+
+    store.delete_by_ppt_id("deck-a")
+    store.compaction_thread.join(timeout=10)
+
+    assert store.stats()["rows"] == 10
+    store.close()
+
+def test_ivf_search_finds_nearest(tmp_path):
+    """测试IVF粗量化检索能找到查询向量本身"""
+    store = LocalVectorBackend(data_dir=str(tmp_path), dim=DIM, use_ivf=True,
+                               ivf_min_rows=500, nlist=8, nprobe=3)
+    vectors = make_vectors(1000)
+    ids = add_deck(store, "deck-a", vectors)
+
+    results = store.search_similar(vectors[123], top_k=5)
+    assert store.stats()["ivf_trained"]
+    assert results[0]["id"] == ids[123]
+
+    # 训练后新写入的行也会被分配到簇
+    new_ids = add_deck(store, "deck-b", make_vectors(1, seed=9))
+    assert store.search_similar(make_vectors(1, seed=9)[0], top_k=1)[0]["id"] == new_ids[0]
+    store.close()
+
+def test_filtered_search(tmp_path):
+    """测试按ppt_id/course过滤检索：只返回匹配的行，IVF训练后仍精确检索过滤后的行"""
+    store = LocalVectorBackend(data_dir=str(tmp_path), dim=DIM, use_ivf=True,
+                               ivf_min_rows=100, nlist=8, nprobe=1, compact_ratio=1.0)
+    vectors = make_vectors(300)
+    for i, ppt_id in enumerate(("deck-a", "deck-b", "deck-c")):
+        texts = [f"{ppt_id} page {j}" for j in range(100)]
+        course = "ml" if ppt_id != "deck-c" else "db"
+        metadatas = [{"ppt_id": ppt_id, "page_num": j + 1, "title": "", "course": course} for j in range(100)]
+        store.add_documents(texts, vectors[i * 100:(i + 1) * 100], metadatas)
+
+    # 查询向量来自deck-c，按deck-b过滤时只返回deck-b的行
+    results = store.search_similar(vectors[250], top_k=5, ppt_id="deck-b")
+    assert len(results) == 5
+    assert all(r["metadata"]["ppt_id"] == "deck-b" for r in results)
+    exact = np.argsort(((vectors[100:200] - vectors[250]) ** 2).sum(axis=1))[:5]
+    assert [r["page_num"] for r in results] == [int(row) + 1 for row in exact]
+
+    assert {r["metadata"]["ppt_id"] for r in store.search_similar(vectors[0], top_k=300, course="ml")} \
+        == {"deck-a", "deck-b"}
+    assert store.search_similar(vectors[0], top_k=5, ppt_id="deck-a", course="db") == []
+    assert store.search_similar(vectors[0], top_k=5, ppt_id="missing") == []
+
+    # 删除后的行不再出现在过滤结果中，重新打开后索引从记录重建
+    store.delete_by_ppt_id("deck-b")
+    assert store.search_similar(vectors[150], top_k=5, ppt_id="deck-b") == []
+    store.close()
+    reopened = LocalVectorBackend(data_dir=str(tmp_path), dim=DIM, use_ivf=False)
+    assert len(reopened.search_similar(vectors[0], top_k=300, course="ml")) == 100
+    assert reopened.stats()["decks"] == 2
+    reopened.close()
\ No newline at end of file
@@ -2,14 +2,33 @@ import pytest
 from fastapi.testclient import TestClient
 import sys
 import os
+import time
+import json
+import asyncio
 
 # 添加项目根目录到Python路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from unittest.mock import AsyncMock, MagicMock, call, patch
+
+import app.main as main_module
 from app.main import app
+from app.image_store import ImageStore
 
 client = TestClient(app)
 
+@pytest.fixture
+def fake_components():
+    """用轻量对象替换组件工厂，测试结束后恢复未就绪状态"""
+    fakes = {name: MagicMock(name=name) for name in main_module.COMPONENT_FACTORIES}
+    fakes["search_client"] = AsyncMock(name="search_client")
+    factories = {name: (lambda fake=fake: fake) for name, fake in fakes.items()}
+    with patch.dict(main_module.COMPONENT_FACTORIES, factories):
+        yield fakes
+    for name, status in main_module.component_status.items():
+        status.update({"ready": False, "error": None, "init_seconds": None})
+        setattr(main_module, name, None)
+
 def test_health_check():
     """测试健康检查端点"""
     response = client.get("/health")
@@ -44,4 +63,591 @@ def test_cors_headers():
         "Access-Control-Request-Method": "GET"
     })
     # OPTIONS请求应该返回200或204，并且包含CORS头
-    assert response.status_code in [200, 204]
\ No newline at end of file
+    assert response.status_code in [200, 204]
+
+def test_ready_before_startup():
+    """测试组件未初始化时就绪探针返回503"""
+    response = client.get("/ready")
+    assert response.status_code == 503
+    data = response.json()
+    assert data["status"] == "starting"
+    assert set(data["components"]) == {"ppt_parser", "vector_store", "llm_client", "search_client"}
+
+def test_semantic_search_not_ready():
+    """测试组件未就绪时业务端点返回503"""
+    response = client.get("/api/search/semantic", params={"query": "test"})
+    assert response.status_code == 503
+
+def test_lifespan_initializes_components(fake_components):
+    """测试lifespan在后台初始化全部组件"""
+    with TestClient(app) as lifespan_client:
+        assert lifespan_client.get("/health").status_code == 200
+        
+        for _ in range(100):
+            response = lifespan_client.get("/ready")
+            if response.status_code == 200:
+                break
+            time.sleep(0.01)
+        
+        data = response.json()
+        assert response.status_code == 200
+        assert data["status"] == "ready"
+        assert all(c["ready"] for c in data["components"].values())
+        assert data["startup"]["first_health_seconds"] is not None
+        assert main_module.vector_store is fake_components["vector_store"]
+    
+    fake_components["vector_store"].close.assert_called_once()
+    fake_components["search_client"].start.assert_awaited_once()
+    fake_components["search_client"].close.assert_awaited_once()
+
+def test_component_failure_reported(fake_components):
+    """测试组件初始化失败时报告degraded且不影响存活探针"""
+    def broken():
+        raise RuntimeError("milvus unreachable")
+    
+    with patch.dict(main_module.COMPONENT_FACTORIES, {"vector_store": broken}):
+        with TestClient(app) as lifespan_client:
+            for _ in range(100):
+                data = lifespan_client.get("/ready").json()
+                if data["status"] != "starting":
+                    break
+                time.sleep(0.01)
+            
+            assert data["status"] == "degraded"
+            assert data["components"]["vector_store"]["error"] == "milvus unreachable"
+            assert lifespan_client.get("/health").status_code == 200
+
+@pytest.fixture
+def streaming_components(fake_components):
+    """三页PPT，页码越小扩展越慢，使完成顺序与页码顺序相反"""
+    pages = [{"page_num": i, "title": f"第{i}页", "text": f"内容{i}"} for i in (1, 2, 3)]
+    fake_components["ppt_parser"].parse_ppt = AsyncMock(return_value={
+        "filename": "deck.pptx", "total_pages": 3, "pages": pages,
+        "toc": [{"page": 1, "title": "第1页", "level": 1}]
+    })
+    fake_components["vector_store"].add_documents.return_value = [101, 102, 103]
+    fake_components["vector_store"].search_similar.return_value = []
+    
+    async def extend_knowledge(content, context=None):
+        if content == "内容2":
+            raise RuntimeError("LLM down")
+        await asyncio.sleep(0.05 if content == "内容1" else 0.01)
+        return {"extended_content": f"扩展{content}"}
+    
+    fake_components["llm_client"].extend_knowledge = extend_knowledge
+    fake_components["llm_client"].model = "gpt-test"
+    fake_components["llm_client"].batch_pages = 1
+    fake_components["search_client"].search_external.return_value = {"all_sources": []}
+    fake_components["search_client"].source_latency = MagicMock(return_value={})
+    return fake_components
+
+def wait_until_ready(lifespan_client):
+    for _ in range(100):
+        if lifespan_client.get("/ready").status_code == 200:
+            return
+        time.sleep(0.01)
+
+def test_upload_stream_ndjson(streaming_components):
+    """测试流式上传先返回结构，再按完成顺序返回页面，最后返回汇总"""
+    with TestClient(app) as lifespan_client:
+        wait_until_ready(lifespan_client)
+        files = {"file": ("deck.pptx", b"fake", "application/octet-stream")}
+        with lifespan_client.stream("POST", "/api/ppt/upload/stream", files=files) as response:
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("application/x-ndjson")
+            records = [json.loads(line) for line in response.iter_lines() if line]
+    
+    assert [r["type"] for r in records] == ["structure", "error", "page", "page", "summary"]
+    assert records[0]["toc"][0]["title"] == "第1页"
+    assert records[0]["total_pages"] == 3
+    assert records[1]["page_num"] == 2
+    assert [r["page_num"] for r in records[2:4]] == [3, 1]  # 完成顺序
+    assert records[2]["page"]["vector_id"] == 103
+    assert records[3]["page"]["extensions"]["extended_content"] == "扩展内容1"
+    assert records[-1]["completed"] == 2
+    assert records[-1]["failed"] == 1
+    assert records[-1]["ppt_id"] == records[0]["ppt_id"]
+
+def test_upload_stream_sse(streaming_components):
+    """测试Accept为text/event-stream时使用SSE格式"""
+    with TestClient(app) as lifespan_client:
+        wait_until_ready(lifespan_client)
+        files = {"file": ("deck.pptx", b"fake", "application/octet-stream")}
+        response = lifespan_client.post("/api/ppt/upload/stream", files=files,
+                                        headers={"Accept": "text/event-stream"})
+    
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [block for block in response.text.split("\n\n") if block]
+    assert events[0].startswith("event: structure\ndata: ")
+    assert events[-1].startswith("event: summary\ndata: ")
+    assert json.loads(events[-1].split("data: ", 1)[1])["completed"] == 2
+
+def test_async_upload_reports_progress(streaming_components):
+    """测试异步上传立即返回ppt_id，状态接口最终返回结果"""
+    with TestClient(app) as lifespan_client:
+        wait_until_ready(lifespan_client)
+        files = {"file": ("deck.pptx", b"fake", "application/octet-stream")}
+        response = lifespan_client.post("/api/ppt/upload/async", files=files)
+        assert response.status_code == 202
+        ppt_id = response.json()["ppt_id"]
+        
+        for _ in range(200):
+            status = lifespan_client.get(f"/api/ppt/{ppt_id}").json()
+            if status["status"] in ("done", "failed"):
+                break
+            time.sleep(0.01)
+        
+        assert lifespan_client.get("/api/ppt/unknown").status_code == 404
+    
+    # 第2页的LLM调用抛出异常，任务失败但已完成的页面被保留
+    assert status["status"] == "failed"
+    assert status["error"] == "LLM down"
+    assert status["total_pages"] == 3
+    assert status["result"] is None
+    assert set(status["stage_timings"]) == {"parse", "ingest"}
+
+def test_async_job_resumes_completed_pages(streaming_components):
+    """测试任务续跑时跳过已写入的向量与已完成的页面"""
+    async def extend_knowledge(content, context=None):
+        return {"extended_content": f"扩展{content}"}
+    streaming_components["llm_client"].extend_knowledge = AsyncMock(side_effect=extend_knowledge)
+    
+    with TestClient(app) as lifespan_client:
+        wait_until_ready(lifespan_client)
+        store = main_module.job_queue.store
+        file_path = os.path.join(os.environ["UPLOAD_FOLDER"], "resume-1_deck.pptx")
+        store.create("resume-1", "deck.pptx", file_path, content_hash="resume-hash")
+        store.update("resume-1", status="extending", vector_ids={1: 101, 2: 102, 3: 103})
+        store.save_page("resume-1", 1, {"page_num": 1, "title": "第1页", "text": "内容1"})
+        
+        lifespan_client.portal.call(main_module.process_job, "resume-1")
+        status = lifespan_client.get("/api/ppt/resume-1").json()
+    
+    assert status["status"] == "done"
+    assert status["completed_pages"] == 3
+    assert [page["page_num"] for page in status["result"]["pages"]] == [1, 2, 3]
+    assert status["result"]["pages"][1]["vector_id"] == 102
+    streaming_components["vector_store"].add_documents.assert_not_called()
+    extended = [call.kwargs["content"] for call in streaming_components["llm_client"].extend_knowledge.await_args_list]
+    assert extended == ["内容2", "内容3"]
+
+def test_duplicate_upload_returns_stored_result(streaming_components):
+    """测试相同内容重复上传直接返回已保存的结果，并可按ppt_id查询"""
+    async def extend_knowledge(content, context=None):
+        return {"extended_content": f"扩展{content}"}
+    streaming_components["llm_client"].extend_knowledge = extend_knowledge
+    
+    with TestClient(app) as lifespan_client:
+        wait_until_ready(lifespan_client)
+        files = {"file": ("deck.pptx", b"same bytes", "application/octet-stream")}
+        first = lifespan_client.post("/api/ppt/upload", files=files).json()
+        second = lifespan_client.post("/api/ppt/upload", files=files).json()
+        streamed = [json.loads(line) for line in
+                    lifespan_client.post("/api/ppt/upload/stream", files=files).text.splitlines()]
+        queued = lifespan_client.post("/api/ppt/upload/async", files=files).json()
+        details = lifespan_client.get(f"/api/ppt/{first['ppt_id']}").json()
+        stats = main_module.result_store.stats()
+    
+    assert second["ppt_id"] == first["ppt_id"]
+    assert second["pages"] == first["pages"]
+    assert streamed[0]["ppt_id"] == first["ppt_id"]
+    assert streamed[-1]["cached"] is True
+    assert [r["page_num"] for r in streamed if r["type"] == "page"] == [1, 2, 3]
+    assert queued == {"ppt_id": first["ppt_id"], "status": "done",
+                      "status_url": f"/api/ppt/{first['ppt_id']}", "deduplicated": True}
+    assert details["status"] == "done"
+    assert details["result"]["total_pages"] == 3
+    assert streaming_components["ppt_parser"].parse_ppt.await_count == 1
+    assert stats["hits"] == 3
+    assert stats["entries"] == 1
+    assert os.listdir(os.environ["UPLOAD_FOLDER"]) == []  # 上传文件处理后即删除
+
+def test_upload_size_limit(streaming_components, monkeypatch):
+    """测试超限上传返回413：Content-Length超限时在读取请求体前拒绝"""
+    monkeypatch.setenv("MAX_CONTENT_LENGTH", "1000")
+    with TestClient(app) as lifespan_client:
+        wait_until_ready(lifespan_client)
+        small_limit = lifespan_client.post("/api/ppt/upload",
+                                           files={"file": ("deck.pptx", b"x" * 5000, "application/octet-stream")})
+        huge = lifespan_client.post("/api/ppt/upload/async",
+                                    files={"file": ("deck.pptx", b"x" * 200000, "application/octet-stream")})
+    
+    assert small_limit.status_code == 413
+    assert huge.status_code == 413
+    streaming_components["ppt_parser"].parse_ppt.assert_not_called()
+    assert os.listdir(os.environ["UPLOAD_FOLDER"]) == []
+
+def test_image_endpoint_serves_original_and_thumbnails(tmp_path):
+    """测试图片接口返回原始字节、按需缩略图，并支持ETag条件请求"""
+    from PIL import Image
+    import io
+    
+    buffer = io.BytesIO()
+    Image.new("RGB", (600, 300), color=(10, 120, 200)).save(buffer, format="JPEG")
+    blob = buffer.getvalue()
+    
+    with TestClient(app) as lifespan_client:
+        image = main_module.image_store.put(blob)
+        original = lifespan_client.get(image["url"])
+        thumbnail = lifespan_client.get(image["url"], params={"size": 100})
+        with patch.object(main_module.image_store, "get_path", wraps=main_module.image_store.get_path) as get_path:
+            cached = lifespan_client.get(image["url"], headers={"If-None-Match": original.headers["etag"]})
+        deferred_id = ImageStore.deferred_id("1" * 64, 7)
+        deferred_cached = lifespan_client.get(f"/api/images/{deferred_id}", headers={"If-None-Match": f'"{deferred_id}"'})
+        missing = lifespan_client.get(f"/api/images/{'0' * 64}")
+        invalid = lifespan_client.get(image["url"], params={"size": 0})
+    
+    assert original.status_code == 200
+    assert original.content == blob
+    assert original.headers["content-type"] == "image/jpeg"
+    assert "immutable" in original.headers["cache-control"]
+    assert thumbnail.status_code == 200
+    assert thumbnail.headers["etag"] == f'"{image["id"]}-128"'
+    assert max(Image.open(io.BytesIO(thumbnail.content)).size) == 128
+    assert cached.status_code == 304
+    assert deferred_cached.status_code == 304
+    get_path.assert_not_called()  # 条件请求不查找或提取图片
+    assert missing.status_code == 404
+    assert invalid.status_code == 400
+def test_stats_scans_storage_off_event_loop(fake_components):
+    """测试统计接口遍历存储目录的部分在线程中执行"""
+    for name, methods in {"vector_store": ["cache_stats", "backend_stats"],
+                          "search_client": ["pool_stats", "cache.stats"],
+                          "llm_client": ["cache_stats", "rate_limit_stats", "batch_stats"]}.items():
+        fake_components[name].configure_mock(**{method: MagicMock(return_value={}) for method in methods})
+    with TestClient(app) as lifespan_client:
+        wait_until_ready(lifespan_client)
+        with patch.object(main_module.asyncio, "to_thread", wraps=asyncio.to_thread) as to_thread:
+            stats = lifespan_client.get("/api/stats").json()
+    
+    offloaded = [args[0] for args, _ in to_thread.call_args_list]
+    assert main_module.image_store.stats in offloaded
+    assert main_module.temp_files.stats in offloaded
+    assert stats["images"]["images"] == 0
+    assert stats["temp_files"]["active_uploads"] == 0
+
+def make_stored_result(ppt_id, pages=30):
+    """构造一份较大的已完成结果：每页有正文、扩展与参考文献"""
+    from fastapi.encoders import jsonable_encoder
+    from app.models import ExtendResponse
+    
+    page_dicts = [{
+        "page_num": i,
+        "title": f"第{i}页",
+        "text": "正文" * 200,
+        "elements": [{"type": "text", "content": "正文" * 200,
+                      "position": {"left": 0, "top": 0, "width": 10, "height": 10}}],
+        "extensions": {"extended_content": f"扩展{i}" * 50},
+        "external_references": {"all_sources": [{"title": "ref", "summary": "摘要" * 50}]}
+    } for i in range(1, pages + 1)]
+    structure = {"filename": "deck.pptx", "total_pages": pages, "pages": page_dicts,
+                 "toc": [{"page": i, "title": f"第{i}页", "level": 3} for i in range(1, pages + 1)]}
+    response = ExtendResponse(ppt_id=ppt_id, original_filename="deck.pptx", total_pages=pages,
+                              pages=page_dicts, structure=structure)
+    return jsonable_encoder(response), structure
+
+def test_structure_does_not_duplicate_pages():
+    """测试结构只含元数据与目录，响应体积约为原先的一半"""
+    result, structure = make_stored_result("size-1")
+    new_size = len(json.dumps(result, ensure_ascii=False))
+    old_size = len(json.dumps({**result, "structure": structure}, ensure_ascii=False))
+    
+    assert "pages" not in result["structure"]
+    assert result["structure"]["toc"][9]["title"] == "第10页"
+    assert new_size < old_size * 0.55
+
+def test_page_range_and_field_projection():
+    """测试按页码范围、游标与字段获取页面，响应远小于整份结果"""
+    with TestClient(app) as lifespan_client:
+        result, _ = make_stored_result("pages-1")
+        main_module.result_store.put("pages-1", "pages-hash", "options", result)
+        
+        full = lifespan_client.get("/api/ppt/pages-1")
+        ranged = lifespan_client.get("/api/ppt/pages-1/pages",
+                                     params={"from": 10, "to": 20, "fields": "title,extensions"})
+        first = lifespan_client.get("/api/ppt/pages-1/pages", params={"limit": 25, "fields": "title"}).json()
+        rest = lifespan_client.get("/api/ppt/pages-1/pages",
+                                   params={"cursor": first["next_cursor"], "limit": 25, "fields": "title"}).json()
+        titles = lifespan_client.get("/api/ppt/pages-1", params={"fields": "title"}).json()
+        bad_field = lifespan_client.get("/api/ppt/pages-1/pages", params={"fields": "title,secret"})
+        missing = lifespan_client.get("/api/ppt/unknown/pages")
+    
+    data = ranged.json()
+    assert [page["page_num"] for page in data["pages"]] == list(range(10, 21))
+    assert set(data["pages"][0]) == {"page_num", "title", "extensions"}
+    assert data["next_cursor"] is None
+    assert len(ranged.content) < len(full.content) / 10
+    assert first["next_cursor"] == 26
+    assert [page["page_num"] for page in rest["pages"]] == [26, 27, 28, 29, 30]
+    assert rest["next_cursor"] is None
+    assert titles["result"]["pages"][0] == {"page_num": 1, "title": "第1页"}
+    assert bad_field.status_code == 400
+    assert missing.status_code == 404
+def test_results_are_compressed_when_accepted():
+    """测试结果接口按Accept-Encoding压缩，并与上传接口返回相同的JSON"""
+    with TestClient(app) as lifespan_client:
+        result, _ = make_stored_result("gzip-1")
+        main_module.result_store.put("gzip-1", "gzip-hash", "options", result)
+        compressed = lifespan_client.get("/api/ppt/gzip-1", headers={"Accept-Encoding": "gzip"})
+        plain = lifespan_client.get("/api/ppt/gzip-1", headers={"Accept-Encoding": "identity"})
+    
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert "content-encoding" not in plain.headers
+    assert compressed.json() == plain.json()
+    assert compressed.json()["result"]["pages"][0]["title"] == "第1页"
+    assert int(compressed.headers["content-length"]) < len(plain.content) / 5
+
+@pytest.mark.asyncio
+async def test_page_external_search_runs_alongside_llm():
+    """测试外部搜索与LLM扩展并发执行，相似检索排除页面自身的向量"""
+    llm_started = asyncio.Event()
+    
+    async def search_external(query):
+        # 串行执行时LLM尚未开始，这里会超时
+        await asyncio.wait_for(llm_started.wait(), timeout=1)
+        return {"all_sources": [query]}
+    
+    async def extend_knowledge(content, context=None):
+        llm_started.set()
+        await asyncio.sleep(0.01)
+        return {"extended_content": f"扩展{content}", "context": context}
+    
+    vector_store = MagicMock()
+    vector_store.search_similar.return_value = [{"id": 7, "content": "相邻页"}]
+    llm_client = MagicMock(extend_knowledge=extend_knowledge)
+    search_client = MagicMock(search_external=search_external)
+    with patch.multiple(main_module, vector_store=vector_store, llm_client=llm_client,
+                        search_client=search_client):
+        page = await main_module.process_page_content(
+            {"page_num": 1, "title": "梯度下降", "text": "内容1"}, "ppt-1", vector_id=5)
+    
+    assert page["external_references"] == {"all_sources": ["梯度下降"]}
+    assert page["extensions"]["context"] == [{"id": 7, "content": "相邻页"}]
+    assert vector_store.search_similar.call_args.kwargs["exclude_ids"] == (5,)
+    # 未指定课程时相似检索限定在本PPT内
+    assert vector_store.search_similar.call_args.kwargs["ppt_id"] == "ppt-1"
+
+def test_versioned_upload_reprocesses_changed_slides(streaming_components):
+    """测试按deck_id上传新版本时只重新扩展修改过的页面，并删除其旧向量"""
+    extended = []
+    
+    async def extend_knowledge(content, context=None):
+        extended.append(content)
+        return {"extended_content": f"扩展{content}"}
+    streaming_components["llm_client"].extend_knowledge = extend_knowledge
+    vector_store = streaming_components["vector_store"]
+    vector_store.add_documents.side_effect = lambda texts, metadatas: [100 + meta["page_num"] for meta in metadatas]
+    
+    with TestClient(app) as lifespan_client:
+        wait_until_ready(lifespan_client)
+        first = lifespan_client.post("/api/ppt/upload", params={"deck_id": "ml-101"},
+                                     files={"file": ("deck.pptx", b"v1", "application/octet-stream")}).json()
+        
+        pages = [{"page_num": i, "title": f"第{i}页", "text": "内容2（已修改）" if i == 2 else f"内容{i}"}
+                 for i in (1, 2, 3)]
+        streaming_components["ppt_parser"].parse_ppt.return_value = {
+            "filename": "deck.pptx", "total_pages": 3, "pages": pages, "toc": []}
+        vector_store.add_documents.side_effect = lambda texts, metadatas: [200 + meta["page_num"] for meta in metadatas]
+        second = lifespan_client.post("/api/ppt/upload", params={"deck_id": "ml-101"},
+                                      files={"file": ("deck.pptx", b"v2", "application/octet-stream")}).json()
+        stats = main_module.result_store.stats()
+    
+    assert first["version_stats"]["reused_pages"] == 0
+    assert extended == ["内容1", "内容2", "内容3", "内容2（已修改）"]
+    assert second["version_stats"] == {
+        "deck_id": "ml-101", "previous_ppt_id": first["ppt_id"], "reused_pages": 2,
+        "extended_pages": 1, "vectors_kept": 2, "vectors_deleted": 1
+    }
+    assert [page["vector_id"] for page in second["pages"]] == [101, 202, 103]
+    assert second["pages"][0]["extensions"] == first["pages"][0]["extensions"]
+    vector_store.delete_by_ids.assert_called_once_with([102])
+    # 向量以deck_id写入，相似检索也按deck_id过滤
+    assert vector_store.search_similar.call_args.kwargs["ppt_id"] == "ml-101"
+    assert vector_store.add_documents.call_args.kwargs["metadatas"] == [
+        {"ppt_id": "ml-101", "page_num": 2, "title": "第2页", "versioned": True}]
+    assert stats["versions"] == 2
+    assert stats["reused_pages"] == 2
+
+def test_versioned_upload_is_not_deduplicated_across_decks(streaming_components):
+    """测试指定deck_id时不按内容去重：相同内容的重复上传记录新版本，不同PPT各自写入向量"""
+    async def extend_knowledge(content, context=None):
+        return {"extended_content": f"扩展{content}"}
+    streaming_components["llm_client"].extend_knowledge = extend_knowledge
+    vector_store = streaming_components["vector_store"]
+    
+    with TestClient(app) as lifespan_client:
+        wait_until_ready(lifespan_client)
+        files = {"file": ("deck.pptx", b"same", "application/octet-stream")}
+        first = lifespan_client.post("/api/ppt/upload", params={"deck_id": "ml-101"}, files=files).json()
+        again = lifespan_client.post("/api/ppt/upload", params={"deck_id": "ml-101"}, files=files).json()
+        other = lifespan_client.post("/api/ppt/upload", params={"deck_id": "cv-201"}, files=files).json()
+        plain = lifespan_client.post("/api/ppt/upload", files=files).json()
+        stats = main_module.result_store.stats()
+    
+    assert again["ppt_id"] != first["ppt_id"]
+    assert again["version_stats"]["reused_pages"] == 3
+    assert other["version_stats"]["previous_ppt_id"] is None
+    assert plain["ppt_id"] not in (first["ppt_id"], again["ppt_id"], other["ppt_id"])
+    assert [c.kwargs["metadatas"][0]["ppt_id"] for c in vector_store.add_documents.call_args_list] == [
+        "ml-101", "cv-201", plain["ppt_id"]]
+    assert stats["versions"] == 3
+
+def test_failed_version_keeps_previous_vectors(streaming_components):
+    """测试新版本处理失败时保留上一版本的向量，只撤销本次新写入的向量"""
+    async def extend_knowledge(content, context=None):
+        if content == "内容2（已修改）":
+            raise RuntimeError("LLM down")
+        return {"extended_content": f"扩展{content}"}
+    streaming_components["llm_client"].extend_knowledge = extend_knowledge
+    vector_store = streaming_components["vector_store"]
+    vector_store.add_documents.side_effect = lambda texts, metadatas: [100 + meta["page_num"] for meta in metadatas]
+    
+    with TestClient(app) as lifespan_client:
+        wait_until_ready(lifespan_client)
+        first = lifespan_client.post("/api/ppt/upload", params={"deck_id": "ml-101"},
+                                     files={"file": ("deck.pptx", b"v1", "application/octet-stream")}).json()
+        
+        pages = [{"page_num": i, "title": f"第{i}页", "text": "内容2（已修改）" if i == 2 else f"内容{i}"}
+                 for i in (1, 2, 3)]
+        streaming_components["ppt_parser"].parse_ppt.return_value = {
+            "filename": "deck.pptx", "total_pages": 3, "pages": pages, "toc": []}
+        vector_store.add_documents.side_effect = lambda texts, metadatas: [200 + meta["page_num"] for meta in metadatas]
+        failed = lifespan_client.post("/api/ppt/upload", params={"deck_id": "ml-101"},
+                                      files={"file": ("deck.pptx", b"v2", "application/octet-stream")})
+        stream = lifespan_client.post("/api/ppt/upload/stream", params={"deck_id": "ml-101"},
+                                      files={"file": ("deck.pptx", b"v2", "application/octet-stream")})
+        latest = main_module.result_store.latest_version("ml-101")
+    
+    assert failed.status_code == 500
+    assert [json.loads(line)["type"] for line in stream.text.splitlines()][-1] == "summary"
+    # 上一版本的向量102未被删除，两次失败各自撤销新写入的向量202
+    assert vector_store.delete_by_ids.call_args_list == [call([202]), call([202])]
+    assert latest[0] == first["ppt_id"]
+
+@pytest.mark.parametrize("records_sent", [0, 1])
+def test_closed_stream_rolls_back_version(streaming_components, records_sent):
+    """测试客户端在开始读取前或读到第一条记录后关闭连接时，都撤销本次按deck_id写入的向量"""
+    import io
+    import anyio
+    from fastapi import UploadFile
+    from starlette.requests import Request
+    
+    async def extend_knowledge(content, context=None):
+        await asyncio.sleep(0.05)
+        return {"extended_content": f"扩展{content}"}
+    streaming_components["llm_client"].extend_knowledge = extend_knowledge
+    vector_store = streaming_components["vector_store"]
+    vector_store.add_documents.side_effect = lambda texts, metadatas: [200 + meta["page_num"] for meta in metadatas]
+    chunks = []
+    
+    async def run_request():
+        scope = {"type": "http", "method": "POST", "path": "/api/ppt/upload/stream", "headers": []}
+        response = await main_module.upload_and_stream_ppt(
+            Request(scope), file=UploadFile(io.BytesIO(b"v1"), filename="deck.pptx"), format=None,
+            deck_id="ml-101", extension_depth="normal", include_sources=None, generate_questions=False, course=None)
+        
+        async def receive():
+            await anyio.sleep_forever()
+        
+        async def send(message):
+            # 连接已关闭：发送响应头或第records_sent+1条记录时失败
+            if message["type"] == "http.response.start" and records_sent == 0:
+                raise OSError("connection closed")
+            if message["type"] == "http.response.body" and message.get("body"):
+                if len(chunks) >= records_sent:
+                    raise OSError("connection closed")
+                chunks.append(message["body"])
+        
+        with anyio.fail_after(5), pytest.raises(OSError):
+            await response(scope, receive, send)
+    
+    with TestClient(app) as lifespan_client:
+        wait_until_ready(lifespan_client)
+        lifespan_client.portal.call(run_request)
+        latest = main_module.result_store.latest_version("ml-101")
+    
+    assert [json.loads(chunk)["type"] for chunk in chunks] == ["structure"] * records_sent
+    vector_store.delete_by_ids.assert_called_once_with([201, 202, 203])
+    assert latest is None
+
+def test_upload_options_skip_stages(streaming_components):
+    """测试上传选项：简单深度使用simple模板与较小补全上限，只查询选择的源，按需生成问题"""
+    extension_calls = []
+    
+    async def extend_knowledge(content, context=None, **kwargs):
+        extension_calls.append(kwargs)
+        return {"extended_content": f"扩展{content}"}
+    streaming_components["llm_client"].extend_knowledge = extend_knowledge
+    streaming_components["llm_client"].EXTENSION_DEPTHS = {"simple": ("simple", 600)}
+    streaming_components["llm_client"].generate_questions = AsyncMock(return_value=[{"question": "什么是梯度？"}])
+    search_external = streaming_components["search_client"].search_external
+    
+    with TestClient(app) as lifespan_client:
+        wait_until_ready(lifespan_client)
+        files = {"file": ("deck.pptx", b"options", "application/octet-stream")}
+        invalid = lifespan_client.post("/api/ppt/upload", files=files, params={"extension_depth": "huge"})
+        result = lifespan_client.post("/api/ppt/upload", files=files, params={
+            "extension_depth": "simple", "include_sources": ["arxiv"], "generate_questions": "true"}).json()
+        default = lifespan_client.post("/api/ppt/upload", files=files).json()
+        no_search = lifespan_client.post("/api/ppt/upload", files=files, params={"include_sources": "none"}).json()
+    
+    assert invalid.status_code == 422
+    assert extension_calls[:3] == [{"template_type": "simple", "max_tokens": 600}] * 3
+    assert search_external.await_args_list[0].kwargs["sources"] == ["arxiv"]
+    assert result["pages"][0]["questions"] == [{"question": "什么是梯度？"}]
+    assert result["options"] == {"extension_depth": "simple", "include_sources": ["arxiv"], "generate_questions": True,
+                                 "course": None}
+    assert result["skipped"]["stages"] == ["search:wikipedia", "search:semantic_scholar", "extension:normal"]
+    assert result["skipped"]["pages"] == 3
+    # 默认选项与之前的行为一致，且与简单深度的结果分别保存
+    assert default["ppt_id"] != result["ppt_id"]
+    assert default["pages"][0]["questions"] == []
+    assert default["skipped"]["stages"] == ["questions"]
+    assert "sources" not in search_external.await_args_list[-1].kwargs
+    # include_sources=none不查询任何外部源
+    assert no_search["options"]["include_sources"] == []
+    assert search_external.await_count == 6
+    assert "search:arxiv" in no_search["skipped"]["stages"]
+    assert streaming_components["llm_client"].generate_questions.await_count == 3
+
+def test_course_scopes_ingest_and_search(streaming_components):
+    """测试上传时指定课程：向量带课程标记，相似检索限定在课程内；语义搜索接口支持过滤"""
+    async def extend_knowledge(content, context=None):
+        return {"extended_content": f"扩展{content}"}
+    streaming_components["llm_client"].extend_knowledge = extend_knowledge
+    vector_store = streaming_components["vector_store"]
+    
+    with TestClient(app) as lifespan_client:
+        wait_until_ready(lifespan_client)
+        result = lifespan_client.post("/api/ppt/upload", params={"course": "ml-101"},
+                                      files={"file": ("deck.pptx", b"course", "application/octet-stream")}).json()
+        page_search = vector_store.search_similar.call_args
+        vector_store.search_similar.return_value = [{"id": 1, "content": "内容1"}]
+        response = lifespan_client.get("/api/search/semantic",
+                                       params={"query": "梯度", "ppt_id": result["ppt_id"], "course": "ml-101"})
+    
+    assert result["options"]["course"] == "ml-101"
+    assert all(meta["course"] == "ml-101" for meta in vector_store.add_documents.call_args.kwargs["metadatas"])
+    assert page_search.kwargs["course"] == "ml-101"
+    assert "ppt_id" not in page_search.kwargs
+    assert response.status_code == 200
+    vector_store.search_similar.assert_called_with("梯度", top_k=5, ppt_id=result["ppt_id"], course="ml-101")
+
+def test_versioned_upload_reuses_questions(streaming_components):
+    """测试按deck_id上传新版本时，未修改的页面复用上一版本生成的问题"""
+    async def extend_knowledge(content, context=None):
+        return {"extended_content": f"扩展{content}"}
+    streaming_components["llm_client"].extend_knowledge = extend_knowledge
+    streaming_components["llm_client"].generate_questions = AsyncMock(return_value=[{"question": "什么是梯度？"}])
+    params = {"deck_id": "ml-101", "generate_questions": "true"}
+    
+    with TestClient(app) as lifespan_client:
+        wait_until_ready(lifespan_client)
+        lifespan_client.post("/api/ppt/upload", params=params,
+                             files={"file": ("deck.pptx", b"v1", "application/octet-stream")})
+        second = lifespan_client.post("/api/ppt/upload", params=params,
+                                      files={"file": ("deck.pptx", b"v2", "application/octet-stream")}).json()
+    
+    assert second["version_stats"]["reused_pages"] == 3
+    assert streaming_components["llm_client"].generate_questions.await_count == 3
+    assert all(page["questions"] == [{"question": "什么是梯度？"}] for page in second["pages"])
\ No newline at end of file
@@ -2,6 +2,8 @@ import pytest
 import os
 import sys
 
+from unittest.mock import patch
+
 # 添加项目根目录到Python路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -47,4 +49,362 @@ def test_determine_title_level():
     
     assert parser._determine_title_level("INTRODUCTION") == 1
     assert parser._determine_title_level("1.1 Background") == 2
-    assert parser._determine_title_level("Regular Title") == 3
\ No newline at end of file
+    assert parser._determine_title_level("Regular Title") == 3
+
+def make_deck(path, slides, with_images=True):
+    """用python-pptx生成测试用PPTX：标题+正文，每隔几页插入一张图片"""
+    from pptx import Presentation
+    from pptx.util import Inches
+    from PIL import Image
+    import io
+    
+    prs = Presentation()
+    for i in range(slides):
+        slide = prs.slides.add_slide(prs.slide_layouts[1])
+        slide.shapes.title.text = f"{i + 1}. Section {i + 1}"
+        slide.placeholders[1].text = f"Point A of slide {i + 1}\nPoint B of slide {i + 1}"
+        if with_images and i % 3 == 0:
+            buffer = io.BytesIO()
+            Image.new("RGB", (32, 16), color=(i * 5 % 256, 80, 160)).save(buffer, format="PNG")
+            buffer.seek(0)
+            slide.shapes.add_picture(buffer, Inches(1), Inches(5), Inches(2), Inches(1))
+    prs.save(path)
+    return path
+
+def make_mixed_deck(path):
+    """覆盖多种版式与形状的PPTX：副标题、软换行、文本框、表格、组合、移动过的占位符、图片"""
+    from pptx import Presentation
+    from pptx.util import Inches
+    from PIL import Image
+    import io
+    
+    prs = Presentation()
+    cover = prs.slides.add_slide(prs.slide_layouts[0])
+    cover.shapes.title.text = "COURSE OVERVIEW"
+    cover.placeholders[1].text = "Lecture 1\vSpring term"
+    
+    content = prs.slides.add_slide(prs.slide_layouts[1])
+    content.shapes.title.text = "1.1 Background"
+    content.shapes.title.left = Inches(2)
+    content.placeholders[1].text = "First point\nSecond point"
+    box = content.shapes.add_textbox(Inches(1), Inches(6), Inches(4), Inches(1))
+    box.text_frame.text = "Side note"
+    box.name = "Subtitle Box"
+    content.shapes.add_table(2, 2, Inches(1), Inches(1), Inches(2), Inches(1)).table.cell(0, 0).text = "cell"
+    group = content.shapes.add_group_shape()
+    group.shapes.add_textbox(Inches(1), Inches(1), Inches(1), Inches(1)).text_frame.text = "grouped"
+    
+    blank = prs.slides.add_slide(prs.slide_layouts[6])
+    named = blank.shapes.add_textbox(Inches(1), Inches(1), Inches(5), Inches(1))
+    named.name = "Custom Title 1"
+    named.text_frame.text = "Free-form title"
+    blank.shapes.add_textbox(Inches(1), Inches(2), Inches(5), Inches(1)).text_frame.text = "   "
+    for color in ((255, 0, 0), (0, 0, 255)):
+        buffer = io.BytesIO()
+        Image.new("RGB", (24, 12), color=color).save(buffer, format="JPEG")
+        buffer.seek(0)
+        blank.shapes.add_picture(buffer, Inches(1), Inches(3))
+    
+    title_only = prs.slides.add_slide(prs.slide_layouts[5])
+    title_only.shapes.title.text = "Summary"
+    prs.save(path)
+    return path
+
+def test_xml_engine_matches_python_pptx(tmp_path):
+    """测试直接读取XML的解析结果与python-pptx完全一致"""
+    for deck in (make_mixed_deck(str(tmp_path / "mixed.pptx")), make_deck(str(tmp_path / "deck.pptx"), 6)):
+        expected = PPTParser._parse_pptx_pages(deck, engine="python-pptx")
+        result = PPTParser._parse_pptx_pages(deck, engine="xml")
+        assert result == expected
+    
+    assert PPTParser._parse_pptx_pages(str(tmp_path / "deck.pptx"), 2, 4, engine="xml") == expected[2:4]
+    
+    mixed = PPTParser._parse_pptx_pages(str(tmp_path / "mixed.pptx"), engine="xml")
+    assert mixed[0]["text"] == "Lecture 1\vSpring term\n"
+    assert mixed[1]["title"] == "1.1 Background"
+    assert mixed[2]["title"] == "Free-form title"
+    assert len(mixed[2]["images"]) == 2
+    assert all(e["position"]["width"] is not None for page in mixed for e in page["elements"])
+
+def test_xml_engine_handles_missing_shape_name(tmp_path):
+    """测试形状缺少cNvPr时XML快速解析仍能读取文本"""
+    import re
+    import zipfile
+    
+    deck = make_deck(str(tmp_path / "deck.pptx"), 1, with_images=False)
+    broken = str(tmp_path / "broken.pptx")
+    with zipfile.ZipFile(deck) as source, zipfile.ZipFile(broken, "w") as target:
+        for item in source.infolist():
+            data = source.read(item.filename)
+            if item.filename == "ppt/slides/slide1.xml":
+                data = re.sub(rb"<p:cNvPr [^>]*/>", b"", data)
+            target.writestr(item, data)
+    
+    with patch("builtins.print") as fallback_log:
+        pages = PPTParser._parse_pptx_pages(broken, engine="xml")
+    fallback_log.assert_not_called()
+    assert pages[0]["title"] == "1. Section 1"
+    assert pages[0]["text"] == "Point A of slide 1\nPoint B of slide 1\n"
+
+def test_xml_engine_reads_images_lazily(tmp_path):
+    """测试没有图片形状的幻灯片不会读取图片部件"""
+    from app.pptx_reader import PPTXReader
+    
+    deck = make_deck(str(tmp_path / "deck.pptx"), 4)
+    seen = []
+    with PPTXReader(deck) as reader:
+        assert len(reader) == 4
+        reader.parse_pages(1, 3, image_handler=lambda blob: seen.append(blob))
+        assert seen == []
+        reader.parse_pages(0, 1, image_handler=lambda blob: seen.append(blob) or {"size": len(blob)})
+    assert len(seen) == 1 and seen[0][:4] == b"\x89PNG"
+
+@pytest.mark.asyncio
+async def test_process_mode_matches_thread_mode(tmp_path):
+    """测试多进程按页范围解析与单线程解析结果一致且页序正确"""
+    deck = make_deck(str(tmp_path / "deck.pptx"), 7)
+    
+    thread_parser = PPTParser(mode="thread")
+    process_parser = PPTParser(mode="process", workers=2, chunk_size=3)
+    try:
+        expected = await thread_parser.parse_ppt(deck)
+        result = await process_parser.parse_ppt(deck)
+    finally:
+        thread_parser.close()
+        process_parser.close()
+    
+    assert [page["page_num"] for page in result["pages"]] == list(range(1, 8))
+    assert result == expected
+    assert result["toc"][2]["title"] == "3. Section 3"
+    assert len(result["pages"][3]["images"]) == 1
+
+@pytest.mark.asyncio
+async def test_process_mode_falls_back_once_for_whole_deck(tmp_path):
+    """测试多进程解析时XML快速解析失败，整份PPT只用python-pptx加载一次"""
+    import pptx
+    from concurrent.futures import ThreadPoolExecutor
+    from app.pptx_reader import PPTXReader
+    
+    deck = make_deck(str(tmp_path / "deck.pptx"), 7)
+    expected = PPTParser._parse_pptx_pages(deck, engine="python-pptx")
+    parser = PPTParser(mode="process", workers=2, chunk_size=3, image_dir=str(tmp_path / "images"))
+    # 用线程池代替进程池，使patch在各任务中生效
+    parser.process_pool = ThreadPoolExecutor(max_workers=2)
+    try:
+        with patch.object(PPTXReader, "parse_pages", side_effect=KeyError("word/missing.xml")), \
+                patch.object(pptx, "Presentation", wraps=pptx.Presentation) as presentation:
+            result = await parser.parse_ppt(deck)
+    finally:
+        parser.close()
+    
+    assert presentation.call_count == 1
+    assert result["pages"] == expected
+
+@pytest.mark.asyncio
+async def test_images_are_stored_by_reference(tmp_path):
+    """测试页面中只保留图片引用，原始字节写入图片库"""
+    from app.image_store import ImageStore
+    
+    deck = make_deck(str(tmp_path / "deck.pptx"), 4)
+    parser = PPTParser(image_dir=str(tmp_path / "images"))
+    try:
+        result = await parser.parse_ppt(deck)
+    finally:
+        parser.close()
+    
+    image = result["pages"][0]["images"][0]
+    assert "data" not in image
+    assert image["format"] == "png"
+    assert (image["width"], image["height"]) == (32, 16)
+    store = ImageStore(str(tmp_path / "images"))
+    assert os.path.getsize(store.get_path(image["id"])) == image["size"]
+
+def test_count_pages(tmp_path):
+    """测试不加载对象模型统计幻灯片数"""
+    deck = make_deck(str(tmp_path / "deck.pptx"), 4, with_images=False)
+    assert PPTParser._count_pages(deck) == 4
+    assert len(PPTParser._parse_pptx_pages(deck, start=1, end=3)) == 2
+
+def make_logo_deck(path, slides):
+    """每页都带同一个logo的PPTX（模板场景），第一页另有一张不同的图片"""
+    from pptx import Presentation
+    from pptx.util import Inches
+    from PIL import Image
+    import io
+    
+    def image_bytes(color):
+        buffer = io.BytesIO()
+        Image.new("RGB", (40, 20), color=color).save(buffer, format="PNG")
+        return buffer.getvalue()
+    
+    logo = image_bytes((0, 90, 160))
+    prs = Presentation()
+    for i in range(slides):
+        slide = prs.slides.add_slide(prs.slide_layouts[5])
+        slide.shapes.title.text = f"Slide {i + 1}"
+        slide.shapes.add_picture(io.BytesIO(logo), Inches(8), Inches(0.2), Inches(1), Inches(0.5))
+        if i == 0:
+            slide.shapes.add_picture(io.BytesIO(image_bytes((250, 0, 0))), Inches(1), Inches(2))
+    prs.save(path)
+    return path, len(logo)
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("engine", ["xml", "python-pptx"])
+async def test_repeated_images_are_processed_once(tmp_path, engine):
+    """测试每页重复的logo只处理一次，所有页面引用同一图片"""
+    from app.image_store import ImageStore
+    
+    deck, logo_size = make_logo_deck(str(tmp_path / "logo.pptx"), 5)
+    parser = PPTParser(engine=engine, image_dir=str(tmp_path / "images"))
+    with patch.object(ImageStore, "put", autospec=True, side_effect=ImageStore.put) as put:
+        try:
+            result = await parser.parse_ppt(deck)
+        finally:
+            parser.close()
+    
+    logo_ids = {page["images"][0]["id"] for page in result["pages"]}
+    assert len(logo_ids) == 1
+    assert put.call_count == 2  # logo与第一页的另一张图片各一次
+    assert result["image_stats"] == {
+        "total": 6,
+        "unique": 2,
+        "bytes_total": result["image_stats"]["bytes_total"],
+        "bytes_saved": 4 * logo_size
+    }
+    assert ImageStore(str(tmp_path / "images")).usage()["images"] == 2
+
+def test_pdf_images_are_extracted_once_per_xref(tmp_path):
+    """测试PDF中多页引用的同一xref只提取一次"""
+    import fitz
+    from PIL import Image
+    import io
+    
+    buffer = io.BytesIO()
+    Image.new("RGB", (40, 20), color=(0, 90, 160)).save(buffer, format="PNG")
+    doc = fitz.open()
+    xref = 0
+    for i in range(4):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {i + 1}")
+        xref = page.insert_image(fitz.Rect(10, 10, 50, 30), stream=buffer.getvalue(), xref=xref)
+    path = str(tmp_path / "deck.pdf")
+    doc.save(path)
+    doc.close()
+    
+    with patch.object(fitz.Document, "extract_image", autospec=True,
+                      side_effect=fitz.Document.extract_image) as extract:
+        pages = PPTParser._parse_pdf_pages(path, image_dir=str(tmp_path / "images"))
+    
+    assert extract.call_count == 1
+    assert len({page["images"][0]["id"] for page in pages}) == 1
+    assert all(page["images"][0]["index"] == 0 for page in pages)
+
+def make_lecture_pdf(path, pages=4):
+    """每页顶部有小字号的课程名，下面是两行大字号标题与正文，并引用同一张图片"""
+    import fitz
+    from PIL import Image
+    import io
+    
+    buffer = io.BytesIO()
+    Image.new("RGB", (40, 20), color=(0, 90, 160)).save(buffer, format="JPEG")
+    doc = fitz.open()
+    xref = 0
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 40), "CS101 Machine Learning", fontsize=9)
+        page.insert_text((72, 100), f"Lecture {i + 1}:", fontsize=28)
+        page.insert_text((72, 134), "Gradient Descent", fontsize=28)
+        page.insert_text((72, 200), f"Body text of page {i + 1}", fontsize=12)
+        page.insert_text((72, 220), "Another body line", fontsize=12)
+        xref = page.insert_image(fitz.Rect(300, 300, 380, 340), stream=buffer.getvalue(), xref=xref)
+    doc.save(path)
+    doc.close()
+    return path
+
+def test_pdf_title_uses_font_size(tmp_path):
+    """测试PDF标题按字号判断：跳过小字号的页眉，合并折行的标题"""
+    pages = PPTParser._parse_pdf_pages(make_lecture_pdf(str(tmp_path / "lecture.pdf"), 1))
+    
+    assert pages[0]["title"] == "Lecture 1: Gradient Descent"
+    assert pages[0]["text"].startswith("CS101 Machine Learning\nLecture 1:\n")
+    assert "Body text of page 1" in pages[0]["text"]
+    assert pages[0]["parse_seconds"] >= 0
+    
+    same_size = {"blocks": [{"type": 0, "lines": [
+        {"spans": [{"text": "First line", "size": 12}]},
+        {"spans": [{"text": "Second line", "size": 12}]}]}]}
+    assert PPTParser._pdf_title_and_text(same_size) == ("First line", "First line\nSecond line\n")
+    assert PPTParser._pdf_title_and_text({"blocks": []}) == ("", "")
+
+@pytest.mark.asyncio
+async def test_pdf_images_are_extracted_on_demand(tmp_path):
+    """测试PDF解析时不提取图片，首次访问时从登记的源文件提取一次"""
+    import fitz
+    from app.image_store import ImageStore
+    
+    pdf = make_lecture_pdf(str(tmp_path / "lecture.pdf"))
+    parser = PPTParser(image_dir=str(tmp_path / "images"))
+    with patch.object(fitz.Document, "extract_image", autospec=True,
+                      side_effect=fitz.Document.extract_image) as extract:
+        try:
+            result = await parser.parse_ppt(pdf)
+        finally:
+            parser.close()
+        assert extract.call_count == 0
+        
+        image = result["pages"][2]["images"][0]
+        assert image["format"] == "jpeg"
+        assert (image["width"], image["height"]) == (40, 20)
+        assert {page["images"][0]["id"] for page in result["pages"]} == {image["id"]}
+        
+        store = ImageStore(str(tmp_path / "images"))
+        path = store.get_path(image["id"])
+        assert store.get_path(image["id"]) == path
+        assert extract.call_count == 1
+    
+    with open(path, "rb") as f:
+        assert f.read(2) == b"\xff\xd8"  # 原始JPEG字节
+    assert result["image_stats"]["unique"] == 1
+    assert result["parse_stats"]["slowest_page"] in range(1, 5)
+    assert set(result["parse_stats"]["page_seconds"]) == {"1", "2", "3", "4"}
+    assert store.get_path(ImageStore.deferred_id("0" * 64, 5)) is None
+
+@pytest.mark.asyncio
+async def test_pdf_without_images_registers_no_source(tmp_path):
+    """测试没有图片的PDF不登记源文件"""
+    import fitz
+    
+    pdf = str(tmp_path / "text.pdf")
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 100), "Only text", fontsize=12)
+    doc.save(pdf)
+    doc.close()
+    parser = PPTParser(image_dir=str(tmp_path / "images"))
+    try:
+        result = await parser.parse_ppt(pdf)
+    finally:
+        parser.close()
+    
+    assert result["pages"][0]["images"] == []
+    assert os.listdir(parser.image_store.source_dir) == []
+
+@pytest.mark.asyncio
+async def test_large_pdf_is_split_across_processes(tmp_path):
+    """测试页数达到阈值的PDF在thread模式下也按页范围多进程解析，结果与单线程一致"""
+    pdf = make_lecture_pdf(str(tmp_path / "lecture.pdf"), pages=5)
+    serial = PPTParser(workers=1, image_dir=str(tmp_path / "images"))
+    parallel = PPTParser(workers=2, chunk_size=2, pdf_parallel_pages=4, image_dir=str(tmp_path / "images"))
+    try:
+        expected = await serial.parse_ppt(pdf)
+        result = await parallel.parse_ppt(pdf)
+        assert serial.process_pool is None
+        assert parallel.process_pool is not None
+    finally:
+        serial.close()
+        parallel.close()
+    
+    def without_timing(pages):
+        return [{k: v for k, v in page.items() if k != "parse_seconds"} for page in pages]
+    
+    assert without_timing(result["pages"]) == without_timing(expected["pages"])
+    assert [page["title"] for page in result["pages"]][4] == "Lecture 5: Gradient Descent"
\ No newline at end of file
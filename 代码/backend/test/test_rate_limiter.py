@@ -0,0 +1,134 @@
+import pytest
+import sys
+import os
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+import openai
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.llm_cache import LLMCache
+from app.llm_client import LLMClient
+from app.rate_limiter import RateLimiter, TokenBucket
+
+def api_error(status, headers=None):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(status, headers=headers or {}, request=request)
+    error_class = openai.RateLimitError if status == 429 else openai.InternalServerError
+    return error_class(f"HTTP {status}", response=response, body=None)
+
+class FlakyCall:
+    """前几次调用抛出指定异常，之后返回结果"""
+    def __init__(self, errors, result="ok", delay=0.0):
+        self.errors = list(errors)
+        self.result = result
+        self.delay = delay
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+
+    async def __call__(self):
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.errors:
+                raise self.errors.pop(0)
+            return self.result
+        finally:
+            self.active -= 1
+
+@pytest.mark.asyncio
+async def test_token_bucket_waits_for_refill():
+    """测试令牌耗尽后按补充速率等待"""
+    bucket = TokenBucket(per_minute=600)  # 每秒10个
+    await bucket.acquire(600)
+    started = time.monotonic()
+    await bucket.acquire(2)
+    assert time.monotonic() - started >= 0.15
+
+    bucket.adjust(-100)  # 实际用量低于预估，退还令牌
+    assert bucket.available() == pytest.approx(100, abs=2)
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped():
+    """测试并发上限与排队深度统计"""
+    limiter = RateLimiter(requests_per_minute=None, tokens_per_minute=None, max_concurrency=3)
+    call = FlakyCall([], delay=0.02)
+
+    async def observe():
+        await asyncio.sleep(0.005)
+        return limiter.stats()["queue_depth"]
+
+    results = await asyncio.gather(*[limiter.run(call) for _ in range(10)], observe())
+
+    assert call.max_active == 3
+    assert results[-1] == 7
+    stats = limiter.stats()
+    assert stats["requests"] == 10
+    assert stats["queue_depth"] == 0
+    assert stats["in_flight"] == 0
+    assert stats["max_wait_seconds"] > 0
+
+@pytest.mark.asyncio
+async def test_retry_honors_retry_after():
+    """测试429按Retry-After等待后重试成功"""
+    limiter = RateLimiter(requests_per_minute=None, tokens_per_minute=None, base_delay=0.001)
+    call = FlakyCall([api_error(429, {"retry-after": "0.1"}), api_error(503)])
+
+    started = time.monotonic()
+    assert await limiter.run(call) == "ok"
+    assert time.monotonic() - started >= 0.1
+    assert call.calls == 3
+
+    stats = limiter.stats()
+    assert stats["retries"] == 2
+    assert stats["rate_limited"] == 1
+
+@pytest.mark.asyncio
+async def test_non_retryable_and_exhausted_errors_raise():
+    """测试不可重试错误立即抛出，重试用尽后抛出最后的异常"""
+    limiter = RateLimiter(requests_per_minute=None, tokens_per_minute=None, max_retries=2, base_delay=0.001)
+
+    bad_request = FlakyCall([ValueError("bad")])
+    with pytest.raises(ValueError):
+        await limiter.run(bad_request)
+    assert bad_request.calls == 1
+
+    always_failing = FlakyCall([api_error(500)] * 5)
+    with pytest.raises(openai.InternalServerError):
+        await limiter.run(always_failing)
+    assert always_failing.calls == 3
+    assert limiter.stats()["failures"] == 2
+
+def test_retry_after_parsing():
+    """测试Retry-After头的解析"""
+    assert RateLimiter.retry_after(api_error(429, {"retry-after-ms": "1500"})) == 1.5
+    assert RateLimiter.retry_after(api_error(429, {"retry-after": "3"})) == 3.0
+    assert RateLimiter.retry_after(api_error(429, {"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"})) == 0.0
+    assert RateLimiter.retry_after(api_error(429)) is None
+    assert RateLimiter.retry_after(ValueError("x")) is None
+
+@pytest.mark.asyncio
+async def test_llm_client_retries_rate_limited_calls():
+    """测试LLM客户端在429后重试而不是直接降级"""
+    with patch('app.llm_client.AsyncOpenAI') as mock_openai:
+        response = MagicMock()
+        response.choices[0].message.content = '{"extended_content": "ok"}'
+        response.usage.total_tokens = 50
+        create = AsyncMock(side_effect=[api_error(429, {"retry-after": "0.01"}), response])
+        mock_openai.return_value.chat.completions.create = create
+
+        limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=100000, base_delay=0.001)
+        client = LLMClient(cache=LLMCache(), rate_limiter=limiter)
+        result = await client.extend_knowledge("注意力机制")
+
+        assert result["extended_content"] == "ok"
+        assert "fallback" not in result
+        assert create.await_count == 2
+        assert mock_openai.call_args.kwargs["max_retries"] == 0
+        assert client.rate_limit_stats()["retries"] == 1
\ No newline at end of file
@@ -0,0 +1,107 @@
+import pytest
+import sys
+import os
+import gzip
+import asyncio
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import orjson
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.response_encoding import ResponseEncoder, parse_quality_list
+
+LARGE = {"pages": [{"page_num": i, "text": "知识扩展" * 100} for i in range(50)]}
+
+def make_client(encoder):
+    app = FastAPI()
+    
+    @app.get("/large")
+    async def large(request: Request):
+        return await encoder.response(request, LARGE)
+    
+    @app.get("/small")
+    async def small(request: Request):
+        return await encoder.response(request, {"ok": True})
+    
+    return TestClient(app)
+
+def test_parse_quality_list():
+    """测试解析带q值的协商头"""
+    assert parse_quality_list("gzip;q=0.5, zstd, br;q=0") == {"gzip": 0.5, "zstd": 1.0, "br": 0.0}
+    assert parse_quality_list("") == {}
+
+def test_choose_encoding_respects_quality():
+    """测试按q值与服务端优先级选择压缩算法"""
+    encoder = ResponseEncoder()
+    assert encoder.choose_encoding("gzip") == "gzip"
+    assert encoder.choose_encoding("") is None
+    assert encoder.choose_encoding("gzip;q=0") is None
+    assert encoder.choose_encoding("identity") is None
+    assert encoder.choose_encoding("*") == encoder.supported_encodings()[0]
+
+def test_json_response_is_gzipped_above_threshold():
+    """测试超过阈值的JSON响应按Accept-Encoding压缩，小响应不压缩"""
+    encoder = ResponseEncoder(min_bytes=1024)
+    client = make_client(encoder)
+    
+    large = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    small = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    plain = client.get("/large", headers={"Accept-Encoding": "identity"})
+    
+    assert large.headers["content-encoding"] == "gzip"
+    assert large.headers["content-type"] == "application/json"
+    assert "Accept-Encoding" in large.headers["vary"]
+    assert large.json() == LARGE
+    assert "content-encoding" not in small.headers
+    assert "content-encoding" not in plain.headers
+    assert plain.content == orjson.dumps(LARGE)
+    
+    stats = encoder.stats()
+    assert stats["responses"] == 3
+    assert stats["by_encoding"] == {"gzip": 1, "identity": 2}
+    assert stats["sent_bytes"] < stats["raw_bytes"]
+
+def test_large_responses_are_compressed_in_thread():
+    """测试超过offload_bytes的响应在线程中压缩，较小的响应在事件循环中直接压缩"""
+    encoder = ResponseEncoder(min_bytes=10, offload_bytes=4096)
+    client = make_client(encoder)
+    
+    with patch("app.response_encoding.asyncio.to_thread", wraps=asyncio.to_thread) as to_thread:
+        large = client.get("/large", headers={"Accept-Encoding": "gzip"})
+        small = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    
+    assert to_thread.call_count == 1
+    assert large.json() == LARGE
+    assert small.json() == {"ok": True}
+    assert encoder.stats()["offloaded"] == 1
+
+def test_compress_roundtrip():
+    """测试gzip压缩结果可还原"""
+    encoder = ResponseEncoder(min_bytes=10)
+    body = orjson.dumps(LARGE)
+    compressed, encoding = encoder.compress(body, "gzip")
+    assert encoding == "gzip"
+    assert gzip.decompress(compressed) == body
+    assert len(compressed) < len(body) / 5
+
+def test_msgpack_negotiation():
+    """测试Accept为msgpack时返回二进制msgpack"""
+    msgpack = pytest.importorskip("msgpack")
+    client = make_client(ResponseEncoder())
+    
+    response = client.get("/large", headers={"Accept": "application/msgpack", "Accept-Encoding": "identity"})
+    assert response.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(response.content) == LARGE
+    assert len(response.content) < len(orjson.dumps(LARGE))
+
+def test_zstd_preferred_when_available():
+    """测试客户端同时接受zstd与gzip时优先zstd"""
+    zstandard = pytest.importorskip("zstandard")
+    encoder = ResponseEncoder(min_bytes=10)
+    body = orjson.dumps(LARGE)
+    compressed, encoding = encoder.compress(body, "gzip, zstd")
+    assert encoding == "zstd"
+    assert zstandard.ZstdDecompressor().decompress(compressed) == body
\ No newline at end of file
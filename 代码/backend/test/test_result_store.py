@@ -0,0 +1,87 @@
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.result_store import ResultStore
+
+def make_result(ppt_id, pages=1, text="x"):
+    return {"ppt_id": ppt_id, "original_filename": "deck.pptx", "total_pages": pages,
+            "pages": [{"page_num": i + 1, "text": text} for i in range(pages)]}
+
+def test_lookup_and_get(tmp_path):
+    """测试按内容哈希与选项查找，并按ppt_id读取"""
+    store = ResultStore(str(tmp_path))
+    options = ResultStore.make_options_key({"model": "gpt-4", "template_type": "default"})
+    store.put("p1", "hash-a", options, make_result("p1", pages=2))
+
+    assert store.lookup("hash-a", options) == "p1"
+    assert store.lookup("hash-a", ResultStore.make_options_key({"model": "gpt-3.5"})) is None
+    assert store.lookup("hash-b", options) is None
+    assert store.get("p1")["total_pages"] == 2
+    assert store.get("missing") is None
+    store.close()
+
+def test_persists_across_reopen(tmp_path):
+    """测试重新打开后结果仍可命中"""
+    store = ResultStore(str(tmp_path))
+    store.put("p1", "hash-a", "opts", make_result("p1"))
+    store.close()
+
+    reopened = ResultStore(str(tmp_path))
+    assert reopened.lookup("hash-a", "opts") == "p1"
+    assert reopened.get("p1")["ppt_id"] == "p1"
+    reopened.close()
+
+def test_reprocessed_result_replaces_old(tmp_path):
+    """测试同一内容与选项只保留最新结果"""
+    store = ResultStore(str(tmp_path))
+    store.put("p1", "hash-a", "opts", make_result("p1"))
+    store.put("p2", "hash-a", "opts", make_result("p2"))
+
+    assert store.lookup("hash-a", "opts") == "p2"
+    assert store.get("p1") is None
+    assert store.stats()["entries"] == 1
+    store.close()
+
+def test_size_based_eviction(tmp_path):
+    """测试超过容量时淘汰最久未访问的结果"""
+    store = ResultStore(str(tmp_path))
+    store.put("p1", "hash-1", "opts", make_result("p1", text="a" * 1000))
+    store.max_bytes = store.total_bytes() * 2 + 10  # 容纳两个结果
+
+    store.put("p2", "hash-2", "opts", make_result("p2", text="b" * 1000))
+    store.get("p1")  # p2变为最久未访问
+    store.put("p3", "hash-3", "opts", make_result("p3", text="c" * 1000))
+
+    assert store.lookup("hash-2", "opts") is None
+    assert not os.path.exists(os.path.join(str(tmp_path), "blobs", "p2.json"))
+    assert store.get("p1") is not None
+    assert store.get("p3") is not None
+    assert store.total_bytes() <= store.max_bytes
+    store.close()
+
+def test_missing_blob_is_dropped(tmp_path):
+    """测试结果文件丢失时视为未命中"""
+    store = ResultStore(str(tmp_path))
+    store.put("p1", "hash-a", "opts", make_result("p1"))
+    os.remove(os.path.join(str(tmp_path), "blobs", "p1.json"))
+
+    assert store.get("p1") is None
+    assert store.lookup("hash-a", "opts") is None
+    store.close()
+
+def test_latency_stats(tmp_path):
+    """测试命中与完整处理的耗时对比"""
+    store = ResultStore(str(tmp_path))
+    store.record_processed(12.0)
+    store.record_hit(0.01)
+    store.record_hit(0.03)
+
+    stats = store.stats()
+    assert stats["hits"] == 2
+    assert stats["hit_seconds_avg"] == pytest.approx(0.02)
+    assert stats["process_seconds_avg"] == 12.0
+    assert stats["speedup"] == 600.0
+    store.close()
\ No newline at end of file
@@ -0,0 +1,190 @@
+import pytest
+import sys
+import os
+import asyncio
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.cache_backends import MemoryCacheBackend, SQLiteCacheBackend
+from app.search_cache import SearchCache
+
+class CountingFetch:
+    """记录调用次数的模拟外部请求"""
+    def __init__(self, results, delay=0.0, error=None):
+        self.results = results
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.results
+
+def test_normalize_query():
+    """测试查询规范化"""
+    assert SearchCache.normalize_query("  Neural   Networks\n") == "neural networks"
+    cache = SearchCache()
+    assert cache.make_key("arxiv", "Neural Networks") == cache.make_key("arxiv", "neural  networks")
+    assert cache.make_key("arxiv", "x") != cache.make_key("wikipedia", "x")
+
+@pytest.mark.asyncio
+async def test_cache_hit_after_fetch():
+    """测试第二次相同查询命中缓存"""
+    cache = SearchCache()
+    fetch = CountingFetch([{"title": "NN"}])
+
+    first = await cache.get_or_fetch("wikipedia", "Neural Networks", fetch)
+    second = await cache.get_or_fetch("wikipedia", "neural networks", fetch)
+
+    assert first == second == [{"title": "NN"}]
+    assert fetch.calls == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+@pytest.mark.asyncio
+async def test_negative_caching_uses_short_ttl():
+    """测试空结果使用负缓存TTL"""
+    cache = SearchCache(ttls={"arxiv": 3600}, negative_ttl=0.05)
+    fetch = CountingFetch([])
+
+    assert await cache.get_or_fetch("arxiv", "nothing", fetch) == []
+    assert await cache.get_or_fetch("arxiv", "nothing", fetch) == []
+    assert fetch.calls == 1
+    assert cache.stats()["negative_hits"] == 1
+
+    await asyncio.sleep(0.06)
+    await cache.get_or_fetch("arxiv", "nothing", fetch)
+    assert fetch.calls == 2
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_are_coalesced():
+    """测试并发的相同查询只触发一次外部请求"""
+    cache = SearchCache()
+    fetch = CountingFetch([{"title": "NN"}], delay=0.05)
+
+    results = await asyncio.gather(*[
+        cache.get_or_fetch("arxiv", "Neural Networks", fetch) for _ in range(10)
+    ])
+
+    assert fetch.calls == 1
+    assert all(r == [{"title": "NN"}] for r in results)
+    assert cache.stats()["coalesced"] == 9
+    assert cache.stats()["inflight"] == 0
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_does_not_cancel_followers():
+    """测试发起请求的调用方被取消时，合并进来的等待者仍拿到结果；全部取消后才取消外部请求"""
+    cache = SearchCache()
+    fetch = CountingFetch([{"title": "NN"}], delay=0.05)
+
+    leader = asyncio.create_task(cache.get_or_fetch("arxiv", "q", fetch))
+    await asyncio.sleep(0.01)
+    follower = asyncio.create_task(cache.get_or_fetch("arxiv", "q", fetch))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+
+    assert await follower == [{"title": "NN"}]
+    assert leader.cancelled()
+    assert fetch.calls == 1
+
+    slow = CountingFetch([{"title": "slow"}], delay=1)
+    only = asyncio.create_task(cache.get_or_fetch("arxiv", "slow", slow))
+    await asyncio.sleep(0.01)
+    only.cancel()
+    await asyncio.gather(only, return_exceptions=True)
+    assert cache.stats()["inflight"] == 0
+    # 被取消的请求不写入缓存
+    assert cache.backend.get(cache.make_key("arxiv", "slow")) is None
+
+@pytest.mark.asyncio
+async def test_request_after_cancel_keeps_coalescing():
+    """测试全部等待者取消后立即重新请求同一键，被取消的请求收尾时不删除新的进行中记录"""
+    cache = SearchCache()
+    fetch = CountingFetch([{"title": "NN"}], delay=0.05)
+    
+    first = asyncio.create_task(cache.get_or_fetch("arxiv", "q", fetch))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    second = asyncio.create_task(cache.get_or_fetch("arxiv", "q", fetch))
+    await asyncio.sleep(0.01)
+    third = asyncio.create_task(cache.get_or_fetch("arxiv", "q", fetch))
+    
+    assert await asyncio.gather(second, third) == [[{"title": "NN"}]] * 2
+    assert first.cancelled()
+    assert fetch.calls == 2
+    assert cache.stats()["coalesced"] == 1
+
+@pytest.mark.asyncio
+async def test_errors_propagate_and_are_not_cached():
+    """测试异常传递给所有等待者且不写入缓存"""
+    cache = SearchCache()
+    failing = CountingFetch(None, delay=0.02, error=RuntimeError("503"))
+
+    results = await asyncio.gather(*[
+        cache.get_or_fetch("arxiv", "q", failing) for _ in range(3)
+    ], return_exceptions=True)
+
+    assert failing.calls == 1
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+    ok = CountingFetch([{"title": "ok"}])
+    assert await cache.get_or_fetch("arxiv", "q", ok) == [{"title": "ok"}]
+    assert ok.calls == 1
+
+def test_memory_backend_expiry_and_lru():
+    """测试内存后端过期与LRU淘汰"""
+    backend = MemoryCacheBackend(max_entries=2)
+    backend.set("a", 1)
+    backend.set("b", 2, ttl=0.01)
+    backend.set("c", 3)
+    assert backend.get("a") is None  # 被淘汰
+    time.sleep(0.02)
+    assert backend.get("b") is None  # 已过期
+    assert backend.get("c") == 3
+
+@pytest.mark.asyncio
+async def test_sqlite_backend_runs_off_event_loop(tmp_path):
+    """测试SQLite后端的读写在线程中执行，内存后端直接调用"""
+    cache = SearchCache(backend=SQLiteCacheBackend(str(tmp_path / "cache.db")))
+    fetch = CountingFetch([{"title": "NN"}])
+    with patch("app.cache_backends.asyncio.to_thread", wraps=asyncio.to_thread) as to_thread:
+        assert await cache.get_or_fetch("arxiv", "q", fetch) == [{"title": "NN"}]
+        assert await cache.get_or_fetch("arxiv", "q", fetch) == [{"title": "NN"}]
+        assert to_thread.call_count == 3  # 未命中读取、写入、命中读取
+        
+        memory = SearchCache()
+        await memory.get_or_fetch("arxiv", "q", CountingFetch([]))
+        assert to_thread.call_count == 3
+    assert fetch.calls == 1
+    cache.close()
+
+def test_sqlite_backend_persists_and_evicts(tmp_path):
+    """测试SQLite后端持久化与容量淘汰"""
+    path = str(tmp_path / "cache.db")
+    backend = SQLiteCacheBackend(path, max_entries=2)
+    backend.set("a", [{"title": "A"}])
+    backend.set("b", [])
+    backend.get("a")
+    backend.set("c", [{"title": "C"}])  # b最久未访问，被淘汰
+    backend.close()
+
+    reopened = SQLiteCacheBackend(path, max_entries=2)
+    assert reopened.get("a") == [{"title": "A"}]
+    assert reopened.get("b") is None
+    assert reopened.get("c") == [{"title": "C"}]
+    assert len(reopened) == 2
+    reopened.close()
+
+def test_sqlite_backend_byte_budget(tmp_path):
+    """测试SQLite后端按字节数淘汰"""
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.db"), max_bytes=50)
+    backend.set("a", "x" * 30)
+    backend.set("b", "y" * 30)
+    assert backend.get("a") is None
+    assert backend.total_bytes() <= 50
+    backend.close()
\ No newline at end of file
@@ -0,0 +1,174 @@
+import pytest
+import pytest_asyncio
+import sys
+import asyncio
+import os
+from unittest.mock import AsyncMock
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.search_client import SearchClient
+
+@pytest_asyncio.fixture
+async def wiki_server():
+    """本地模拟Wikipedia摘要接口"""
+    async def summary(request):
+        await asyncio.sleep(0.01)
+        title = request.match_info["title"]
+        return web.json_response({
+            "title": title,
+            "extract": f"Summary of {title}",
+            "content_urls": {"desktop": {"page": f"https://en.wikipedia.org/wiki/{title}"}}
+        })
+
+    app = web.Application()
+    app.router.add_get("/summary/{title}", summary)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    yield f"http://127.0.0.1:{port}/summary/"
+    await runner.cleanup()
+
+def test_pool_configuration():
+    """测试连接池与超时配置"""
+    client = SearchClient(limit=20, limit_per_host=4, dns_cache_ttl=60, timeouts={"arxiv": 3.0})
+    stats = client.pool_stats()
+    assert stats["limit"] == 20
+    assert stats["limit_per_host"] == 4
+    assert stats["dns_cache_ttl"] == 60
+    assert stats["timeouts"]["arxiv"] == 3.0
+    assert stats["timeouts"]["wikipedia"] == SearchClient.DEFAULT_TIMEOUTS["wikipedia"]
+    assert stats["open"] is False
+
+@pytest.mark.asyncio
+async def test_session_is_shared_and_reused(wiki_server):
+    """测试多次请求复用同一个会话与keep-alive连接"""
+    client = SearchClient()
+    client.wikipedia_api = wiki_server
+
+    first = await client.search_wikipedia("Neural_Networks")
+    session = client.session
+    second = await client.search_wikipedia("Backpropagation")
+
+    assert first[0]["title"] == "Neural_Networks"
+    assert second[0]["summary"] == "Summary of Backpropagation"
+    assert client.session is session
+
+    stats = client.pool_stats()
+    assert stats["open"] is True
+    assert stats["requests"]["wikipedia"] == 2
+    assert stats["in_use"] == 0
+    assert stats["idle"] == 1  # 连接被放回池中复用
+
+    await client.close()
+    assert client.session is None
+    assert client.pool_stats()["open"] is False
+
+@pytest.mark.asyncio
+async def test_errors_are_counted():
+    """测试请求失败时计数并返回空结果"""
+    client = SearchClient(timeouts={"wikipedia": 0.5})
+    client.wikipedia_api = "http://127.0.0.1:9/"
+
+    assert await client.search_wikipedia("anything") == []
+    assert await client.search_wikipedia("anything") == []
+    assert client.pool_stats()["errors"]["wikipedia"] == 2
+    assert client.cache.stats()["entries"] == 0  # 失败不缓存
+    await client.close()
+
+@pytest.mark.asyncio
+async def test_search_external_queries_only_selected_sources():
+    """测试只查询选择的源，结果与源对应（与传入顺序无关），并统计各源耗时"""
+    client = SearchClient()
+    client.search_wikipedia = AsyncMock(return_value=[{"title": "wiki", "relevance_score": 0.5}])
+    client.search_arxiv = AsyncMock(return_value=[{"title": "paper", "relevance_score": 0.9}])
+    client.search_semantic_scholar = AsyncMock(return_value=[])
+
+    results = await client.search_external("梯度下降", sources=["arxiv", "wikipedia"])
+
+    client.search_semantic_scholar.assert_not_awaited()
+    assert results["arxiv"][0]["title"] == "paper"
+    assert results["wikipedia"][0]["title"] == "wiki"
+    assert results["semantic_scholar"] == []
+    assert [item["title"] for item in results["all_sources"]] == ["paper", "wiki"]
+    latency = client.source_latency()
+    assert latency["arxiv"] is not None
+    assert latency["semantic_scholar"] is None
+    await client.close()
+
+@pytest.mark.asyncio
+async def test_search_external_skips_cancelled_source():
+    """测试某个源被取消（返回CancelledError）时跳过该源，其余源正常返回"""
+    client = SearchClient()
+    client.search_wikipedia = AsyncMock(side_effect=asyncio.CancelledError())
+    client.search_arxiv = AsyncMock(return_value=[{"title": "paper", "relevance_score": 0.9}])
+
+    results = await client.search_external("梯度下降", sources=["arxiv", "wikipedia"])
+
+    assert results["wikipedia"] == []
+    assert [item["title"] for item in results["all_sources"]] == ["paper"]
+    await client.close()
+
+@pytest.mark.asyncio
+async def test_repeated_titles_share_one_request(wiki_server):
+    """测试相同标题的并发与重复查询只发出一次外部请求"""
+    client = SearchClient()
+    client.wikipedia_api = wiki_server
+
+    results = await asyncio.gather(*[client.search_wikipedia("Neural Networks") for _ in range(10)])
+    again = await client.search_wikipedia("neural  networks")
+
+    assert all(r == results[0] for r in results)
+    assert again == results[0]
+    assert client.pool_stats()["requests"]["wikipedia"] == 1
+    assert client.cache.stats()["coalesced"] == 9
+    assert client.cache.stats()["hits"] == 1
+    await client.close()
+
+@pytest_asyncio.fixture
+async def arxiv_server():
+    """本地模拟arXiv接口，分块返回录制的Atom响应并记录查询参数"""
+    fixture = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_data", "arxiv_neural_networks.xml")
+    with open(fixture, "rb") as f:
+        body = f.read()
+    received = []
+
+    async def query(request):
+        received.append(dict(request.query))
+        response = web.StreamResponse(headers={"Content-Type": "application/atom+xml"})
+        await response.prepare(request)
+        for offset in range(0, len(body), 512):
+            await response.write(body[offset:offset + 512])
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_get("/api/query", query)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    yield f"http://127.0.0.1:{port}/api/query", received
+    await runner.cleanup()
+
+@pytest.mark.asyncio
+async def test_search_arxiv_streams_and_sends_sort_params(arxiv_server):
+    """测试arXiv检索发送排序参数并正确解析多行字段"""
+    url, received = arxiv_server
+    client = SearchClient()
+    client.arxiv_api = url
+
+    results = await client.search_arxiv("neural networks", max_results=3, sort_by="submittedDate")
+
+    assert [r["title"] for r in results][0] == "Deep Residual Learning for Image Recognition"
+    assert len(results) == 3
+    assert received[0]["search_query"] == "all:neural networks"
+    assert received[0]["sortBy"] == "submittedDate"
+    assert received[0]["sortOrder"] == "descending"
+    assert received[0]["max_results"] == "3"
+    await client.close()
\ No newline at end of file
@@ -0,0 +1,90 @@
+import pytest
+import sys
+import os
+import io
+import hashlib
+import time
+
+from fastapi import UploadFile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.temp_files import TempFileManager, UploadTooLargeError, sanitize_filename
+
+def make_upload(data: bytes, filename="deck.pptx", known_size=True):
+    return UploadFile(io.BytesIO(data), size=len(data) if known_size else None, filename=filename)
+
+def write_file(directory, name, size, age=0.0):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    if age:
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+    return path
+
+def test_sanitize_filename():
+    """测试文件名清理"""
+    assert sanitize_filename("../../etc/passwd") == "passwd"
+    assert sanitize_filename("C:\\Users\\me\\课件 第1讲.pptx") == "课件_第1讲.pptx"
+    assert sanitize_filename("a;rm -rf *.pptx") == "a_rm_-rf_.pptx"
+    assert sanitize_filename("") == "upload"
+    assert sanitize_filename("..") == "upload"
+    long_name = sanitize_filename("x" * 300 + ".pdf")
+    assert len(long_name) == 100 and long_name.endswith(".pdf")
+
+@pytest.mark.asyncio
+async def test_save_streams_and_hashes(tmp_path):
+    """测试分块保存并计算哈希"""
+    manager = TempFileManager(str(tmp_path))
+    manager.CHUNK_SIZE = 1000
+    data = os.urandom(5500)
+
+    path, digest = await manager.save(make_upload(data, filename="../deck.pptx"), "id1")
+
+    assert os.path.dirname(path) == str(tmp_path)
+    assert os.path.basename(path) == "id1_deck.pptx"
+    assert digest == hashlib.sha256(data).hexdigest()
+    with open(path, "rb") as f:
+        assert f.read() == data
+    assert manager.stats()["active_uploads"] == 1
+
+    manager.release(path)
+    assert not os.path.exists(path)
+    assert manager.stats()["active_uploads"] == 0
+
+@pytest.mark.asyncio
+async def test_oversized_upload_rejected(tmp_path):
+    """测试超过大小限制时立即失败且不留下部分文件"""
+    manager = TempFileManager(str(tmp_path), max_upload_bytes=2000)
+    manager.CHUNK_SIZE = 500
+
+    with pytest.raises(UploadTooLargeError):
+        await manager.save(make_upload(b"a" * 3000), "known")
+    with pytest.raises(UploadTooLargeError):
+        await manager.save(make_upload(b"a" * 3000, known_size=False), "streamed")
+
+    assert os.listdir(str(tmp_path)) == []
+    assert manager.stats()["rejected"] == 2
+
+def test_cleanup_enforces_age_and_quota(tmp_path):
+    """测试清理过期文件并按配额从最旧的开始删除，受保护的文件保留"""
+    directory = str(tmp_path)
+    protected = write_file(directory, "job_deck.pptx", 400, age=7200)
+    expired = write_file(directory, "expired.pptx", 100, age=7200)
+    oldest = write_file(directory, "oldest.pptx", 300, age=30)
+    newer = write_file(directory, "newer.pptx", 300, age=20)
+    active = write_file(directory, "active.pptx", 300, age=10)
+
+    manager = TempFileManager(directory, quota_bytes=1100, max_age=3600, protected=lambda: [protected])
+    manager.active.add(active)
+    result = manager.cleanup()
+
+    assert not os.path.exists(expired)
+    assert not os.path.exists(oldest)
+    assert os.path.exists(newer)
+    assert os.path.exists(protected)
+    assert os.path.exists(active)
+    assert result["removed"] == 2
+    assert result["usage_bytes"] == 1000
+    assert manager.stats()["removed_bytes"] == 400
\ No newline at end of file
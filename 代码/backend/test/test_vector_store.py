@@ -54,6 +54,43 @@ def test_add_document(mock_milvus):
         mock_milvus.insert.assert_called_once()
         mock_milvus.flush.assert_called_once()
 
+def test_add_documents_batch(mock_milvus):
+    """测试批量添加文档：一次编码、一次插入、一次flush"""
+    with patch('app.vector_store.connections') as mock_connections:
+        mock_connections.has_collection.return_value = True
+        
+        mock_milvus.insert.return_value.primary_keys = [11, 12, 13]
+        
+        store = VectorStore()
+        store.embedding_model.encode.return_value = [[0.1] * 384] * 3
+        store.embedding_model.encode.reset_mock()
+        
+        doc_ids = store.add_documents(
+            texts=["page 1", "page 2", "page 3"],
+            metadatas=[{"ppt_id": "test-123", "page_num": i, "title": f"T{i}"} for i in range(1, 4)]
+        )
+        
+        assert doc_ids == [11, 12, 13]
+        store.embedding_model.encode.assert_called_once()
+        mock_milvus.insert.assert_called_once()
+        mock_milvus.flush.assert_called_once()
+        
+        # 列式数据：每列长度等于文档数
+        data = mock_milvus.insert.call_args[0][0]
+        assert data[0] == ["test-123"] * 3
+        assert data[1] == [1, 2, 3]
+        assert all(len(column) == 3 for column in data)
+
+def test_add_documents_empty(mock_milvus):
+    """测试空列表不触发插入"""
+    with patch('app.vector_store.connections') as mock_connections:
+        mock_connections.has_collection.return_value = True
+        
+        store = VectorStore()
+        assert store.add_documents([]) == []
+        mock_milvus.insert.assert_not_called()
+        mock_milvus.flush.assert_not_called()
+
 def test_search_similar(mock_milvus):
     """测试搜索相似内容"""
     with patch('app.vector_store.connections') as mock_connections:
@@ -81,4 +118,127 @@ def test_search_similar(mock_milvus):
         assert len(results) == 1
         assert results[0]["id"] == 1
         assert results[0]["score"] == 0.95
-        assert results[0]["content"] == "Test content"
\ No newline at end of file
+        assert results[0]["content"] == "Test content"
+
+def test_search_reuses_cached_embedding(mock_milvus):
+    """测试写入后检索同一文本时命中嵌入缓存"""
+    with patch('app.vector_store.connections') as mock_connections:
+        mock_connections.has_collection.return_value = True
+        
+        mock_milvus.search.return_value = []
+        
+        store = VectorStore()
+        store.add_document("Same slide text", metadata={"ppt_id": "test-123", "page_num": 1})
+        store.search_similar("Same slide text", top_k=3)
+        
+        assert store.embedding_model.encode.call_count == 1
+        stats = store.cache_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+
+def test_local_backend(tmp_path):
+    """测试使用进程内后端时无需连接Milvus"""
+    with patch('app.vector_store.connections') as mock_connections, \
+         patch('app.vector_store.SentenceTransformer') as mock_embedding:
+        mock_embedding.return_value.encode.side_effect = \
+            lambda texts, **kwargs: [[float(len(text))] * 384 for text in texts]
+        
+        with patch.dict(os.environ, {"VECTOR_DATA_DIR": str(tmp_path)}):
+            store = VectorStore(backend="local")
+        
+        doc_ids = store.add_documents(
+            texts=["short", "a much longer slide"],
+            metadatas=[{"ppt_id": "test-123", "page_num": 1}, {"ppt_id": "test-123", "page_num": 2}]
+        )
+        results = store.search_similar("short", top_k=1)
+        
+        mock_connections.connect.assert_not_called()
+        assert store.collection is None
+        assert results[0]["id"] == doc_ids[0]
+        assert store.backend_stats()["backend"] == "local"
+
+def test_search_excludes_own_vector(tmp_path):
+    """测试检索时排除页面自身的向量，仍返回top_k条"""
+    with patch('app.vector_store.connections'), \
+         patch('app.vector_store.SentenceTransformer') as mock_embedding:
+        mock_embedding.return_value.encode.side_effect = \
+            lambda texts, **kwargs: [[float(len(text))] * 384 for text in texts]
+        
+        with patch.dict(os.environ, {"VECTOR_DATA_DIR": str(tmp_path)}):
+            store = VectorStore(backend="local")
+        
+        doc_ids = store.add_documents(
+            texts=["short", "shorter", "a much longer slide"],
+            metadatas=[{"ppt_id": "test-123", "page_num": i} for i in (1, 2, 3)]
+        )
+        results = store.search_similar("short", top_k=2, exclude_ids=[doc_ids[0]])
+        
+        assert [result["id"] for result in results] == [doc_ids[1], doc_ids[2]]
+
+def test_milvus_deck_partitions(mock_milvus):
+    """测试deck分区：写入PPT所属分区，按ppt_id检索只搜索该分区，删除PPT时删除分区"""
+    with patch('app.vector_store.connections') as mock_connections:
+        mock_connections.has_collection.return_value = True
+        mock_milvus.has_partition.return_value = False
+        mock_milvus.insert.return_value.primary_keys = [11, 12]
+        mock_milvus.search.return_value = []
+        
+        store = VectorStore()
+        partition = store.backend.partition_name("deck-1")
+        store.add_documents(
+            texts=["page 1", "page 2"],
+            metadatas=[{"ppt_id": "deck-1", "page_num": i, "versioned": True} for i in (1, 2)]
+        )
+        # 非deck_id上传的PPT写入默认分区，不新建分区
+        store.add_documents(texts=["other"], metadatas=[{"ppt_id": "upload-uuid", "page_num": 1}])
+        store.search_similar("page 1", top_k=3, ppt_id='deck-1"')
+        store.search_similar("page 1", top_k=3, ppt_id="deck-1")
+        store.delete_by_ppt_id("deck-1")
+        
+        mock_milvus.create_partition.assert_called_once_with(partition)
+        assert mock_milvus.insert.call_args_list[0].kwargs["partition_name"] == partition
+        assert "partition_name" not in mock_milvus.insert.call_args_list[1].kwargs
+        # 没有分区的PPT只搜索默认分区；过滤值中的引号被转义
+        assert mock_milvus.search.call_args_list[0].kwargs["partition_names"] == ["_default"]
+        assert mock_milvus.search.call_args_list[0].kwargs["expr"] == 'ppt_id == "deck-1\\""'
+        assert mock_milvus.search.call_args.kwargs["partition_names"] == ["_default", partition]
+        mock_milvus.drop_partition.assert_called_once_with(partition)
+        mock_milvus.delete.assert_called_once_with(expr='ppt_id == "deck-1"', partition_name="_default")
+
+def test_milvus_course_filter_requires_field(mock_milvus):
+    """测试没有course字段的旧集合不支持按课程过滤"""
+    with patch('app.vector_store.connections') as mock_connections:
+        mock_connections.has_collection.return_value = True
+        
+        store = VectorStore()
+        with pytest.raises(ValueError):
+            store.search_similar("query", course="ml-101")
+        mock_milvus.search.assert_not_called()
+
+def test_milvus_partition_key_by_default(mock_milvus):
+    """测试默认以ppt_id作为分区键新建集合：不新建物理分区，按表达式过滤与删除"""
+    with patch('app.vector_store.connections') as mock_connections, \
+         patch('app.vector_store.Collection') as mock_collection:
+        mock_connections.has_collection.return_value = False
+        mock_collection.return_value = mock_milvus
+        mock_milvus.schema.fields = [MagicMock(is_partition_key=True), MagicMock(is_partition_key=False)]
+        mock_milvus.schema.fields[1].name = "course"
+        mock_milvus.has_index.return_value = False
+        mock_milvus.search.return_value = []
+        
+        store = VectorStore()
+        store.add_documents(texts=["page 1"], metadatas=[{"ppt_id": "deck-1", "page_num": 1, "versioned": True}])
+        store.search_similar("page 1", ppt_id="deck-1", course="ml-101")
+        store.delete_by_ppt_id("deck-1")
+        
+        schema = mock_collection.call_args_list[0].kwargs["schema"]
+        assert [field.name for field in schema.fields if field.is_partition_key] == ["ppt_id"]
+        assert {c.kwargs["field_name"]: c.kwargs["index_params"]["index_type"]
+                for c in mock_milvus.create_index.call_args_list if c.kwargs.get("index_name")} == \
+            {"ppt_id": "Trie", "course": "Trie"}
+        mock_milvus.create_partition.assert_not_called()
+        assert "partition_name" not in mock_milvus.insert.call_args.kwargs
+        assert mock_milvus.search.call_args.kwargs["expr"] == 'ppt_id == "deck-1" and course == "ml-101"'
+        assert mock_milvus.search.call_args.kwargs["partition_names"] is None
+        mock_milvus.delete.assert_called_once_with(expr='ppt_id == "deck-1"')
+        assert store.backend_stats()["partitioning"] == "key"
\ No newline at end of file
@@ -36,6 +36,7 @@ def main():
         extension_depth = st.selectbox(
             "扩展深度",
             ["简单", "标准", "深度"],
+            index=1,
             help="控制知识扩展的详细程度"
         )
         
@@ -48,8 +49,8 @@ def main():
         
         generate_questions = st.checkbox(
             "生成测试问题",
-            value=True,
-            help="基于内容生成测试题"
+            value=False,
+            help="处理时逐页生成测试题（每页多一次LLM调用）"
         )
         
         st.divider()
@@ -81,6 +82,8 @@ def main():
         
         if uploaded_file is not None:
             col1, col2 = st.columns([2, 1])
+            # 处理进度与逐页结果显示在按钮下方
+            progress_area = st.container()
             
             with col1:
                 # 显示文件信息
@@ -95,7 +98,12 @@ def main():
                 # 处理按钮
                 if st.button("🚀 开始处理", type="primary", use_container_width=True):
                     with st.spinner("正在处理PPT文件..."):
-                        result = process_ppt_file(uploaded_file)
+                        result = process_ppt_file(uploaded_file, progress_area, {
+                            "extension_depth": DEPTH_OPTIONS[extension_depth],
+                            # 空列表不会出现在查询串中，用"none"明确表示不检索外部资源
+                            "include_sources": [SOURCE_OPTIONS[source] for source in include_sources] or ["none"],
+                            "generate_questions": generate_questions
+                        })
                         
                         if result:
                             # 保存结果到session state
@@ -202,37 +210,107 @@ def main():
         else:
             st.info("👆 请先上传并处理PPT文件")
 
-def process_ppt_file(uploaded_file) -> Dict[str, Any]:
+# 侧边栏选项 -> 上传接口参数
+DEPTH_OPTIONS = {"简单": "simple", "标准": "normal", "深度": "deep"}
+SOURCE_OPTIONS = {"Wikipedia": "wikipedia", "Arxiv": "arxiv", "学术论文": "semantic_scholar"}
+
+def process_ppt_file(uploaded_file, progress_area=None, options: Dict[str, Any] = None) -> Dict[str, Any]:
     """
     处理上传的PPT文件
+    调用流式接口，页面处理完成一页就显示一页，结束后汇总成与 /api/ppt/upload 相同结构的结果
+    options: 扩展深度、外部源与是否生成问题，未选择的阶段由后端跳过
     """
+    progress_area = progress_area or st.container()
     try:
         # 保存临时文件
         with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(uploaded_file.name)[1]) as tmp_file:
             tmp_file.write(uploaded_file.getvalue())
             tmp_path = tmp_file.name
         
-        # 调用API
-        files = {'file': (uploaded_file.name, open(tmp_path, 'rb'), uploaded_file.type)}
-        
-        response = requests.post(
-            f"{API_BASE_URL}/api/ppt/upload",
-            files=files
-        )
+        # 调用流式API（NDJSON，每行一条记录）
+        with open(tmp_path, 'rb') as upload:
+            files = {'file': (uploaded_file.name, upload, uploaded_file.type)}
+            with requests.post(f"{API_BASE_URL}/api/ppt/upload/stream", files=files, params=options or {},
+                               stream=True) as response:
+                if response.status_code != 200:
+                    st.error(f"处理失败: {response.text}")
+                    return None
+                result = render_stream(response.iter_lines(decode_unicode=True), progress_area)
         
         # 清理临时文件
         os.unlink(tmp_path)
-        
-        if response.status_code == 200:
-            return response.json()
-        else:
-            st.error(f"处理失败: {response.text}")
-            return None
+        return result
             
     except Exception as e:
         st.error(f"处理过程中出错: {str(e)}")
         return None
 
+def render_stream(lines, progress_area) -> Dict[str, Any]:
+    """
+    逐条消费流式记录并实时渲染
+    structure -> 显示总页数；page/error -> 追加一页；summary -> 记录耗时
+    """
+    result = None
+    pages = {}
+    with progress_area:
+        progress = st.progress(0.0, text="正在解析PPT结构...")
+        feed = st.container()
+    
+    for line in lines:
+        if not line:
+            continue
+        record = json.loads(line)
+        
+        if record["type"] == "structure":
+            result = {
+                "ppt_id": record["ppt_id"],
+                "original_filename": record["original_filename"],
+                "total_pages": record["total_pages"],
+                "pages": [],
+                "structure": {"toc": record["toc"], "total_pages": record["total_pages"]}
+            }
+            titles = {page["page_num"]: page["title"] for page in record["pages"]}
+            progress.progress(0.0, text=f"结构解析完成，共 {record['total_pages']} 页，正在扩展知识...")
+        elif record["type"] == "page":
+            pages[record["page_num"]] = record["page"]
+            with feed:
+                with st.expander(f"✅ 第 {record['page_num']} 页: {record['page'].get('title') or '无标题'}"):
+                    display_page_preview(record["page"])
+        elif record["type"] == "error":
+            pages[record["page_num"]] = {
+                "page_num": record["page_num"],
+                "title": titles.get(record["page_num"], ""),
+                "extensions": {"error": record["detail"]}
+            }
+            feed.warning(f"第 {record['page_num']} 页扩展失败: {record['detail']}")
+        elif record["type"] == "summary":
+            result["processing_time"] = record["processing_time"]
+            progress.progress(1.0, text=f"处理完成：成功 {record['completed']} 页，失败 {record['failed']} 页，"
+                                        f"耗时 {record['processing_time']:.1f} 秒")
+            continue
+        
+        if result and result["total_pages"]:
+            progress.progress(len(pages) / result["total_pages"],
+                              text=f"已完成 {len(pages)}/{result['total_pages']} 页")
+    
+    if result is not None:
+        result["pages"] = [pages[num] for num in sorted(pages)]
+    return result
+
+def display_page_preview(page_data: Dict):
+    """
+    处理过程中的单页简要预览（完整内容在"浏览结果"中查看）
+    """
+    content = page_data.get('extensions', {}).get('extended_content', '')
+    if content:
+        st.markdown(content)
+    elif page_data.get('text'):
+        st.markdown(page_data['text'])
+    
+    refs = page_data.get('external_references', {}).get('all_sources', [])
+    if refs:
+        st.caption("外部参考：" + "；".join(ref.get('title', '') for ref in refs[:3]))
+
 def display_page_content(page_data: Dict):
     """
     显示页面内容
@@ -253,10 +331,11 @@ def display_page_content(page_data: Dict):
         if page_data.get('images'):
             st.subheader("🖼️ 图片")
             for img in page_data['images'][:3]:  # 最多显示3张
-                if img.get('data'):
+                if img.get('url'):
                     try:
+                        # 后端按需生成缩略图，点开原图再取完整字节
                         st.image(
-                            base64.b64decode(img['data']),
+                            f"{API_BASE_URL}{img['url']}?size=512",
                             caption=f"图片",
                             use_column_width=True
                         )
@@ -302,10 +381,12 @@ def display_page_content(page_data: Dict):
 
 def generate_test_questions(ppt_result: Dict) -> List[Dict]:
     """
-    生成测试问题
+    生成测试问题：优先使用处理时逐页生成的问题，没有时返回示例问题
     """
-    # 这里应该调用API生成问题
-    # 简化实现：返回示例问题
+    questions = [q for page in ppt_result.get('pages', []) for q in page.get('questions', [])
+                 if q.get('question')]
+    if questions:
+        return questions
     return [
         {
             "question": "什么是机器学习？",